@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Benchmark corpus generator
+Writes deterministic atoms, trail logs and large workspace files at given sizes.
+
+    python bench/corpus.py                       # 10k, 100k and 1M entries
+    python bench/corpus.py --sizes 10000 --out /tmp/cage-corpus
+
+Each size gets its own directory:
+
+    <out>/<size>/atoms.jsonl                   size atoms, as `run.py ingest` writes them
+    <out>/<size>/trail.log                     size trail lines (logbook entries and ingest lines)
+    <out>/<size>/workspace/large.txt           size lines of code-like text
+    <out>/<size>/workspace/large.edited.txt    the same file with 0.1% of lines edited
+    <out>/<size>/meta.json                     written last; marks the directory complete
+
+The same seed and size always produce byte-identical files.
+"""
+
+import sys
+import json
+import random
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from cagecore import embedder
+
+# Bump when the generated content changes so stale corpora are rebuilt
+VERSION = 1
+
+DEFAULT_DIR = Path(__file__).resolve().parents[1] / ".cage" / "bench" / "corpus"
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+EDIT_RATIO = 0.001
+
+BASE_TS = datetime(2025, 1, 1)
+WORDS = ("cage", "atom", "trail", "plan", "diff", "rule", "guard", "publish", "snapshot", "workspace",
+         "index", "vector", "query", "retrieve", "append", "ledger", "stream", "patch", "review", "test",
+         "commit", "topic", "note", "idea", "link", "graph", "score", "cache", "latency", "budget")
+TOPICS = ("design", "ops", "retrieval", "safety", "perf", None)
+ENTRY_TYPES = ("write", "apply", "test", "publish", "rehydrate", "plan")
+
+
+def _rng(seed, size, stream):
+    # String seeds hash deterministically, unlike hash() of a tuple
+    return random.Random(f"{seed}:{size}:{stream}")
+
+
+def _ts(i):
+    return (BASE_TS + timedelta(seconds=i)).isoformat() + "Z"
+
+
+def _sentence(rng, low=6, high=24):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _write_lines(path, lines, chunk=10_000):
+    """Write an iterable of lines (without newlines) in chunks"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == chunk:
+                f.write("\n".join(batch) + "\n")
+                batch.clear()
+        if batch:
+            f.write("\n".join(batch) + "\n")
+
+
+def iter_atoms(size, seed):
+    rng = _rng(seed, size, "atoms")
+    for i in range(size):
+        text = _sentence(rng)
+        atom = {
+            "id": f"{rng.getrandbits(128):032x}",
+            "ts": _ts(i),
+            "author": rng.choice(("bench", "alice", "bob")),
+            "role": rng.choice(("user", "agent")),
+            "text": text,
+            "embedding": embedder.vector(text)
+        }
+        topic = rng.choice(TOPICS)
+        if topic:
+            atom["topic"] = topic
+        yield json.dumps(atom)
+
+
+def iter_trail(size, seed):
+    """Logbook entries, with an `ingest` line (as cmd_ingest writes) every fourth line"""
+    rng = _rng(seed, size, "trail")
+    for i in range(size):
+        if i % 4 == 3:
+            yield f"ingest {rng.getrandbits(128):032x} {_sentence(rng, 3, 8)[:60]}"
+            continue
+        entry = {"ts": _ts(i), "type": rng.choice(ENTRY_TYPES),
+                 "data": {"file": f"file{rng.randrange(100)}.py", "note": _sentence(rng, 2, 10)}}
+        entry["hash"] = hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+        yield json.dumps(entry)
+
+
+def make_workspace_lines(size, seed):
+    """size lines of code-like text and a copy with EDIT_RATIO of its lines changed"""
+    rng = _rng(seed, size, "workspace")
+    original = []
+    for i in range(size):
+        kind = rng.random()
+        if kind < 0.1:
+            original.append("")
+        elif kind < 0.2:
+            original.append(f"def {rng.choice(WORDS)}_{i}({rng.choice(WORDS)}):")
+        else:
+            original.append(f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randrange(1000)})  # {i}")
+
+    edited = list(original)
+    for _ in range(max(1, int(size * EDIT_RATIO))):
+        pos = rng.randrange(len(edited))
+        op = rng.random()
+        if op < 0.5:
+            edited[pos] = f"    edited = {pos}"
+        elif op < 0.75:
+            edited.insert(pos, f"    inserted = {pos}")
+        elif len(edited) > 1:
+            del edited[pos]
+    return original, edited
+
+
+def corpus_dir(out, size):
+    return Path(out) / str(size)
+
+
+def is_complete(out, size, seed):
+    meta_path = corpus_dir(out, size) / "meta.json"
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return False
+    return meta.get("version") == VERSION and meta.get("seed") == seed and meta.get("size") == size
+
+
+def generate(out, size, seed=1, force=False):
+    """Write the corpus for one size unless an identical one is already there; returns its directory"""
+    directory = corpus_dir(out, size)
+    if not force and is_complete(out, size, seed):
+        return directory
+
+    (directory / "workspace").mkdir(parents=True, exist_ok=True)
+    (directory / "meta.json").unlink(missing_ok=True)
+    _write_lines(directory / "atoms.jsonl", iter_atoms(size, seed))
+    _write_lines(directory / "trail.log", iter_trail(size, seed))
+    original, edited = make_workspace_lines(size, seed)
+    _write_lines(directory / "workspace" / "large.txt", original)
+    _write_lines(directory / "workspace" / "large.edited.txt", edited)
+    (directory / "meta.json").write_text(
+        json.dumps({"version": VERSION, "seed": seed, "size": size}) + "\n", encoding="utf-8")
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the benchmark corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--out", default=str(DEFAULT_DIR), help="Corpus directory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="Regenerate even if up to date")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        directory = generate(args.out, size, args.seed, args.force)
+        total = sum(p.stat().st_size for p in directory.rglob("*") if p.is_file())
+        print(f"{size:>9}  {total / 1024 / 1024:>8.1f} MB  {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Diff backend benchmark
+Times each diffs.create_diff backend on synthetic files of 10k-1M lines.
+
+    python bench/diff_backends.py
+    python bench/diff_backends.py --sizes 10000 100000 --backends patience myers
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from cagecore import diffs, diffalgo
+
+
+def make_pair(lines, kind, edit_ratio, seed):
+    """Build an original/new text pair with a fraction of lines edited"""
+    rng = random.Random(seed)
+    if kind == "repetitive":
+        vocab = [f"    value = compute({i})\n" for i in range(16)] + ["\n", "}\n", "{\n"]
+        original = [rng.choice(vocab) for _ in range(lines)]
+    else:
+        original = [f"line {i} {rng.getrandbits(32):08x}\n" for i in range(lines)]
+
+    new = list(original)
+    for _ in range(max(1, int(lines * edit_ratio))):
+        pos = rng.randrange(len(new))
+        op = rng.random()
+        if op < 0.5:
+            new[pos] = f"edited {pos}\n"
+        elif op < 0.75:
+            new.insert(pos, f"inserted {pos}\n")
+        elif len(new) > 1:
+            del new[pos]
+    return "".join(original), "".join(new)
+
+
+def run_case(original, new, backend, verify):
+    """Diff one pair with one backend, returning timing and size stats"""
+    start = time.perf_counter()
+    result = diffs.create_diff(original, new, "bench.txt", backend=backend)
+    elapsed = time.perf_counter() - start
+
+    verified = None
+    if verify:
+        verified = diffs.apply_patch(original, result["diff"]) == new
+
+    changed = sum(1 for line in result["diff"].splitlines() if line[:1] in "+-" and line[:3] not in ("+++", "---"))
+    return {"seconds": elapsed, "diff_bytes": len(result["diff"]), "changed_lines": changed, "verified": verified}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark diff backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=diffalgo.backend_names())
+    parser.add_argument("--kinds", nargs="+", default=["text", "repetitive"])
+    parser.add_argument("--edit-ratio", type=float, default=0.001, help="Fraction of lines edited")
+    parser.add_argument("--difflib-max-lines", type=int, default=100_000,
+                        help="Skip the difflib backend above this many lines")
+    parser.add_argument("--verify", action="store_true", help="Round-trip each diff through apply_patch")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'kind':<11} {'lines':>9} {'backend':<9} {'seconds':>9} {'diff_kb':>9} {'changed':>8} verified")
+    for kind in args.kinds:
+        for size in args.sizes:
+            original, new = make_pair(size, kind, args.edit_ratio, args.seed)
+            for backend in args.backends:
+                if backend == "difflib" and size > args.difflib_max_lines:
+                    print(f"{kind:<11} {size:>9} {backend:<9} {'skipped':>9}")
+                    continue
+                stats = run_case(original, new, backend, args.verify)
+                print(f"{kind:<11} {size:>9} {backend:<9} {stats['seconds']:>9.3f} "
+                      f"{stats['diff_bytes'] / 1024:>9.1f} {stats['changed_lines']:>8} {stats['verified']}")
+
+
+if __name__ == "__main__":
+    main()
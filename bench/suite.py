@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite
+Runs cage scenarios against the generated corpus and gates on regressions.
+
+    python bench/suite.py run                                  # 10k and 100k, all scenarios
+    python bench/suite.py run --sizes 1000000 --scenarios retrieve_warm status_json
+    python bench/suite.py run --out baseline.json
+    python bench/suite.py compare baseline.json .cage/bench/latest.json --threshold 0.1
+
+Each (scenario, size) runs in a fresh process inside a scratch copy of the
+corpus, so peak RSS and caches belong to that scenario alone. A scenario
+repeats its operation until --max-ops or the --budget seconds run out, and
+reports p50/p99 latency, throughput and the process's peak RSS. `compare`
+exits 1 when any shared result regressed by more than the threshold.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import itertools
+import subprocess
+import contextlib
+from pathlib import Path
+from datetime import datetime
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import corpus
+
+DEFAULT_OUT = ROOT / ".cage" / "bench" / "latest.json"
+DEFAULT_SIZES = [10_000, 100_000]
+QUERIES = ("cage retrieve latency", "publish snapshot", "trail append budget", "graph link score")
+
+# metric -> True when a larger value is worse
+METRICS = {"p50_ms": True, "p99_ms": True, "throughput": False, "peak_rss_kb": True}
+DEFAULT_GATES = ["p50_ms", "throughput", "peak_rss_kb"]
+
+SCENARIOS = {}
+
+
+def scenario(name, files):
+    """Register a scenario that needs the given corpus files copied into its scratch dir.
+
+    The decorated function does the setup and returns the operation to time.
+    """
+    def register(func):
+        SCENARIOS[name] = (func, files)
+        return func
+    return register
+
+
+def _point_room_at(scratch):
+    """Aim the cage's paths (and the cwd-relative ones) at a scratch directory"""
+    from cagecore import room
+    scratch = Path(scratch)
+    room.CAGE_ROOT = scratch
+    room.WORKSPACE_DIR = scratch / "workspace"
+    room.ARTIFACTS_DIR = scratch / "artifacts"
+    room.RULEBOOK_PATH = scratch / "rulebook.json"
+    room.TRAIL_LOG_PATH = scratch / "trail.log"
+    room.STATE_DIR = scratch / ".cage"
+    room.PLAN_QUEUE_PATH = room.STATE_DIR / "plans.jsonl"
+    room.LOCKS_DIR = room.STATE_DIR / "locks"
+    room.BLOBS_DIR = room.STATE_DIR / "blobs"
+    room._resolved_workspace_dir = None
+    room.ensure_directories()
+    os.chdir(scratch)
+
+
+@scenario("ingest", ["atoms.jsonl", "trail.log"])
+def ingest(size):
+    import run
+    counter = itertools.count()
+
+    def op():
+        with contextlib.redirect_stdout(io.StringIO()):
+            run.cmd_ingest("bench", "user", f"bench atom {next(counter)} about cage retrieval", topic="perf")
+    return op
+
+
+@scenario("retrieve_cold", ["atoms.jsonl"])
+def retrieve_cold(size):
+    """What `run.py retrieve` pays: load the index, then search"""
+    from cagecore import retrieval
+    queries = itertools.cycle(QUERIES)
+
+    def op():
+        index = retrieval.AtomIndex()
+        index.refresh()
+        index.search(next(queries), 5)
+    return op
+
+
+@scenario("retrieve_warm", ["atoms.jsonl"])
+def retrieve_warm(size):
+    """A search against the resident index the status server keeps"""
+    from cagecore import retrieval
+    index = retrieval.AtomIndex()
+    index.refresh()
+    queries = itertools.cycle(QUERIES)
+    return lambda: index.search(next(queries), 5)
+
+
+@scenario("logbook_append", ["trail.log"])
+def logbook_append(size):
+    from cagecore import logbook
+    counter = itertools.count()
+    return lambda: logbook.append("bench", {"n": next(counter), "file": "large.txt"})
+
+
+@scenario("recent_entries", ["trail.log"])
+def recent_entries(size):
+    from cagecore import logbook
+    return lambda: logbook.get_recent_entries(10)
+
+
+@scenario("create_diff", ["workspace/large.txt", "workspace/large.edited.txt"])
+def create_diff(size):
+    from cagecore import diffs
+    original = Path("workspace/large.txt").read_text(encoding="utf-8")
+    edited = Path("workspace/large.edited.txt").read_text(encoding="utf-8")
+    return lambda: diffs.create_diff(original, edited, "large.txt")
+
+
+def _status_scenario(path):
+    def setup(size):
+        import status_server
+        client = status_server.APP.test_client()
+
+        def op():
+            response = client.get(path)
+            response.get_data()
+            if response.status_code >= 400:
+                raise RuntimeError(f"GET {path} returned {response.status_code}")
+        return op
+    return setup
+
+
+for _name, _path in (("status_json", "/status.json"), ("status_index", "/"), ("status_files", "/files"),
+                     ("status_retrieve", "/retrieve?q=cage+retrieve+latency&k=5")):
+    scenario(_name, ["atoms.jsonl", "trail.log"])(_status_scenario(_path))
+
+
+def _peak_rss_kb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(name, size, corpus_out, max_ops, min_ops, budget):
+    """Run one scenario in this process (called in the child); returns its result"""
+    setup, files = SCENARIOS[name]
+    source = corpus.corpus_dir(corpus_out, size)
+    scratch = tempfile.mkdtemp(prefix=f"cage-bench-{name}-")
+    try:
+        for rel_path in files:
+            dest = Path(scratch) / rel_path
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source / rel_path, dest)
+        _point_room_at(scratch)
+
+        op = setup(size)
+        latencies = []
+        deadline = time.perf_counter() + budget
+        while len(latencies) < max_ops and (len(latencies) < min_ops or time.perf_counter() < deadline):
+            start = time.perf_counter()
+            op()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "scenario": name,
+        "size": size,
+        "ops": len(latencies),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+        "throughput": round(len(latencies) / total, 2) if total else None,
+        "peak_rss_kb": _peak_rss_kb()
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_run(args):
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}", file=sys.stderr)
+        return 2
+
+    results = []
+    print(f"{'scenario':<16} {'size':>9} {'ops':>5} {'p50_ms':>10} {'p99_ms':>10} {'ops/s':>10} {'rss_mb':>8}")
+    for size in args.sizes:
+        corpus.generate(args.corpus, size, args.seed)
+        for name in names:
+            child = subprocess.run(
+                [sys.executable, __file__, "scenario", name, str(size), "--corpus", args.corpus,
+                 "--max-ops", str(args.max_ops), "--min-ops", str(args.min_ops), "--budget", str(args.budget)],
+                capture_output=True, text=True)
+            if child.returncode != 0:
+                print(f"{name:<16} {size:>9} failed:\n{child.stderr}", file=sys.stderr)
+                results.append({"scenario": name, "size": size, "error": child.stderr.strip().splitlines()[-1:]})
+                continue
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{name:<16} {size:>9} {result['ops']:>5} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} "
+                  f"{result['throughput'] or 0:>10.1f} {result['peak_rss_kb'] / 1024:>8.1f}")
+
+    report = {
+        "meta": {
+            "ts": datetime.utcnow().isoformat() + "Z",
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed
+        },
+        "results": results
+    }
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {out}")
+    return 1 if any("error" in result for result in results) else 0
+
+
+def cmd_scenario(args):
+    result = run_scenario(args.name, args.size, args.corpus, args.max_ops, args.min_ops, args.budget)
+    print(json.dumps(result))
+    return 0
+
+
+def compare(baseline, current, threshold, gates, min_ms=0.0):
+    """Rows of (scenario, size, metric, base, now, change, regressed) for results in both reports"""
+    base_by_key = {(r["scenario"], r["size"]): r for r in baseline["results"] if "error" not in r}
+    rows = []
+    for result in current["results"]:
+        base = base_by_key.get((result["scenario"], result["size"]))
+        if base is None or "error" in result:
+            continue
+        for metric in gates:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change if METRICS[metric] else -change
+            regressed = worse > threshold
+            if regressed and metric.endswith("_ms") and new - old < min_ms:
+                regressed = False  # within timer noise
+            rows.append((result["scenario"], result["size"], metric, old, new, change, regressed))
+    return rows
+
+
+def cmd_compare(args):
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    rows = compare(baseline, current, args.threshold, args.metrics, args.min_ms)
+    if not rows:
+        print("No results in common")
+        return 0
+
+    print(f"{'scenario':<16} {'size':>9} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, size, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{name:<16} {size:>9} {metric:<12} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    regressions = sum(1 for row in rows if row[-1])
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cage benchmark suite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(sub):
+        sub.add_argument("--corpus", default=str(corpus.DEFAULT_DIR), help="Corpus directory")
+        sub.add_argument("--max-ops", type=int, default=200, help="Stop a scenario after this many operations")
+        sub.add_argument("--min-ops", type=int, default=5, help="Run at least this many operations")
+        sub.add_argument("--budget", type=float, default=10.0, help="Seconds per scenario once --min-ops are done")
+
+    run_parser = subparsers.add_parser("run", help="Run scenarios and save results as JSON")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run_parser.add_argument("--scenarios", nargs="+", help=f"Subset of: {', '.join(SCENARIOS)}")
+    run_parser.add_argument("--out", default=str(DEFAULT_OUT), help="Results file")
+    run_parser.add_argument("--seed", type=int, default=1)
+    add_run_options(run_parser)
+
+    scenario_parser = subparsers.add_parser("scenario", help="Run one scenario in this process (used by run)")
+    scenario_parser.add_argument("name", choices=list(SCENARIOS))
+    scenario_parser.add_argument("size", type=int)
+    add_run_options(scenario_parser)
+
+    compare_parser = subparsers.add_parser("compare", help="Fail when current regressed against baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    compare_parser.add_argument("--metrics", nargs="+", choices=list(METRICS), default=DEFAULT_GATES)
+    compare_parser.add_argument("--min-ms", type=float, default=0.05,
+                                help="Ignore latency increases smaller than this many milliseconds")
+
+    args = parser.parse_args()
+    handlers = {"run": cmd_run, "scenario": cmd_scenario, "compare": cmd_compare}
+    sys.exit(handlers[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
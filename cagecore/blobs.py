@@ -0,0 +1,155 @@
+"""
+Blobs (content-addressed snapshot store)
+Keeps each workspace file version once, named by its sha256.
+
+Blobs are read-only copies, never hard links to workspace files: those can
+be rewritten in place (by an editor, `>>`, or write_file_guarded), which
+would change the stored version under its name. Data is copied in the
+kernel (copy_file_range, else sendfile) and hashed as it lands, so a blob is
+always named by the sha256 of the bytes actually stored.
+"""
+
+import os
+import uuid
+import errno
+import shutil
+import hashlib
+from pathlib import Path
+from . import room
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Bytes moved per copy_file_range/sendfile call
+COPY_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+class VerifyError(ValueError):
+    """A file or its copy did not hash to the expected sha256"""
+
+
+def blob_path(blob_id):
+    """Path of a blob inside the store (fanned out by the first two hex digits)"""
+    return room.get_blobs_dir() / blob_id[:2] / blob_id[2:]
+
+
+def has(blob_id):
+    """Check whether a blob is in the store"""
+    return bool(blob_id) and blob_path(blob_id).exists()
+
+
+def sha256_file(path):
+    """sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_file(source, dest):
+    """Copy source to a new file dest and return the sha256 of the bytes written.
+
+    Data moves in the kernel (copy_file_range, else sendfile), falling back to
+    a plain copy where neither is available. Each chunk is hashed back from
+    dest right after it lands, while it is still in the page cache, so the
+    hash covers exactly what was copied even if source changes meanwhile.
+    """
+    with open(source, "rb") as src, open(dest, "w+b") as dst:
+        size = os.fstat(src.fileno()).st_size
+        for name in ("copy_file_range", "sendfile"):
+            call = getattr(os, name, None)
+            if call is None:
+                continue
+            digest = hashlib.sha256()
+            try:
+                offset = 0
+                while offset < size:
+                    if name == "copy_file_range":
+                        sent = call(src.fileno(), dst.fileno(), min(COPY_CHUNK_BYTES, size - offset), offset, offset)
+                    else:
+                        sent = call(dst.fileno(), src.fileno(), offset, min(COPY_CHUNK_BYTES, size - offset))
+                    if sent == 0:
+                        break
+                    for start in range(offset, offset + sent, HASH_CHUNK_BYTES):
+                        digest.update(os.pread(dst.fileno(), min(HASH_CHUNK_BYTES, offset + sent - start), start))
+                    offset += sent
+                if offset == size:
+                    return digest.hexdigest()
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF):
+                    raise
+            dst.seek(0)
+            dst.truncate()
+        src.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: src.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+        return digest.hexdigest()
+
+
+def _staged_copy(source, directory):
+    """Copy source to a temp file in directory; returns (temp path, sha256 of the copy)"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_name = directory / f".{uuid.uuid4().hex}.tmp"
+    try:
+        return tmp_name, _copy_file(source, tmp_name)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def put_file(path, sha256=None):
+    """Snapshot a file into the store as a read-only copy and return its blob id.
+
+    The id is the sha256 of the bytes copied. When the caller expects a
+    particular sha256 (e.g. the one its tests passed for), a file that no
+    longer matches it raises VerifyError and nothing is stored. Content
+    already in the store is only hashed, not stored again.
+    """
+    if sha256 and has(sha256):
+        if sha256_file(path) != sha256:
+            raise VerifyError(f"{path} does not match sha256 {sha256[:12]}")
+        return sha256
+
+    tmp_name, blob_id = _staged_copy(path, room.get_blobs_dir())
+    try:
+        if sha256 and blob_id != sha256:
+            raise VerifyError(f"{path} does not match sha256 {sha256[:12]}")
+        os.chmod(tmp_name, 0o444)
+        dest = blob_path(blob_id)
+        dest.parent.mkdir(exist_ok=True)
+        os.replace(tmp_name, dest)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    return blob_id
+
+
+def copy_out(blob_id, dest, mode=None):
+    """Atomically place a copy of a blob at dest.
+
+    The copy is staged beside dest, checked against the blob id as it is
+    written and renamed into place; a mismatch raises VerifyError and leaves
+    dest untouched. mode sets the new file's permissions (default: those of
+    the file it replaces, if any).
+    """
+    if not has(blob_id):
+        raise FileNotFoundError(f"Blob {blob_id} is not in the store")
+    dest = Path(dest)
+    tmp_name, sha256 = _staged_copy(blob_path(blob_id), dest.parent)
+    try:
+        if sha256 != blob_id:
+            raise VerifyError(f"Copy of blob {blob_id[:12]} does not match its sha256")
+        if mode is None and dest.exists():
+            mode = dest.stat().st_mode & 0o7777
+        os.chmod(tmp_name, 0o644 if mode is None else mode)
+        os.replace(tmp_name, dest)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
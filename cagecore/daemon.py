@@ -0,0 +1,184 @@
+"""
+Daemon (resident cage process)
+Serves run.py commands over a Unix domain socket from one warm process.
+
+The daemon keeps what every cold run would rebuild: the rehydrated session,
+the rulebook and plan queue (cached until their files change), the trail
+tail and the retrieval index. It listens on .cage/daemon.sock.
+
+Protocol: one JSON object per line in each direction.
+
+    {"op": "run", "argv": [...], "cwd": "..."} -> {"status": 0, "stdout": "...", "stderr": "..."}
+    {"op": "ping"}                             -> {"ok": true, "pid": ..., "uptime": ..., "requests": ...}
+    {"op": "stop"}                             -> {"ok": true}
+
+A request the daemon will not serve gets {"error": "..."}; the client then
+runs the command in-process instead.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import contextlib
+import socketserver
+from . import room
+
+# Seconds the client waits to connect before running in-process
+CONNECT_TIMEOUT_SECONDS = 0.5
+
+def socket_path():
+    return room.get_daemon_socket_path()
+
+
+def log_path():
+    return room.get_state_dir() / "daemon.log"
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Accepts clients on threads; commands run one at a time under run_lock"""
+
+    daemon_threads = True
+
+    def __init__(self, path, execute):
+        self.execute = execute
+        self.run_lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.cwd = os.getcwd()
+        super().__init__(str(path), DaemonHandler)
+        os.chmod(str(path), 0o600)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                self._reply({"error": "bad request"})
+                continue
+            self._reply(self._serve(request))
+
+    def _reply(self, response):
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def _serve(self, request):
+        server = self.server
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - server.started, 3),
+                    "requests": server.requests}
+        if op == "stop":
+            threading.Thread(target=server.shutdown, daemon=True).start()
+            return {"ok": True}
+        if op != "run":
+            return {"error": f"unknown op {op!r}"}
+        if request.get("cwd") != server.cwd:
+            # Some commands use paths relative to the working directory
+            return {"error": f"daemon serves {server.cwd}"}
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with server.run_lock, contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            server.requests += 1
+            status = server.execute(request.get("argv", []))
+        return {"status": status, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+def _connect(path=None):
+    """A socket connected to the daemon, or None when none is listening"""
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)  # commands may take as long as they take
+    return sock
+
+
+def _exchange(sock, message):
+    """Send one request on sock; returns (sent, response).
+
+    sent is False when the daemon went away before taking the request, and
+    response is None when it took the request but never answered.
+    """
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(message).encode("utf-8") + b"\n")
+            stream.flush()
+        except OSError:
+            return False, None
+        try:
+            line = stream.readline()
+        except OSError:
+            line = b""
+    return True, json.loads(line) if line else None
+
+
+def request(message, path=None):
+    """Send one request and return the response, or None if no daemon answered"""
+    sock = _connect(path)
+    return _exchange(sock, message)[1] if sock else None
+
+
+def stop(timeout=10.0):
+    """Ask the daemon to stop and wait for it to let go of the socket; False if none was running"""
+    if not request({"op": "stop"}):
+        return False
+    path = socket_path()
+    deadline = time.monotonic() + timeout
+    while path.exists() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return True
+
+
+def forward(argv):
+    """Run a command in the daemon and replay its output here.
+
+    Returns the exit status, or None when the command should run in-process
+    (no daemon, or one that declined it). Once the daemon has accepted a
+    command there is no fallback, so nothing can run twice.
+    """
+    sock = _connect()
+    if sock is None:
+        return None
+    sent, response = _exchange(sock, {"op": "run", "argv": argv, "cwd": os.getcwd()})
+    if not sent:
+        return None
+    if response is None:
+        print("The cage daemon closed the connection before replying.", file=sys.stderr)
+        return 1
+    if "error" in response:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+def serve(execute):
+    """Serve on the socket until stopped; execute(argv) runs one command and returns its status"""
+    path = socket_path()
+    if path.exists():
+        if request({"op": "ping"}, path):
+            raise RuntimeError(f"A cage daemon is already running on {path}")
+        path.unlink()  # left behind by a daemon that died
+
+    server = DaemonServer(path, execute)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
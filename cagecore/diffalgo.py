@@ -0,0 +1,330 @@
+"""
+Diff algorithms (pluggable line diff backends)
+Computes edit opcodes over interned line ids for diffs.create_diff.
+"""
+
+import time
+import difflib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Inputs at or below this many lines use difflib for the most familiar output
+SMALL_INPUT_LINES = 2000
+
+# Wall-clock budget for one diff before regions are emitted as plain replaces
+DIFF_TIMEOUT_SECONDS = 5.0
+
+# Largest edit distance Myers will search for inside a single region
+MYERS_MAX_COST = 1024
+
+# Lines per side searched at once when a region is too costly for one Myers pass
+MYERS_WINDOW = 2000
+
+_BACKENDS = {}
+
+
+def register_backend(name, func):
+    """Register a backend: func(a_ids, b_ids, deadline) -> list of opcodes"""
+    _BACKENDS[name] = func
+
+
+def get_backend(name):
+    """Look up a registered backend by name"""
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown diff backend: {name}")
+    return _BACKENDS[name]
+
+
+def backend_names():
+    """List registered backend names"""
+    return sorted(_BACKENDS)
+
+
+def choose_backend(a_len, b_len):
+    """Pick a backend from input size: difflib for small inputs, patience otherwise"""
+    if max(a_len, b_len) <= SMALL_INPUT_LINES:
+        return "difflib"
+    return "patience"
+
+
+def iter_split_lines(text, chunk_chars=1 << 20):
+    """Yield lines split on '\\n' only, keeping line endings.
+
+    Works through the text a chunk at a time so no full list of lines is ever
+    built next to the original string.
+    """
+    start, length = 0, len(text)
+    while start < length:
+        end = text.find("\n", start + chunk_chars) + 1 if start + chunk_chars < length else length
+        if end <= 0:
+            end = length
+        parts = text[start:end].split("\n")
+        last = parts.pop()
+        for part in parts:
+            yield part + "\n"
+        if last:
+            yield last
+        start = end
+
+
+def intern_lines(text, table):
+    """Map each line of text to a small int id shared across both diff sides.
+
+    `table` maps line -> id in first-seen order, so list(table) maps ids back
+    to lines and repeated lines are stored once no matter how often they occur.
+    """
+    ids = array("l")
+    setdefault = table.setdefault
+    batch = []
+    for line in iter_split_lines(text):
+        batch.append(line)
+        if len(batch) >= 65536:
+            ids.extend([setdefault(item, len(table)) for item in batch])
+            batch = []
+    ids.extend([setdefault(item, len(table)) for item in batch])
+    return ids
+
+
+def opcodes_from_blocks(blocks, a_len, b_len):
+    """Turn sorted (i, j, size) matching runs into SequenceMatcher-style opcodes"""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in list(blocks) + [(a_len, b_len, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def group_opcodes(opcodes, n=3):
+    """Split opcodes into hunks with n lines of context (as difflib does)"""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > n + n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _merge_runs(runs):
+    """Sort matching runs and merge the ones that touch"""
+    runs.sort()
+    merged = []
+    for i, j, size in runs:
+        if size <= 0:
+            continue
+        if merged:
+            pi, pj, psize = merged[-1]
+            if pi + psize == i and pj + psize == j:
+                merged[-1] = (pi, pj, psize + size)
+                continue
+        merged.append((i, j, size))
+    return merged
+
+
+def _difflib_opcodes(a, b, deadline):
+    """Backend: difflib's SequenceMatcher over the interned ids"""
+    return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+
+def _myers_runs(a, b, alo, ahi, blo, bhi, deadline, max_cost=MYERS_MAX_COST):
+    """Greedy Myers O(ND) search on a region; None if it exceeds cost or time"""
+    n, m = ahi - alo, bhi - blo
+    limit = min(n + m, max_cost)
+    off = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+
+    for d in range(limit + 1):
+        if d % 32 == 0 and time.monotonic() > deadline:
+            return None
+        trace.append(v[off - d:off + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[off + k - 1] < v[off + k + 1]):
+                x = v[off + k + 1]
+            else:
+                x = v[off + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[off + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m, alo, blo)
+    return None
+
+
+def _myers_backtrack(trace, x, y, alo, blo):
+    """Recover the matching runs from the saved Myers frontiers"""
+    runs = []
+    for d in range(len(trace) - 1, -1, -1):
+        if d == 0:
+            if x > 0:
+                runs.append((alo, blo, x))
+            break
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d] < v[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d]
+        prev_y = prev_x - prev_k
+        snake_x = prev_x + (1 if prev_k == k - 1 else 0)
+        if x > snake_x:
+            runs.append((alo + snake_x, blo + snake_x - k, x - snake_x))
+        x, y = prev_x, prev_y
+    return runs
+
+
+def _windowed_myers_runs(a, b, alo, ahi, blo, bhi, deadline, window=MYERS_WINDOW):
+    """Myers over sliding windows, for regions too costly to search in one go.
+
+    The alignment forced at a cut-off window end is unreliable, so only matches
+    from the first half of each window are kept and the next window starts
+    where the last kept match ends. Windows that still exceed the cost limit
+    are left as a replace.
+    """
+    runs = []
+    half = window // 2
+    while alo < ahi and blo < bhi and time.monotonic() <= deadline:
+        a_end, b_end = min(ahi, alo + window), min(bhi, blo + window)
+        found = _myers_runs(a, b, alo, a_end, blo, b_end, deadline)
+        if found and a_end == ahi and b_end == bhi:
+            runs.extend(found)
+            break
+
+        keep = []
+        for i, j, size in found or []:
+            size = min(size, alo + half - i, blo + half - j)
+            if size > 0:
+                keep.append((i, j, size))
+        if not keep:
+            alo, blo = min(ahi, alo + half), min(bhi, blo + half)
+            continue
+
+        runs.extend(keep)
+        i, j, size = max(keep)
+        alo, blo = i + size, j + size
+    return runs
+
+
+def _region_runs(a, b, alo, ahi, blo, bhi, deadline):
+    """Match a region without anchors: one Myers pass, else windowed Myers"""
+    found = _myers_runs(a, b, alo, ahi, blo, bhi, deadline)
+    if found is None:
+        found = _windowed_myers_runs(a, b, alo, ahi, blo, bhi, deadline)
+    return found
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Longest increasing run of lines that occur exactly once on both sides"""
+    count_a = Counter(a[alo:ahi])
+    count_b = Counter(b[blo:bhi])
+    pos_a = {line_id: i for i, line_id in enumerate(a[alo:ahi], alo)
+             if count_a[line_id] == 1 and count_b.get(line_id) == 1}
+    if not pos_a:
+        return []
+    candidates = [(pos_a[line_id], j) for j, line_id in enumerate(b[blo:bhi], blo) if line_id in pos_a]
+
+    # Patience sort: longest subsequence increasing in i (already increasing in j)
+    tails, tail_idx, back = [], [], [-1] * len(candidates)
+    for idx, (i, _j) in enumerate(candidates):
+        pos = bisect_left(tails, i)
+        if pos:
+            back[idx] = tail_idx[pos - 1]
+        if pos == len(tails):
+            tails.append(i)
+            tail_idx.append(idx)
+        else:
+            tails[pos] = i
+            tail_idx[pos] = idx
+
+    anchors = []
+    idx = tail_idx[-1]
+    while idx >= 0:
+        anchors.append(candidates[idx])
+        idx = back[idx]
+    anchors.reverse()
+    return anchors
+
+
+def _patience_opcodes(a, b, deadline):
+    """Backend: patience anchors on unique lines, Myers inside the gaps"""
+    runs = []
+    stack = [(0, len(a), 0, len(b))]
+    timed_out = False
+
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start:
+            runs.append((start, blo - (alo - start), alo - start))
+
+        end = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if end > ahi:
+            runs.append((ahi, bhi, end - ahi))
+
+        if alo == ahi or blo == bhi or timed_out:
+            continue
+        if time.monotonic() > deadline:
+            timed_out = True
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            prev_i, prev_j = alo, blo
+            for i, j in anchors:
+                if i > prev_i or j > prev_j:
+                    stack.append((prev_i, i, prev_j, j))
+                runs.append((i, j, 1))
+                prev_i, prev_j = i + 1, j + 1
+            stack.append((prev_i, ahi, prev_j, bhi))
+        else:
+            runs.extend(_region_runs(a, b, alo, ahi, blo, bhi, deadline))
+
+    return opcodes_from_blocks(_merge_runs(runs), len(a), len(b))
+
+
+def _myers_opcodes(a, b, deadline):
+    """Backend: Myers over the whole input, windowed when the edit distance is large"""
+    runs = _region_runs(a, b, 0, len(a), 0, len(b), deadline)
+    return opcodes_from_blocks(_merge_runs(runs), len(a), len(b))
+
+
+register_backend("difflib", _difflib_opcodes)
+register_backend("patience", _patience_opcodes)
+register_backend("myers", _myers_opcodes)
+
+
+def compute_opcodes(a_ids, b_ids, backend=None, timeout=DIFF_TIMEOUT_SECONDS):
+    """Run the named backend (or the size-chosen one) within a time budget"""
+    name = backend or choose_backend(len(a_ids), len(b_ids))
+    deadline = time.monotonic() + timeout
+    return get_backend(name)(a_ids, b_ids, deadline)
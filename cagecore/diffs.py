@@ -3,22 +3,86 @@ Diffs (make/apply unified diffs)
 Handles creation and application of unified diff patches.
 """
 
-import difflib
-from . import workbench, executor
+import re
+from collections import deque
+from . import workbench, diffalgo, perf
 
+NO_NEWLINE_MARKER = "\\ No newline at end of file"
 
-def create_diff(original_content, new_content, filename):
-    """Create a unified diff between original and new content"""
-    original_lines = original_content.splitlines(keepends=True)
-    new_lines = new_content.splitlines(keepends=True)
+# How far (in lines) a hunk may have drifted from the position in its header
+DEFAULT_MAX_OFFSET = 100
 
-    diff_lines = list(difflib.unified_diff(
-        original_lines,
-        new_lines,
-        fromfile=f"a/{filename}",
-        tofile=f"b/{filename}",
-        lineterm=""
-    ))
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """Raised when a patch cannot be parsed or does not apply"""
+    pass
+
+
+def split_lines(text):
+    """Split text on '\\n' only, keeping line endings (matches how files are streamed)"""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def _format_range(start, stop):
+    """Format a hunk range the way difflib's unified_diff does"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+@perf.span("diff")
+def create_diff(original_content, new_content, filename, backend=None, context=3):
+    """Create a unified diff between original and new content.
+
+    Lines are interned to int ids so repeated lines are stored once, and the
+    edit script comes from a pluggable backend (see diffalgo); by default
+    difflib for small inputs and patience/Myers for large ones.
+    """
+    table = {}
+    a_ids = diffalgo.intern_lines(original_content, table)
+    b_ids = diffalgo.intern_lines(new_content, table)
+    lines = list(table)
+    del table
+
+    opcodes = diffalgo.compute_opcodes(a_ids, b_ids, backend=backend)
+
+    diff_lines = []
+
+    def emit(prefix, line_id):
+        line = lines[line_id]
+        if line.endswith("\n"):
+            diff_lines.append(prefix + line)
+        else:
+            diff_lines.append(prefix + line + "\n" + NO_NEWLINE_MARKER + "\n")
+
+    for group in diffalgo.group_opcodes(opcodes, context):
+        if not diff_lines:
+            diff_lines.append(f"--- a/{filename}\n")
+            diff_lines.append(f"+++ b/{filename}\n")
+        first, last = group[0], group[-1]
+        diff_lines.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for i in range(i1, i2):
+                    emit(" ", a_ids[i])
+                continue
+            if tag in ("replace", "delete"):
+                for i in range(i1, i2):
+                    emit("-", a_ids[i])
+            if tag in ("replace", "insert"):
+                for j in range(j1, j2):
+                    emit("+", b_ids[j])
 
     diff_text = "".join(diff_lines)
 
@@ -28,39 +92,211 @@ def create_diff(original_content, new_content, filename):
     }
 
 
-def apply_diff(filename: str, original: str, new: str) -> dict:
-    """Apply a diff by writing the new content to the file"""
-    try:
-        # Set diff mode active for the duration of the write
-        executor.DIFF_MODE_ACTIVE = True
-        workbench.write_file_guarded(filename, new)
-        return {"success": True}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-    finally:
-        executor.DIFF_MODE_ACTIVE = False
+def parse_patch(diff_text):
+    """Parse a unified diff into a list of hunks.
 
+    Each hunk is a dict with old/new start and length (as in the '@@' header)
+    and 'lines', a list of (op, text) pairs where op is ' ', '-' or '+' and
+    text keeps its line ending unless the line had none in the file.
+    """
+    hunks = []
+    hunk = None
+    old_left = new_left = 0
+
+    for raw in split_lines(diff_text):
+        line = raw[:-1] if raw.endswith("\n") else raw
+
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            if line.startswith("\\"):
+                _strip_last_newline(hunk)
+                continue
+            op, text = (line[0], raw[1:]) if line else (" ", raw)
+            if op == " ":
+                old_left -= 1
+                new_left -= 1
+            elif op == "-":
+                old_left -= 1
+            elif op == "+":
+                new_left -= 1
+            else:
+                raise PatchError(f"Unexpected line in hunk: {line!r}")
+            if old_left < 0 or new_left < 0:
+                raise PatchError(f"Hunk longer than its header: {line!r}")
+            hunk["lines"].append((op, text))
+            continue
+
+        if line.startswith("\\") and hunk is not None:
+            _strip_last_newline(hunk)
+            continue
+
+        match = _HUNK_HEADER.match(line)
+        if match:
+            old_start, old_len, new_start, new_len = match.groups()
+            hunk = {
+                "old_start": int(old_start),
+                "old_len": int(old_len) if old_len is not None else 1,
+                "new_start": int(new_start),
+                "new_len": int(new_len) if new_len is not None else 1,
+                "lines": []
+            }
+            old_left, new_left = hunk["old_len"], hunk["new_len"]
+            hunks.append(hunk)
+        elif hunk is not None and line and not line.startswith(("---", "+++", "diff ", "index ")):
+            raise PatchError(f"Unexpected line between hunks: {line!r}")
+
+    if old_left > 0 or new_left > 0:
+        raise PatchError("Patch ends in the middle of a hunk")
+
+    return hunks
 
-def apply_patch(original_content, diff_text):
-    """Apply a unified diff patch to original content"""
-    # Simple implementation: for this demo, we'll just return the patched result
-    # In a real system, you'd parse the diff and apply it line by line
-    try:
-        # This is a simplified implementation
-        # In practice, you'd parse the unified diff format properly
-        lines = diff_text.split('\n')
 
-        # Find the replacement in the diff
-        add_lines = []
-        for line in lines:
-            if line.startswith('+') and not line.startswith('+++'):
-                add_lines.append(line[1:])
+def _strip_last_newline(hunk):
+    """Apply a '\\ No newline at end of file' marker to the previous hunk line"""
+    if not hunk["lines"]:
+        raise PatchError("No-newline marker without a preceding line")
+    op, text = hunk["lines"][-1]
+    if text.endswith("\n"):
+        hunk["lines"][-1] = (op, text[:-1])
 
-        # For this simple case, assume it's a straight replacement
-        if add_lines:
-            return '\n'.join(add_lines)
 
-        return original_content
+def reverse_hunks(hunks):
+    """Swap the sides of each hunk so the patch undoes itself"""
+    swap = {" ": " ", "-": "+", "+": "-"}
+    return [{
+        "old_start": hunk["new_start"],
+        "old_len": hunk["new_len"],
+        "new_start": hunk["old_start"],
+        "new_len": hunk["old_len"],
+        "lines": [(swap[op], text) for op, text in hunk["lines"]]
+    } for hunk in hunks]
 
+
+def _fuzzed_variants(hunk, fuzz):
+    """Yield (lead, lines) with up to `fuzz` context lines trimmed from each end"""
+    lines = hunk["lines"]
+    seen = set()
+    for level in range(fuzz + 1):
+        lead = 0
+        while lead < level and lead < len(lines) and lines[lead][0] == " ":
+            lead += 1
+        trail = 0
+        while trail < level and trail < len(lines) - lead and lines[len(lines) - 1 - trail][0] == " ":
+            trail += 1
+        if (lead, trail) in seen:
+            continue
+        seen.add((lead, trail))
+        yield lead, lines[lead:len(lines) - trail]
+
+
+def iter_patched_lines(source_lines, hunks, fuzz=0, max_offset=DEFAULT_MAX_OFFSET):
+    """Stream the result of applying hunks to an iterable of source lines.
+
+    Only a window of roughly (hunk size + 2 * max_offset) lines is held in
+    memory; everything outside a hunk is passed straight through. Context and
+    removed lines are verified against the source. A hunk may be found up to
+    `max_offset` lines away from its header position, and up to `fuzz` context
+    lines may be ignored at each end of a hunk.
+    """
+    source = iter(source_lines)
+    window = deque()
+    window_start = 0  # source index of window[0]
+    exhausted = False
+    drift = 0
+
+    def fill_to(index):
+        nonlocal exhausted
+        while not exhausted and window_start + len(window) < index:
+            try:
+                window.append(next(source))
+            except StopIteration:
+                exhausted = True
+
+    def matches(at, old_lines):
+        if at < window_start:
+            return False
+        fill_to(at + len(old_lines))
+        if at + len(old_lines) > window_start + len(window):
+            return False
+        return all(window[at - window_start + i] == text for i, text in enumerate(old_lines))
+
+    for number, hunk in enumerate(sorted(hunks, key=lambda h: h["old_start"]), start=1):
+        base = hunk["old_start"] - 1 if hunk["old_len"] else hunk["old_start"]
+        expected = base + drift
+
+        # Anything well before the search window can be emitted now
+        flush_to = max(window_start, expected - max_offset)
+        fill_to(flush_to)
+        while window and window_start < flush_to:
+            yield window.popleft()
+            window_start += 1
+
+        found = None
+        for lead, lines in _fuzzed_variants(hunk, fuzz):
+            old_lines = [text for op, text in lines if op != "+"]
+            for delta in range(max_offset + 1):
+                for at in ((expected + lead + delta,) if delta == 0 else
+                           (expected + lead - delta, expected + lead + delta)):
+                    if matches(at, old_lines):
+                        found = (at, lead, lines)
+                        break
+                if found:
+                    break
+            if found:
+                break
+
+        if not found:
+            raise PatchError(f"Hunk #{number} does not apply at line {hunk['old_start']}")
+
+        at, lead, lines = found
+        drift = at - lead - base
+
+        while window_start < at:
+            yield window.popleft()
+            window_start += 1
+
+        for op, text in lines:
+            if op == " ":
+                yield window.popleft()
+                window_start += 1
+            elif op == "-":
+                window.popleft()
+                window_start += 1
+            else:
+                yield text
+
+    while window:
+        yield window.popleft()
+    yield from source
+
+
+def apply_patch(original_content, diff_text, fuzz=0, reverse=False):
+    """Apply a unified diff patch to original content and return the result"""
+    hunks = parse_patch(diff_text)
+    if reverse:
+        hunks = reverse_hunks(hunks)
+    return "".join(iter_patched_lines(split_lines(original_content), hunks, fuzz=fuzz))
+
+
+def apply_diff(filename: str, diff_text: str, token, reverse: bool = False, fuzz: int = 0) -> dict:
+    """Apply a unified diff to a workspace file.
+
+    `token` is the referee.DiffToken authorizing this write. The original is
+    streamed through the patch engine into a temp file next to the target,
+    which then replaces it, so only the changed regions are rewritten in
+    memory and a failed patch leaves the file untouched.
+    """
+    try:
+        hunks = parse_patch(diff_text)
+        if reverse:
+            hunks = reverse_hunks(hunks)
+        if not hunks:
+            return {"success": True}
+
+        workbench.write_lines_guarded(
+            filename,
+            iter_patched_lines(workbench.iter_lines(filename), hunks, fuzz=fuzz),
+            token=token
+        )
+        return {"success": True}
     except Exception as e:
-        raise ValueError(f"Failed to apply patch: {e}")
\ No newline at end of file
+        return {"success": False, "error": str(e)}
@@ -3,83 +3,260 @@ Executor (applies diffs only)
 Executes planned changes using diff-based operations.
 """
 
-from . import diffs, workbench, tests, logbook, referee
+from concurrent.futures import ThreadPoolExecutor
+from . import diffs, workbench, tests, logbook, referee, planner, locks, rewriter, metrics, perf
 
-DIFF_MODE_ACTIVE = False
 
-
-def apply_latest_plan():
+@metrics.timed("cage_apply", mode="latest")
+def apply_latest_plan(stream=False):
     """Apply the latest plan using diff-based operations"""
     plan = planner.get_latest_plan()
     if not plan:
         return {"success": False, "error": "No plan to execute"}
 
+    return apply_plans_to_file(plan["target_file"], [plan], stream=stream)
+
+
+@metrics.timed("cage_apply", mode="all")
+def apply_all_plans(workers=1, stream=False):
+    """Apply every queued plan, one combined diff and test run per target file.
+
+    Target files are independent, so with workers > 1 they are applied on a
+    thread pool; per-file advisory locks keep two workers (or two processes)
+    off the same target.
+    """
+    pending = planner.get_pending_plans()
+    if not pending:
+        return {"success": False, "error": "No plan to execute", "files": {}}
+
+    groups = planner.group_by_target(pending)
+
+    def apply_group(item):
+        filename, plans = item
+        return filename, apply_plans_to_file(filename, plans, stream=stream)
+
+    if workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = dict(pool.map(apply_group, groups.items()))
+    else:
+        results = dict(map(apply_group, groups.items()))
+
+    failed = [name for name, result in results.items() if not result["success"]]
+    if failed:
+        return {"success": False, "error": f"Apply failed for: {', '.join(failed)}", "files": results}
+    skipped = all(result.get("skipped") for result in results.values())
+    return {"success": True, "skipped": skipped, "files": results}
+
+
+def apply_plans_to_file(filename, plans, stream=False):
+    """Apply a sequence of plans that all target the same file.
+
+    Holds the target's advisory lock and a diff token for the whole
+    read-diff-write-test(-revert) cycle. Files at or above the rewriter's
+    size threshold (or any file when stream=True) take the streaming path.
+
+    The plans were read before the lock was taken, so they are checked
+    against the queue again under it: plans another run (or the daemon)
+    applied in the meantime are skipped. Before the lock is released the
+    plans are marked done, or failed with the error, so a plan that cannot
+    apply or fails its tests is not retried by every later run.
+    """
+    path = workbench.get_workspace_path(filename)
+    with locks.file_lock(path), referee.authorize_diff(path) as token:
+        plans = planner.still_pending(plans)
+        if not plans:
+            return {"success": True, "skipped": True}
+        if stream or rewriter.should_stream(filename):
+            result = _apply_streaming(filename, plans, token)
+        else:
+            result = _apply_locked(filename, plans, token)
+        if result["success"]:
+            planner.mark_done(plans)
+        else:
+            planner.mark_failed(plans, result.get("error"))
+        return result
+
+
+def _apply_streaming(filename, plans, token):
+    """Streaming apply: no in-memory copy, no diff, smoke checks in the same pass"""
+    plan_title = "; ".join(plan["title"] for plan in plans)
+    plan_ids = [plan.get("id") for plan in plans]
+
+    try:
+        before_blob = workbench.snapshot(filename)
+        with perf.span("write"):
+            result = rewriter.stream_apply(filename, plans, token)
+
+        after_blob = None
+        if result["success"] and result["tests"]["passed"]:
+            after_blob = workbench.snapshot(filename, sha256=result["sha256"])
+
+        logbook.append("stream_apply", {
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
+            "file": filename,
+            "success": result["success"],
+            "error": result.get("error"),
+            "replacements": result.get("replacements"),
+            "bytes_in": result.get("bytes_in"),
+            "bytes_out": result.get("bytes_out"),
+            "sha256": result.get("sha256"),
+            "before_blob": before_blob,
+            "after_blob": after_blob
+        })
+
+        if not result["success"]:
+            return {"success": False, "error": result.get("error", "Apply failed")}
+
+        test_result = tests.record_result(filename, result["tests"], result["sha256"])
+        logbook.append("tests", {
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
+            "file": filename,
+            "passed": test_result["passed"],
+            "details": test_result["details"]
+        })
+
+        if not test_result["passed"]:
+            return {"success": False, "error": "Tests failed, changes discarded"}
+
+        return {"success": True}
+
+    except Exception as e:
+        error_msg = str(e)
+        logbook.append("apply_error", {
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
+            "error": error_msg
+        })
+        return {"success": False, "error": error_msg}
+
+
+def _apply_locked(filename, plans, token):
+    """Body of apply_plans_to_file, run while holding the lock and token"""
+    plan_title = "; ".join(plan["title"] for plan in plans)
+    plan_ids = [plan.get("id") for plan in plans]
+
     try:
-        # Read the current file content
-        filename = plan["target_file"]
+        # Read the current file content once
         if workbench.file_exists(filename):
             original_content = workbench.read_file(filename)
         else:
             original_content = ""
 
-        # Generate new content
-        new_content = original_content.replace(plan["find_text"], plan["replace_text"])
+        # Generate new content, replacements applied in queue order
+        new_content = original_content
+        with perf.span("plan"):
+            for plan in plans:
+                new_content = planner.apply_to_text(plan, new_content)
 
-        # Create unified diff
+        # Create one combined unified diff
         diff_result = diffs.create_diff(original_content, new_content, filename)
 
         # Log the diff
         logbook.append("diff", {
-            "plan_title": plan["title"],
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
             "file": filename,
             "diff": diff_result["diff"]
         })
 
-        # Apply the diff
-        apply_result = diffs.apply_diff(filename, original_content, new_content)
+        # Snapshot the current version, then apply the diff
+        before_blob = workbench.snapshot(filename)
+        apply_result = diffs.apply_diff(filename, diff_result["diff"], token)
+        after_blob = workbench.snapshot(filename) if apply_result["success"] else None
 
         # Log the apply result
         logbook.append("apply_result", {
-            "plan_title": plan["title"],
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
             "file": filename,
             "success": apply_result["success"],
-            "error": apply_result.get("error")
+            "error": apply_result.get("error"),
+            "before_blob": before_blob,
+            "after_blob": after_blob
         })
 
         if not apply_result["success"]:
             return {"success": False, "error": apply_result.get("error", "Apply failed")}
 
-        # Run tests
+        # Run tests once for the file
         test_result = tests.run_tests(filename)
 
         # Log test results
         logbook.append("tests", {
-            "plan_title": plan["title"],
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
             "file": filename,
             "passed": test_result["passed"],
             "details": test_result["details"]
         })
 
         if not test_result["passed"]:
-            # Revert on test failure
-            revert_result = diffs.apply_diff(filename, new_content, original_content)
+            # Revert on test failure: swap the prior version back in
+            if before_blob:
+                revert_result = _restore_blob(filename, before_blob, token)
+            else:
+                revert_result = diffs.apply_diff(filename, diff_result["diff"], token, reverse=True)
             logbook.append("revert", {
-                "plan_title": plan["title"],
+                "plan_title": plan_title,
+                "plan_ids": plan_ids,
                 "file": filename,
                 "reason": "test_failure",
-                "revert_success": revert_result["success"]
+                "revert_success": revert_result["success"],
+                "before_blob": after_blob,
+                "after_blob": before_blob
             })
             return {"success": False, "error": "Tests failed, changes reverted"}
 
-        # Clear the plan after successful execution
-        planner.clear_current_plan()
-
         return {"success": True}
 
     except Exception as e:
         error_msg = str(e)
         logbook.append("apply_error", {
-            "plan_title": plan["title"],
+            "plan_title": plan_title,
+            "plan_ids": plan_ids,
             "error": error_msg
         })
-        return {"success": False, "error": error_msg}
\ No newline at end of file
+        return {"success": False, "error": error_msg}
+
+
+def _restore_blob(filename, blob_id, token):
+    """Swap a stored version into place with the given diff token"""
+    try:
+        workbench.restore_guarded(filename, blob_id, token=token)
+        return {"success": True}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def restore_version(filename, blob_id, source_entry=None):
+    """Restore any recorded version of a file from the blob store.
+
+    The stored version is copied into place atomically; no diffs are
+    replayed. The restored file is re-tested so the publish gate reflects it.
+    """
+    path = workbench.get_workspace_path(filename)
+    with locks.file_lock(path), referee.authorize_diff(path) as token:
+        before_blob = workbench.snapshot(filename)
+        result = _restore_blob(filename, blob_id, token)
+
+        logbook.append("restore", {
+            "file": filename,
+            "source_entry": source_entry,
+            "success": result["success"],
+            "error": result.get("error"),
+            "before_blob": before_blob,
+            "after_blob": blob_id
+        })
+
+        if not result["success"]:
+            return result
+
+        test_result = tests.run_tests(filename)
+        logbook.append("tests", {
+            "file": filename,
+            "passed": test_result["passed"],
+            "details": test_result["details"]
+        })
+        return {"success": True, "tests_passed": test_result["passed"]}
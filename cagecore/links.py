@@ -0,0 +1,206 @@
+"""
+Links (atom graph index)
+Keeps the links between atoms as a compact adjacency index for retrieval.
+
+links.jsonl is an append-only journal of edges, one per line:
+
+    {"ts": "...", "src": "<atom id>", "dst": "<atom id>", "kind": "answers", "weight": 1.0}
+
+A link connects two atoms both ways. The index resolves atom ids to their
+rows in a retrieval.AtomIndex once, when the edge is read, and keeps the
+graph in CSR form: the neighbours of row r are indices[indptr[r]:indptr[r + 1]]
+with their weights alongside, in flat arrays. Building it is a counting sort
+over the edges, O(atoms + edges), and refresh() reads only the lines appended
+since the last call, like the atom index.
+"""
+
+import os
+import json
+import array
+import threading
+from datetime import datetime
+from . import locks, perf
+
+LINKS_PATH = "links.jsonl"
+
+DEFAULT_KIND = "related"
+
+# Score kept per hop when expanding retrieval hits to their neighbours
+DEFAULT_DECAY = 0.5
+
+
+def make_edge(src, dst, kind=DEFAULT_KIND, weight=1.0):
+    return {
+        "ts": datetime.utcnow().isoformat() + "Z",
+        "src": src,
+        "dst": dst,
+        "kind": kind,
+        "weight": weight
+    }
+
+
+def append(edge, path=LINKS_PATH):
+    """Append one edge to the links journal"""
+    locks.append_record(path, json.dumps(edge) + "\n")
+
+
+class LinkGraph:
+    """Adjacency index of links.jsonl over the rows of an AtomIndex"""
+
+    def __init__(self, path=LINKS_PATH):
+        self.path = path
+        self._src = array.array("q")  # one entry per edge, as rows
+        self._dst = array.array("q")
+        self._weight = array.array("d")
+        self._pending = []  # (src id, dst id, weight) of edges to atoms not indexed yet
+        self.indptr = array.array("q", [0])
+        self.indices = array.array("q")
+        self.weights = array.array("d")
+        self._dirty = False
+        self._rows = 0  # atoms in the index at the last refresh
+        self._generation = None
+        self._offset = 0
+        self._ino = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._src)
+
+    def _reset(self):
+        self._src = array.array("q")
+        self._dst = array.array("q")
+        self._weight = array.array("d")
+        self._pending = []
+        self._dirty = True
+        self._rows = 0
+        self._offset = 0
+
+    def _add(self, index, src, dst, weight):
+        src_row, dst_row = index.ordinal(src), index.ordinal(dst)
+        if src_row is None or dst_row is None:
+            self._pending.append((src, dst, weight))
+        elif src_row != dst_row:
+            self._src.append(src_row)
+            self._dst.append(dst_row)
+            self._weight.append(weight)
+            self._dirty = True
+
+    def _build(self, rows):
+        """CSR arrays for rows atoms from the edge arrays (each edge stored both ways)"""
+        indptr = array.array("q", bytes(8 * (rows + 1)))
+        for row in self._src:
+            indptr[row + 1] += 1
+        for row in self._dst:
+            indptr[row + 1] += 1
+        for row in range(rows):
+            indptr[row + 1] += indptr[row]
+
+        fill = indptr[:-1]
+        indices = array.array("q", bytes(8 * indptr[rows]))
+        weights = array.array("d", bytes(8 * indptr[rows]))
+        for src, dst, weight in zip(self._src, self._dst, self._weight):
+            for a, b in ((src, dst), (dst, src)):
+                indices[fill[a]] = b
+                weights[fill[a]] = weight
+                fill[a] += 1
+        self.indptr, self.indices, self.weights = indptr, indices, weights
+        self._dirty = False
+
+    @perf.span("index")
+    def refresh(self, index):
+        """Read edges appended since the last refresh and rebuild the CSR arrays if any were added.
+
+        index must be refreshed first; the graph starts over when the index
+        renumbered its rows or links.jsonl was replaced or truncated.
+        """
+        with self._lock:
+            if self._generation != index.generation:
+                self._reset()
+                self._generation = index.generation
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+                if self._ino is not None:
+                    self._reset()
+                    self._ino = None
+            if st is not None:
+                if st.st_ino != self._ino or st.st_size < self._offset:
+                    self._reset()
+                    self._ino = st.st_ino
+                if st.st_size > self._offset:
+                    with open(self.path, "rb") as f:
+                        f.seek(self._offset)
+                        data = f.read(st.st_size - self._offset)
+                    cut = data.rfind(b"\n") + 1  # an unterminated last line is still being written
+                    for line in data[:cut].splitlines():
+                        try:
+                            edge = json.loads(line)
+                            self._add(index, edge["src"], edge["dst"], float(edge.get("weight", 1.0)))
+                        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                            continue
+                    self._offset += cut
+            if self._pending and len(index) != self._rows:
+                # Atoms indexed since the last refresh may resolve waiting edges
+                pending, self._pending = self._pending, []
+                for src, dst, weight in pending:
+                    self._add(index, src, dst, weight)
+            self._rows = len(index)
+            if self._dirty:
+                self._build(self._rows)
+
+    def neighbours(self, row):
+        """(row, weight) of every atom linked to row"""
+        with self._lock:
+            if row + 1 >= len(self.indptr):
+                return []
+            start, end = self.indptr[row], self.indptr[row + 1]
+            return list(zip(self.indices[start:end], self.weights[start:end]))
+
+
+def expand(index, graph, hits, hops=1, decay=DEFAULT_DECAY, limit=None):
+    """Atoms linked to the hits within hops links, best first.
+
+    A neighbour scores its parent's score x decay x link weight, so every hop
+    counts for less and an atom reached several ways keeps its best score.
+    Hits are never repeated, and hits that scored 0 or less are not expanded.
+    Returns at most limit atoms (default: as many as there are hits), each
+    with the "via" atom it was reached from and its "hop".
+    """
+    best = {}  # row -> (score, via id, hop)
+    hit_rows = set()
+    frontier = []
+    for hit in hits:
+        row = index.ordinal(hit["id"])
+        if row is not None:
+            hit_rows.add(row)
+            frontier.append((row, hit["score"], hit["id"]))
+
+    for hop in range(1, hops + 1):
+        improved = {}
+        for row, score, atom_id in frontier:
+            if score <= 0:
+                continue
+            for neighbour, weight in graph.neighbours(row):
+                candidate = score * decay * weight
+                if neighbour not in hit_rows and candidate > best.get(neighbour, (0.0,))[0]:
+                    best[neighbour] = improved[neighbour] = (candidate, atom_id, hop)
+        frontier = [(row, score, index.atoms[row]["id"]) for row, (score, _via, _hop) in improved.items()]
+
+    ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))
+    return [dict(index.atoms[row], score=score, via=via, hop=hop)
+            for row, (score, via, hop) in ranked[:len(hits) if limit is None else limit]]
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_graph(path=LINKS_PATH):
+    """The process-wide graph for path, so later commands in the same process
+    only read newly appended links"""
+    with _shared_lock:
+        graph = _shared.get(path)
+        if graph is None:
+            graph = _shared[path] = LinkGraph(path)
+        return graph
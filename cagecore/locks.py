@@ -0,0 +1,56 @@
+"""
+Locks (advisory file locks, atomic appends)
+Keeps concurrent cage workers, threads or processes, off the same target.
+
+Shared journals (trail.log, atoms.jsonl, the .cage/*.jsonl files) are only
+ever appended to with append_record, which hands the kernel each batch of
+whole records in one O_APPEND write, so writers in any number of processes
+never interleave or overwrite each other's lines. Files that are rewritten
+(a read-modify-write, such as rulebook.json) are changed under file_lock.
+"""
+
+import os
+import fcntl
+from contextlib import contextmanager
+from . import room
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an advisory flock on the sidecar lock file for path.
+
+    The lock lives on a separate file under .cage/locks because targets are
+    replaced by rename, which would leave a lock on the target itself behind
+    on the old inode. Each call opens its own descriptor, so threads in one
+    process exclude each other just like separate processes do.
+    """
+    fd = os.open(room.get_lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def append_record(path, data, fsync=False):
+    """Append data (whole newline-terminated records) to path in one O_APPEND write.
+
+    O_APPEND moves the offset to the end of the file and writes in one step,
+    and a local filesystem applies a regular-file write as a unit, so
+    concurrent appenders never land on the same offset or split each other's
+    records. Returns the file size after the write.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            # A short write only happens on a full disk or a signal
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
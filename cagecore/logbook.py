@@ -7,12 +7,11 @@ import json
 import hashlib
 from datetime import datetime
 import os
-from . import room
-from . import workbench
-
+from . import room, locks, metrics, perf
 
 def ensure_exists():
     """Create the trail log if it doesn't exist"""
+    from . import workbench
     trail_path = room.get_trail_log_path()
     if not trail_path.exists():
         workbench.bootstrap_write("trail.log", "")
@@ -34,6 +33,8 @@ def create_entry(entry_type, data):
     return entry
 
 
+@metrics.timed("cage_logbook_append")
+@perf.span("log")
 def append(entry_type, data):
     """Append a new entry to the trail log with size verification"""
     entry = create_entry(entry_type, data)
@@ -43,14 +44,9 @@ def append(entry_type, data):
     # Get size before
     size_before = log_path.stat().st_size if log_path.exists() else 0
 
-    with open(log_path, 'a', encoding='utf-8') as f:
-        json_line = json.dumps(entry) + '\n'
-        f.write(json_line)
-        f.flush()
-        os.fsync(f.fileno())
+    # One O_APPEND write per entry, so concurrent processes never interleave
+    size_after = locks.append_record(log_path, json.dumps(entry) + '\n', fsync=True)
 
-    # Get size after and verify it increased
-    size_after = log_path.stat().st_size
     if size_after < size_before:
         raise ValueError("Log file size decreased - append-only violation")
 
@@ -60,20 +56,87 @@ def guard_append_only() -> bool:
     return bool(_last_append_ok)
 
 
-def get_recent_entries(count=10):
-    """Get the most recent log entries"""
-    entries = []
+def find_entry(hash_prefix):
+    """Find the latest entry whose hash starts with hash_prefix"""
+    found = None
     log_path = room.get_trail_log_path()
 
+    if not hash_prefix or not log_path.exists():
+        return None
+
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if hash_prefix not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and str(entry.get("hash", "")).startswith(hash_prefix):
+                found = entry
+
+    return found
+
+
+def iter_entries(entry_type=None):
+    """Yield every JSON entry in the trail, oldest first, optionally of one type"""
+    log_path = room.get_trail_log_path()
     if not log_path.exists():
-        return entries
+        return
 
+    marker = f'"type": {json.dumps(entry_type)}' if entry_type else None
     with open(log_path, 'r', encoding='utf-8') as f:
         for line in f:
-            if line.strip():
-                try:
-                    entries.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
+            if marker and marker not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and (entry_type is None or entry.get("type") == entry_type):
+                yield entry
+
+
+# Bytes read per step when scanning the trail backwards
+TAIL_BLOCK_BYTES = 64 * 1024
+
+
+def _iter_lines_backwards(path):
+    """Yield the file's lines (bytes, without newlines) from last to first"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        partial = b""
+        while position > 0:
+            step = min(TAIL_BLOCK_BYTES, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + partial).split(b"\n")
+            partial = lines.pop(0)  # may continue in the previous block
+            yield from reversed(lines)
+        yield partial
+
+
+def get_recent_entries(count=10):
+    """Get the most recent log entries.
+
+    Reads the trail backwards from its end, so the cost follows count rather
+    than the length of the trail.
+    """
+    entries = []
+    log_path = room.get_trail_log_path()
+
+    if count <= 0 or not log_path.exists():
+        return entries
 
-    return entries[-count:] if entries else []
\ No newline at end of file
+    for line in _iter_lines_backwards(log_path):
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if len(entries) == count:
+            break
+
+    entries.reverse()
+    return entries
\ No newline at end of file
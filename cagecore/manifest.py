@@ -0,0 +1,311 @@
+"""
+Manifest (incremental workspace index)
+Tracks every workspace file's size, mtime, inode and sha256 without rescanning.
+
+The manifest is an append-only journal in .cage/manifest.jsonl. Guarded
+writes append one "set" record for the file they touched, so listing the
+workspace never needs a walk. refresh() reconciles the journal with the
+disk, re-hashing only files whose stat changed, and then compacts it.
+
+Every workspace directory's mtime and inode are journaled too. After the
+first full scan, refresh() stats the recorded files and directories and
+lists only the directories whose mtime changed (an entry was added, removed
+or renamed in them) plus any new directories found there.
+"""
+
+import os
+import json
+import time
+import stat as stat_module
+from pathlib import Path
+from . import room, locks, blobs
+
+# Compact the journal on refresh once it holds this many more records than files
+COMPACT_SLACK_RECORDS = 1000
+
+
+def _manifest_path():
+    return room.get_state_dir() / "manifest.jsonl"
+
+
+def _is_staging_name(name):
+    """Temp files staged beside a target by workbench and blobs"""
+    return name.startswith(".") and name.endswith(".tmp")
+
+
+def _append(records):
+    """Append records to the journal under the manifest lock"""
+    path = _manifest_path()
+    data = "".join(json.dumps(record) + "\n" for record in records)
+    with locks.file_lock(path):  # compaction rewrites the journal under this lock
+        locks.append_record(path, data)
+
+
+def _apply(state, record):
+    """Replay one journal record into state"""
+    state["count"] += 1
+    op = record.get("op")
+    if op == "set":
+        state["entries"][record["path"]] = record["entry"]
+        state["removed"].pop(record["path"], None)
+    elif op == "del":
+        state["entries"].pop(record["path"], None)
+        state["removed"][record["path"]] = record["ts"]
+    elif op == "dir":
+        state["dirs"][record["path"]] = [record["mtime_ns"], record["ino"]]
+    elif op == "rmdir":
+        state["dirs"].pop(record["path"], None)
+    elif op == "run":
+        state["last_run"] = record["ts"]
+    elif op == "scan":
+        state["scanned"] = True
+
+
+def _load():
+    """Replay the journal into its current state.
+
+    Returns a dict with the entries by path, removed paths with their time,
+    directories with their [mtime_ns, ino], the last run marker, whether a
+    full scan has ever run and the record count.
+    """
+    state = {"entries": {}, "removed": {}, "dirs": {}, "last_run": None, "scanned": False, "count": 0}
+    path = _manifest_path()
+    if not path.exists():
+        return state
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            _apply(state, record)
+    return state
+
+
+def _stat_entry(stat):
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "ino": stat.st_ino}
+
+
+def _same_stat(entry, stat):
+    return (entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["ino"] == stat.st_ino)
+
+
+def _set_record(rel_path, stat, sha256, changed_at):
+    entry = _stat_entry(stat)
+    entry["sha256"] = sha256
+    entry["changed_at"] = changed_at
+    return {"op": "set", "path": rel_path, "entry": entry}
+
+
+def _rel(path):
+    return Path(path).resolve().relative_to(room.get_workspace_dir().resolve()).as_posix()
+
+
+def record(path, sha256=None):
+    """Update the manifest for one workspace file just written or removed.
+
+    Pass sha256 when the writer already hashed the content.
+    """
+    rel_path = _rel(path)
+    if not path.exists():
+        _append([{"op": "del", "path": rel_path, "ts": time.time()}])
+        return
+    stat = path.stat()
+    _append([_set_record(rel_path, stat, sha256 or blobs.sha256_file(path), time.time())])
+
+
+def record_many(written):
+    """Update the manifest for a batch of (rel_path, stat, sha256) writes in one append"""
+    now = time.time()
+    _append([_set_record(rel_path, stat, sha256, now) for rel_path, stat, sha256 in written])
+
+
+def _list_dir(root, rel_dir):
+    """({rel_path: stat} of the files, [rel_dir] of the subdirectories) directly
+    in one workspace directory, or None if it is gone"""
+    files, subdirs = {}, []
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for item in it:
+                rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                if item.is_dir(follow_symlinks=False):
+                    subdirs.append(rel_path)
+                elif item.is_file(follow_symlinks=False) and not _is_staging_name(item.name):
+                    files[rel_path] = item.stat(follow_symlinks=False)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return files, subdirs
+
+
+def _dir_key(root, rel_dir):
+    """[mtime_ns, ino] of a workspace directory, or None if it is gone"""
+    try:
+        st = os.stat(os.path.join(root, rel_dir), follow_symlinks=False)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return [st.st_mtime_ns, st.st_ino] if stat_module.S_ISDIR(st.st_mode) else None
+
+
+def _scan(root, state):
+    """({rel_path: stat} of the workspace files, {rel_dir: [mtime_ns, ino]} of its directories).
+
+    Without a previous full scan every directory is listed. Otherwise only
+    directories whose key changed, and new ones found in those, are listed;
+    the other recorded files are stat'ed one by one.
+    """
+    known_dirs = state["dirs"]
+    full = not state["scanned"] or "" not in known_dirs
+    files, dirs = {}, {}
+    pending = [""] if full else []
+    if not full:
+        for rel_dir, recorded in known_dirs.items():
+            key = _dir_key(root, rel_dir)
+            if key is None:
+                continue
+            dirs[rel_dir] = key
+            if key != recorded:
+                pending.append(rel_dir)
+
+    listed = set()
+    while pending:
+        rel_dir = pending.pop()
+        if rel_dir in listed:
+            continue
+        key = _dir_key(root, rel_dir)  # taken before listing, so a later change shows next time
+        listing = _list_dir(root, rel_dir) if key is not None else None
+        if listing is None:
+            dirs.pop(rel_dir, None)
+            continue
+        listed.add(rel_dir)
+        dirs[rel_dir] = key
+        found, subdirs = listing
+        files.update(found)
+        pending.extend(sub for sub in subdirs if full or sub not in known_dirs)
+
+    for rel_path in state["entries"]:
+        if rel_path in files or rel_path.rpartition("/")[0] in listed:
+            continue  # found, or missing from a directory just listed
+        try:
+            st = os.stat(os.path.join(root, rel_path), follow_symlinks=False)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        if stat_module.S_ISREG(st.st_mode):
+            files[rel_path] = st
+    return files, dirs
+
+
+def _refresh():
+    """refresh(), also returning the manifest state with its records applied"""
+    workspace_dir = room.get_workspace_dir()
+    state = _load()
+    known = state["entries"]
+    now = time.time()
+    changes = {"added": [], "modified": [], "removed": []}
+    records = []
+
+    files, dirs = _scan(str(workspace_dir), state) if workspace_dir.exists() else ({}, {})
+    for rel_path, stat in files.items():
+        entry = known.get(rel_path)
+        if entry and _same_stat(entry, stat):
+            continue
+        sha256 = blobs.sha256_file(os.path.join(workspace_dir, rel_path))
+        if entry and entry["sha256"] == sha256:
+            # Touched but identical: keep the content's changed_at
+            records.append(_set_record(rel_path, stat, sha256, entry["changed_at"]))
+            continue
+        changes["modified" if entry else "added"].append(rel_path)
+        records.append(_set_record(rel_path, stat, sha256, now))
+
+    for rel_path in sorted(set(known) - set(files)):
+        changes["removed"].append(rel_path)
+        records.append({"op": "del", "path": rel_path, "ts": now})
+
+    for rel_dir, key in sorted(dirs.items()):
+        if state["dirs"].get(rel_dir) != key:
+            records.append({"op": "dir", "path": rel_dir, "mtime_ns": key[0], "ino": key[1]})
+    for rel_dir in sorted(set(state["dirs"]) - set(dirs)):
+        records.append({"op": "rmdir", "path": rel_dir})
+
+    if not state["scanned"]:
+        records.append({"op": "scan", "ts": now})
+    if records:
+        _append(records)
+        for record in records:
+            _apply(state, record)
+    if state["count"] > len(files) + len(dirs) + COMPACT_SLACK_RECORDS:
+        compact()
+
+    for paths in changes.values():
+        paths.sort()
+    return changes, state
+
+
+def refresh():
+    """Reconcile the manifest with the workspace, re-hashing only changed files.
+
+    Returns {"added", "modified", "removed"} path lists.
+    """
+    return _refresh()[0]
+
+
+def compact():
+    """Rewrite the journal as one record per file, the last run marker and the
+    removals made since it"""
+    path = _manifest_path()
+    with locks.file_lock(path):
+        state = _load()
+        current, removed, last_run = state["entries"], state["removed"], state["last_run"]
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if state["scanned"]:
+                f.write(json.dumps({"op": "scan", "ts": time.time()}) + "\n")
+            for rel_dir, (mtime_ns, ino) in sorted(state["dirs"].items()):
+                f.write(json.dumps({"op": "dir", "path": rel_dir, "mtime_ns": mtime_ns, "ino": ino}) + "\n")
+            for rel_path in sorted(current):
+                f.write(json.dumps({"op": "set", "path": rel_path, "entry": current[rel_path]}) + "\n")
+            if last_run is not None:
+                f.write(json.dumps({"op": "run", "ts": last_run}) + "\n")
+            for rel_path, ts in sorted(removed.items()):
+                if last_run is not None and ts > last_run:
+                    f.write(json.dumps({"op": "del", "path": rel_path, "ts": ts}) + "\n")
+        os.replace(tmp_path, path)
+
+
+def entries():
+    """All manifest entries by workspace-relative path, building the manifest on first use"""
+    state = _load()
+    if not state["scanned"]:
+        refresh()
+        state = _load()
+    return state["entries"]
+
+
+def get(rel_path):
+    """Manifest entry for one file, or None"""
+    return entries().get(rel_path)
+
+
+def changed_since(since=None):
+    """Files added, modified or removed since a timestamp (default: the last marked run).
+
+    Refreshes first, so changes made outside the cage are picked up too.
+    """
+    _changes, state = _refresh()
+    if since is None:
+        since = state["last_run"]
+    current, removed = state["entries"], state["removed"]
+    if since is None:
+        return {"changed": sorted(current), "removed": []}
+    return {
+        "changed": sorted(path for path, entry in current.items() if entry["changed_at"] > since),
+        "removed": sorted(path for path, ts in removed.items() if ts > since)
+    }
+
+
+def mark_run():
+    """Record a run marker for the next changed_since() call"""
+    _append([{"op": "run", "ts": time.time()}])
@@ -0,0 +1,266 @@
+"""
+Metrics (counters, gauges, latency histograms)
+Instruments cage operations and renders them in Prometheus text format.
+
+Each process records into its own in-memory registry. CLI runs flush their
+samples to .cage/metrics.jsonl on exit; the status server merges that file
+into its live registry when /metrics is scraped. Once the file has grown
+COMPACT_BYTES past its first record, flush() folds it into a single record.
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+from . import room, locks
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# metrics.jsonl is compacted once this many bytes were appended after its first record
+COMPACT_BYTES = 1024 * 1024
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by (name, sorted labels)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}  # key -> [bucket counts (non-cumulative, +Inf last), sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        index = len(BUCKETS)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            hist[0][index] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def empty(self):
+        """True if nothing was recorded"""
+        with self.lock:
+            return not (self.counters or self.gauges or self.histograms)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def samples(self):
+        """Plain data for every series, for persisting or merging"""
+        with self.lock:
+            out = [{"type": "counter", "name": name, "labels": dict(labels), "value": value}
+                   for (name, labels), value in self.counters.items()]
+            out += [{"type": "gauge", "name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.gauges.items()]
+            out += [{"type": "histogram", "name": name, "labels": dict(labels),
+                     "buckets": list(hist[0]), "sum": hist[1], "count": hist[2]}
+                    for (name, labels), hist in self.histograms.items()]
+        return out
+
+    def merge(self, sample):
+        """Add one sample from samples(): counters and histograms sum, gauges take the latest"""
+        key = _key(sample["name"], sample["labels"])
+        with self.lock:
+            if sample["type"] == "counter":
+                self.counters[key] = self.counters.get(key, 0) + sample["value"]
+            elif sample["type"] == "gauge":
+                self.gauges[key] = sample["value"]
+            elif sample["type"] == "histogram" and len(sample["buckets"]) == len(BUCKETS) + 1:
+                hist = self.histograms.get(key)
+                if hist is None:
+                    hist = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+                hist[0] = [a + b for a, b in zip(hist[0], sample["buckets"])]
+                hist[1] += sample["sum"]
+                hist[2] += sample["count"]
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    """Increase a counter"""
+    REGISTRY.inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge"""
+    REGISTRY.set(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    """Record one latency observation in a histogram"""
+    REGISTRY.observe(name, seconds, **labels)
+
+
+class timed:
+    """Time a block or function into a `<name>_seconds` histogram.
+
+    Works as a decorator or a context manager. Exceptions are counted in
+    `<name>_errors_total` and re-raised.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._starts = threading.local()
+
+    def __enter__(self):
+        self._starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._starts.stack.pop()
+        observe(f"{self.name}_seconds", elapsed, **self.labels)
+        if exc_type is not None:
+            inc(f"{self.name}_errors_total", **self.labels)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def _metrics_path():
+    return room.get_state_dir() / "metrics.jsonl"
+
+
+def _merge_records(f, registry):
+    """Merge the complete records read from f into registry; returns the bytes consumed"""
+    data = f.read()
+    cut = data.rfind(b"\n") + 1
+    for line in data[:cut].splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        for sample in record.get("samples", []):
+            registry.merge(sample)
+    return cut
+
+
+def flush():
+    """Persist this process's samples (one line) and reset them; used by CLI runs.
+
+    Does nothing if nothing was recorded since the last flush.
+    """
+    if REGISTRY.empty():
+        return
+    samples = REGISTRY.samples()
+    REGISTRY.clear()
+    path = _metrics_path()
+    with locks.file_lock(path):  # compact() rewrites the file under this lock
+        locks.append_record(path, json.dumps({"ts": time.time(), "samples": samples}) + "\n")
+        size = path.stat().st_size
+        if size > COMPACT_BYTES:
+            with open(path, "rb") as f:
+                due = size - len(f.readline()) > COMPACT_BYTES
+        else:
+            due = False
+    if due:
+        compact()
+
+
+def compact():
+    """Rewrite metrics.jsonl as one record holding the merge of all of its samples"""
+    path = _metrics_path()
+    with locks.file_lock(path):
+        if not path.exists():
+            return
+        merged = Registry()
+        with open(path, "rb") as f:
+            _merge_records(f, merged)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": time.time(), "samples": merged.samples()}) + "\n")
+        os.replace(tmp_path, path)
+
+
+class PersistedMetrics:
+    """Samples flushed by other processes, read incrementally from .cage/metrics.jsonl"""
+
+    def __init__(self):
+        self.registry = Registry()
+        self._offset = 0
+        self._ino = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        path = _metrics_path()
+        with self._lock:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                return
+            with f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._ino or st.st_size < self._offset:
+                    # Compacted (or replaced): its first record already holds everything read so far
+                    self.registry = Registry()
+                    self._offset = 0
+                    self._ino = st.st_ino
+                f.seek(self._offset)
+                self._offset += _merge_records(f, self.registry)
+
+
+def _format_labels(labels, extra=None):
+    items = sorted(labels.items()) + (extra or [])
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+
+def render(*registries):
+    """Text exposition format for the merged samples of the given registries"""
+    merged = Registry()
+    for registry in registries or (REGISTRY,):
+        for sample in registry.samples():
+            merged.merge(sample)
+
+    lines = []
+    by_name = {}
+    for sample in merged.samples():
+        by_name.setdefault((sample["name"], sample["type"]), []).append(sample)
+
+    for (name, kind), samples in sorted(by_name.items()):
+        lines.append(f"# TYPE {name} {kind}")
+        for sample in sorted(samples, key=lambda s: sorted(s["labels"].items())):
+            labels = sample["labels"]
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), sample["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,234 @@
+"""
+Perf (stage spans and profiling)
+Times the stages of each cage command and profiles whole commands on request.
+
+Spans are always on: `with perf.span("diff"):` (or `@perf.span("diff")`)
+adds the block's duration to this run's stage totals and to the
+cage_stage_seconds histogram. run.py records the totals as one line of
+.cage/perf.jsonl per command, and `run.py perf-report` aggregates those
+records across runs. They are timings, not cage actions, so they stay out
+of trail.log and are not fsync'd. Span durations are inclusive: the "log"
+appends made during a rehydrate count towards both stages.
+"""
+
+import io
+import sys
+import json
+import time
+import functools
+import threading
+import contextlib
+import collections
+from . import room, locks, metrics
+
+STAGES = ("rehydrate", "plan", "diff", "write", "snapshot", "tests", "log", "index", "search")
+
+PROFILE_FORMATS = ("text", "pstats", "collapsed")
+
+# Deepest call path written in collapsed-stack output
+COLLAPSED_MAX_DEPTH = 64
+
+_lock = threading.Lock()
+_totals = {}  # stage -> [seconds, count]
+
+
+class span:
+    """Time a block or function as one occurrence of a stage.
+
+    Works as a decorator or a context manager, from any thread.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._starts = threading.local()
+
+    def __enter__(self):
+        self._starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._starts.stack.pop()
+        with _lock:
+            total = _totals.setdefault(self.stage, [0.0, 0])
+            total[0] += elapsed
+            total[1] += 1
+        metrics.observe("cage_stage_seconds", elapsed, stage=self.stage)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def reset():
+    """Start a new run's stage totals"""
+    with _lock:
+        _totals.clear()
+
+
+def stage_totals():
+    """{stage: {"ms", "count"}} for the spans closed since the last reset"""
+    with _lock:
+        return {stage: {"ms": round(seconds * 1000, 3), "count": count}
+                for stage, (seconds, count) in sorted(_totals.items())}
+
+
+def run_summary(command, seconds):
+    """Data for this run's perf record, or None when no span ran"""
+    stages = stage_totals()
+    if not stages:
+        return None
+    return {"command": command, "total_ms": round(seconds * 1000, 3), "stages": stages}
+
+
+def _perf_path():
+    return room.get_state_dir() / "perf.jsonl"
+
+
+def record(summary):
+    """Append a run summary to .cage/perf.jsonl"""
+    locks.append_record(_perf_path(), json.dumps({"ts": time.time(), "data": summary}) + "\n")
+
+
+def iter_records():
+    """Yield every perf record, oldest first"""
+    path = _perf_path()
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(rec, dict):
+                yield rec
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-in
+    return f"{filename.rsplit('/', 1)[-1]}:{line}:{name}"
+
+
+def collapsed_stacks(stats):
+    """Folded stacks ("a;b;c microseconds" lines) for flamegraph tools.
+
+    cProfile keeps caller/callee pairs rather than full stacks, so each path's
+    time is apportioned from its parent by the share of the callee's
+    cumulative time that came from that caller.
+    """
+    raw = stats.stats
+    callees = collections.defaultdict(list)
+    for func, (_cc, _nc, _tt, _ct, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+
+    folded = collections.Counter()
+
+    def walk(func, path, on_path, budget):
+        _cc, _nc, tt, ct, _callers = raw[func]
+        scale = budget / ct if ct else 0.0
+        path = path + (_label(func),)
+        if tt * scale > 0:
+            folded[";".join(path)] += tt * scale
+        if len(path) >= COLLAPSED_MAX_DEPTH:
+            return
+        on_path = on_path | {func}
+        for callee, edge_ct in callees[func]:
+            if callee not in on_path and edge_ct * scale > 1e-6:
+                walk(callee, path, on_path, edge_ct * scale)
+
+    for func, (_cc, _nc, _tt, ct, callers) in raw.items():
+        if not callers:
+            walk(func, (), frozenset(), ct)
+
+    return "".join(f"{path} {round(seconds * 1e6)}\n"
+                   for path, seconds in sorted(folded.items()) if round(seconds * 1e6) > 0)
+
+
+@contextlib.contextmanager
+def profiled(out=None, fmt="text", top=25):
+    """Run the block under cProfile and report it.
+
+    "text" prints the top functions by cumulative time (to `out`, or stderr);
+    "pstats" dumps a file for pstats/snakeviz; "collapsed" writes folded
+    stacks for flamegraph.pl or speedscope.
+    """
+    import pstats
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if fmt == "pstats":
+            profiler.dump_stats(out or "cage.pstats")
+            print(f"Profile written to {out or 'cage.pstats'}", file=sys.stderr)
+        elif fmt == "collapsed":
+            text = collapsed_stacks(pstats.Stats(profiler))
+            with open(out or "cage.collapsed", "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"Collapsed stacks written to {out or 'cage.collapsed'}", file=sys.stderr)
+        else:
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(top)
+            if out:
+                with open(out, "w", encoding="utf-8") as f:
+                    f.write(buffer.getvalue())
+                print(f"Profile written to {out}", file=sys.stderr)
+            else:
+                print(buffer.getvalue(), file=sys.stderr)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(entries, command=None, last=None):
+    """Aggregate perf records ({"data": run summary}) per command and stage.
+
+    Returns {command: {"runs", "total": {"mean_ms", "p50_ms", "p95_ms"},
+    "stages": {stage: {"runs", "count", "mean_ms", "p50_ms", "p95_ms", "share"}}}},
+    where a stage's times are per run it appeared in and share is its
+    fraction of the command's total time.
+    """
+    runs = collections.defaultdict(list)
+    for entry in entries:
+        data = entry.get("data") or {}
+        if not isinstance(data.get("stages"), dict) or (command and data.get("command") != command):
+            continue
+        runs[data.get("command")].append(data)
+
+    summary = {}
+    for name, datas in sorted(runs.items(), key=lambda item: str(item[0])):
+        if last:
+            datas = datas[-last:]
+        totals = [data.get("total_ms", 0.0) for data in datas]
+        grand_total = sum(totals)
+        per_stage = collections.defaultdict(list)
+        counts = collections.Counter()
+        for data in datas:
+            for stage, timing in data["stages"].items():
+                per_stage[stage].append(timing.get("ms", 0.0))
+                counts[stage] += timing.get("count", 0)
+        summary[name] = {
+            "runs": len(datas),
+            "total": {"mean_ms": grand_total / len(datas),
+                      "p50_ms": _percentile(totals, 0.50), "p95_ms": _percentile(totals, 0.95)},
+            "stages": {stage: {
+                "runs": len(values),
+                "count": counts[stage],
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": _percentile(values, 0.50),
+                "p95_ms": _percentile(values, 0.95),
+                "share": sum(values) / grand_total if grand_total else 0.0
+            } for stage, values in sorted(per_stage.items(), key=lambda item: -sum(item[1]))}
+        }
+    return summary
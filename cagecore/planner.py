@@ -1,43 +1,186 @@
 
 """
 Planner (makes a PLAN object, no editing)
-Creates and manages execution plans.
+Creates and manages execution plans in a durable on-disk queue.
+
+The queue is an append-only journal in .cage/plans.jsonl. An "add" record
+queues a plan; "done", "failed" and "discard" records take plans off it.
+Once finished plans outnumber the pending ones by COMPACT_SLACK_RECORDS,
+the journal is rewritten with only the pending plans.
 """
 
+import os
+import re
 import json
+import uuid
 from datetime import datetime
+from . import room, locks, perf
+
+# Records that take plans off the queue
+FINISH_OPS = ("done", "failed", "discard")
+
+# Compact the queue once it holds this many more records than pending plans
+COMPACT_SLACK_RECORDS = 500
+
+
+def _append_record(record):
+    """Append one record to the plan queue"""
+    path = room.get_plan_queue_path()
+    with locks.file_lock(path):  # compaction rewrites the queue under this lock
+        locks.append_record(path, json.dumps(record) + "\n")
+
+
+def _replay(queue_path):
+    """Pending plans by id, in creation order, and the number of records read"""
+    pending, count = {}, 0
+    with open(queue_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            count += 1
+            if record.get("op") == "add":
+                plan = record["plan"]
+                pending[plan["id"]] = plan
+            elif record.get("op") in FINISH_OPS:
+                for plan_id in record.get("ids", []):
+                    pending.pop(plan_id, None)
+    return pending, count
+
+
+# (size, mtime_ns, inode) of the queue file -> pending plans replayed from it
+_queue_cache = {"key": None, "plans": []}
+
+
+def _load_queue():
+    """Replay the plan queue and return pending plans in creation order.
+
+    The replay is kept until the queue file changes, so a long-lived process
+    (batch, shell, daemon) does not re-read it for every command.
+    """
+    queue_path = room.get_plan_queue_path()
+    try:
+        st = queue_path.stat()
+    except FileNotFoundError:
+        return []
+    key = (st.st_size, st.st_mtime_ns, st.st_ino)
+    if _queue_cache["key"] == key:
+        return [dict(plan) for plan in _queue_cache["plans"]]
+
+    pending, count = _replay(queue_path)
+    if count > len(pending) + COMPACT_SLACK_RECORDS:
+        compact()
+        st = queue_path.stat()
+        key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        pending, _count = _replay(queue_path)
+
+    _queue_cache["key"], _queue_cache["plans"] = key, list(pending.values())
+    return [dict(plan) for plan in _queue_cache["plans"]]
+
+
+def compact():
+    """Rewrite the queue as the "add" records of the plans still pending"""
+    queue_path = room.get_plan_queue_path()
+    with locks.file_lock(queue_path):
+        if not queue_path.exists():
+            return
+        pending, _count = _replay(queue_path)
+        tmp_path = queue_path.with_name(queue_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for plan in pending.values():
+                f.write(json.dumps({"op": "add", "plan": plan}) + "\n")
+        os.replace(tmp_path, queue_path)
 
-# Module-level storage for current plan
-_current_plan = None
 
+@perf.span("plan")
+def create_plan(title, filename, find_text, replace_text, regex=False):
+    """Create a new plan and append it to the queue"""
+    if regex:
+        re.compile(find_text)  # reject bad patterns before they are queued
 
-def create_plan(title, filename, find_text, replace_text):
-    """Create a new plan"""
-    global _current_plan
-    
     plan = {
+        "id": uuid.uuid4().hex,
         "title": title,
         "target_file": filename,
         "find_text": find_text,
         "replace_text": replace_text,
+        "regex": regex,
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
-    
-    _current_plan = plan
+
+    _append_record({"op": "add", "plan": plan})
     return plan
 
 
+def get_pending_plans():
+    """Get all queued plans that have not been applied yet"""
+    return _load_queue()
+
+
 def get_latest_plan():
-    """Get the current plan"""
-    return _current_plan
+    """Get the most recently queued plan"""
+    pending = _load_queue()
+    return pending[-1] if pending else None
 
 
 def has_current_plan():
-    """Check if there's a current plan"""
-    return _current_plan is not None
+    """Check if there's a queued plan"""
+    return bool(_load_queue())
+
+
+def apply_to_text(plan, content):
+    """Apply one plan's replacement to in-memory content"""
+    if plan.get("regex"):
+        return re.sub(plan["find_text"], plan["replace_text"], content)
+    return content.replace(plan["find_text"], plan["replace_text"])
+
+
+def still_pending(plans):
+    """The given plans that the queue still lists as pending, re-read from disk"""
+    pending_ids = {plan["id"] for plan in _load_queue()}
+    return [plan for plan in plans if plan["id"] in pending_ids]
+
+
+def group_by_target(plans):
+    """Group plans by target file, keeping queue order within each file"""
+    groups = {}
+    for plan in plans:
+        groups.setdefault(plan["target_file"], []).append(plan)
+    return groups
+
+
+def mark_done(plans):
+    """Remove the given plans from the queue after execution"""
+    ids = [plan["id"] for plan in plans]
+    if ids:
+        _append_record({"op": "done", "ids": ids, "timestamp": datetime.utcnow().isoformat() + "Z"})
+
+
+def mark_failed(plans, error):
+    """Take plans that failed (and were reverted) off the queue, with the reason"""
+    ids = [plan["id"] for plan in plans]
+    if ids:
+        _append_record({"op": "failed", "ids": ids, "error": error,
+                        "timestamp": datetime.utcnow().isoformat() + "Z"})
+
+
+def discard(prefixes=None):
+    """Drop queued plans without applying them: those whose id starts with one
+    of the prefixes, or every pending plan. Returns the discarded plans."""
+    pending = _load_queue()
+    if prefixes is not None:
+        pending = [plan for plan in pending if any(plan["id"].startswith(prefix) for prefix in prefixes)]
+    if pending:
+        _append_record({"op": "discard", "ids": [plan["id"] for plan in pending],
+                        "timestamp": datetime.utcnow().isoformat() + "Z"})
+    return pending
 
 
 def clear_current_plan():
-    """Clear the current plan after successful execution"""
-    global _current_plan
-    _current_plan = None
+    """Clear the latest plan after successful execution"""
+    plan = get_latest_plan()
+    if plan:
+        mark_done([plan])
@@ -0,0 +1,52 @@
+"""
+Publisher (workspace -> artifacts)
+Publishes tested files to the artifacts directory, many at a time.
+"""
+
+from . import room, workbench, tests, logbook, blobs, locks
+
+
+def publish_files(filenames):
+    """Publish files whose current content passed the smoke tests.
+
+    Each file is stored in the blob store under the sha256 its passing test
+    record was taken for. The blob is then copied in the kernel to a temp file
+    in artifacts, hashed as it is copied, checked against that sha256 and
+    renamed into place. An artifact is its own file, so it is always complete
+    and exactly the tested bytes, whatever later happens to the workspace.
+    One logbook entry covers the whole batch.
+    """
+    artifacts_dir = room.get_artifacts_dir()
+    artifacts_dir.mkdir(exist_ok=True)
+
+    published, refused = [], {}
+    for filename in dict.fromkeys(filenames):
+        source = workbench.get_workspace_path(filename)
+        if not workbench.file_exists(filename):
+            refused[filename] = "does not exist in workspace"
+            continue
+
+        # Keep applies off the file between the test check and the snapshot
+        with locks.file_lock(source):
+            sha256 = tests.passed_sha256(filename)
+            if sha256 is None:
+                refused[filename] = "tests have not passed for its current content"
+                continue
+            try:
+                blob_id = workbench.snapshot(filename, sha256=sha256)
+            except blobs.VerifyError as e:
+                refused[filename] = str(e)
+                continue
+
+        dest = artifacts_dir / filename
+        try:
+            blobs.copy_out(blob_id, dest)
+        except (OSError, blobs.VerifyError) as e:
+            refused[filename] = str(e)
+            continue
+        published.append({"file": filename, "to": str(dest), "blob": blob_id})
+
+    if published or refused:
+        logbook.append("publish", {"files": published, "refused": refused})
+
+    return {"success": bool(published) and not refused, "published": published, "refused": refused}
@@ -3,10 +3,11 @@ Referee (rule checks)
 Enforces all cage guardrails and constraints.
 """
 
+import threading
 from contextlib import contextmanager
 from typing import Optional
 from pathlib import Path
-from . import room, logbook, planner, executor
+from . import room, logbook
 
 
 class RuleViolationError(Exception):
@@ -20,6 +21,35 @@ BOOTSTRAP_MODE = False
 # TEMP for POC
 STRICT_MODE = False
 
+# Live diff authorizations, one per approved write operation
+_active_tokens = set()
+_tokens_lock = threading.Lock()
+
+
+class DiffToken:
+    """Authorization for one approved diff application to one target path"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path).resolve()
+
+    @property
+    def active(self) -> bool:
+        with _tokens_lock:
+            return self in _active_tokens
+
+
+@contextmanager
+def authorize_diff(path):
+    """Issue a diff token for path, revoked when the operation ends."""
+    token = DiffToken(path)
+    with _tokens_lock:
+        _active_tokens.add(token)
+    try:
+        yield token
+    finally:
+        with _tokens_lock:
+            _active_tokens.discard(token)
+
 
 @contextmanager
 def allow_bootstrap():
@@ -35,6 +65,7 @@ def allow_bootstrap():
 
 def enforce_plan_then_act():
     """Ensure there is a plan before acting"""
+    from . import planner
     if not planner.has_current_plan():
         violation_msg = "Not allowed. Diff-only and append-only per the rules."
         logbook.append("violation", {"message": violation_msg})
@@ -58,11 +89,33 @@ def enforce_workspace_only(path):
         raise RuleViolationError(violation_msg)
 
 
-def enforce_diff_only(path: Optional[Path] = None) -> None:
+def report_violation():
+    """Log a violation and raise it"""
+    violation_msg = "Not allowed. Diff-only and append-only per the rules."
+    logbook.append("violation", {"message": violation_msg})
+    raise RuleViolationError(violation_msg)
+
+
+def enforce_relative_paths(rel_paths):
+    """Ensure workspace-relative paths cannot name anything outside the workspace.
+
+    A purely lexical check: no absolute paths, no '..', no empty names. Symlinks
+    are left to the caller, which must open each component without following them.
+    """
+    for rel_path in rel_paths:
+        parts = str(rel_path).split("/")
+        if str(rel_path).startswith("/") or any(part in ("", ".", "..") for part in parts):
+            report_violation()
+
+
+def enforce_diff_only(path: Optional[Path] = None, token: Optional[DiffToken] = None,
+                      resolved: bool = False) -> None:
     """
     Allow writes ONLY when:
       - BOOTSTRAP_MODE is True AND target does not yet exist (create-only), OR
-      - executor.DIFF_MODE_ACTIVE is True (approved diff application)
+      - token is a live DiffToken issued for this path (approved diff application)
+
+    Pass resolved=True when path is already known to be symlink-free and absolute.
     """
     if BOOTSTRAP_MODE:
         if path is None or not isinstance(path, Path):
@@ -78,7 +131,7 @@ def enforce_diff_only(path: Optional[Path] = None) -> None:
             logbook.append("violation", {"message": violation_msg})
             raise RuleViolationError(violation_msg)
         return
-    if not getattr(executor, "DIFF_MODE_ACTIVE", False):
+    if token is None or path is None or not token.active or token.path != (path if resolved else Path(path).resolve()):
         violation_msg = "Not allowed. Diff-only and append-only per the rules."
         logbook.append("violation", {"message": violation_msg})
         raise RuleViolationError(violation_msg)
@@ -3,12 +3,14 @@ Rehydrator (loads past corrections + prefs)
 Loads context from rulebook and recent log entries.
 """
 
-from . import rulebook, logbook, arc
+from . import rulebook, logbook, arc, metrics, perf
 
 # Module-level state tracking
 _rehydrated = False
 
 
+@metrics.timed("cage_rehydrate")
+@perf.span("rehydrate")
 def rehydrate():
     """Load context from rulebook and recent logs"""
     global _rehydrated
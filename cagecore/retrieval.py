@@ -0,0 +1,198 @@
+"""
+Retrieval (resident atom index)
+Keeps atom embeddings in memory for cosine-similarity queries.
+
+The index follows atoms.jsonl: refresh() reads only lines appended since the
+last call, so a long-running process pays for new atoms only. numpy (the
+"fast" extra) is used for the scoring when it is installed; otherwise a pure
+Python path gives the same ranking, ties included.
+"""
+
+import os
+import json
+import math
+import time
+import heapq
+import operator
+import threading
+from . import embedder, metrics, perf
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure Python scoring below
+    np = None
+
+ATOMS_PATH = "atoms.jsonl"
+
+# Seconds between checks of atoms.jsonl by the background follower
+FOLLOW_INTERVAL_SECONDS = 0.5
+
+
+def _unit(vec):
+    """vec scaled to length 1; a zero vector stays zero so it scores 0 against anything"""
+    norm = math.sqrt(sum(x * x for x in vec))
+    return [x / norm for x in vec] if norm else [0.0] * len(vec)
+
+
+class AtomIndex:
+    """In-memory index of atom embeddings, normalized once at load"""
+
+    def __init__(self, path=ATOMS_PATH):
+        self.path = path
+        self.atoms = []  # {"id", "ts", "text"} per row
+        self.generation = 0  # bumped whenever rows are renumbered
+        self._ordinals = {}  # atom id -> row
+        self.dim = None
+        self._rows = []  # unit vector tuples (pure Python path)
+        self._matrix = None  # numpy rows, grown by doubling
+        self._offset = 0
+        self._ino = None
+        self._lock = threading.Lock()
+        self._follower = None
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def _reset(self):
+        self.atoms = []
+        self.generation += 1
+        self._ordinals = {}
+        self.dim = None
+        self._rows = []
+        self._matrix = None
+        self._offset = 0
+
+    def _add(self, atom):
+        embedding = atom.get("embedding")
+        if not embedding:
+            return
+        if self.dim is None:
+            self.dim = len(embedding)
+        if len(embedding) != self.dim:
+            return
+        unit = _unit(embedding)
+        row = len(self.atoms)
+        if np is not None:
+            if self._matrix is None or row == len(self._matrix):
+                grown = np.zeros((max(1024, 2 * row), self.dim))
+                if self._matrix is not None:
+                    grown[:row] = self._matrix
+                self._matrix = grown
+            self._matrix[row] = unit
+        else:
+            self._rows.append(tuple(unit))
+        self._ordinals[atom["id"]] = row
+        self.atoms.append({"id": atom["id"], "ts": atom["ts"], "text": atom["text"]})
+
+    def ordinal(self, atom_id):
+        """The row (file order among indexed atoms) of atom_id, or None"""
+        return self._ordinals.get(atom_id)
+
+    @perf.span("index")
+    def refresh(self):
+        """Index atoms appended since the last refresh; returns how many were added.
+
+        A replaced or truncated file is re-read from the start.
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                self._ino = None
+                return 0
+            if st.st_ino != self._ino or st.st_size < self._offset:
+                self._reset()
+                self._ino = st.st_ino
+            if st.st_size == self._offset:
+                return 0
+
+            before = len(self.atoms)
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            cut = data.rfind(b"\n") + 1
+            lines = data[:cut].splitlines()
+            if data[cut:].strip():
+                # An unterminated last line is indexed only once it parses (ingest
+                # may still be writing it)
+                try:
+                    json.loads(data[cut:])
+                    lines.append(data[cut:])
+                    cut = len(data)
+                except json.JSONDecodeError:
+                    pass
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    self._add(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    continue
+            self._offset += cut
+            return len(self.atoms) - before
+
+    @metrics.timed("cage_retrieve_search")
+    @perf.span("search")
+    def search(self, query, k=5):
+        """Top-k atoms by cosine similarity to the query text, best first.
+
+        Ties keep file order, as in `run.py retrieve`.
+        """
+        q = embedder.vector(query)
+        with self._lock:
+            n = len(self.atoms)
+            if n == 0 or k <= 0:
+                return []
+            if len(q) != self.dim:
+                return []
+            q = _unit(q)
+            # Both paths rank by (-score, row)
+            if np is not None:
+                scores = self._matrix[:n] @ np.asarray(q)
+                if k < n:
+                    # argpartition splits ties at the k-th score arbitrarily, so
+                    # keep every row scoring at least that and sort them all
+                    kth = np.partition(scores, n - k)[n - k]
+                    top = np.flatnonzero(scores >= kth)
+                else:
+                    top = np.arange(n)
+                top = top[np.lexsort((top, -scores[top]))][:k]
+                ranked = [(int(i), float(scores[i])) for i in top]
+            else:
+                mul = operator.mul
+                scores = [sum(map(mul, row, q)) for row in self._rows]
+                top = heapq.nsmallest(k, range(n), key=lambda i: (-scores[i], i))
+                ranked = [(i, scores[i]) for i in top]
+            return [dict(self.atoms[i], score=score) for i, score in ranked]
+
+    def follow(self, interval=FOLLOW_INTERVAL_SECONDS):
+        """Keep the index current from a background thread (idempotent)"""
+        with self._lock:
+            if self._follower is not None:
+                return
+            self._follower = threading.Thread(target=self._follow, args=(interval,),
+                                              name="atom-index-follower", daemon=True)
+            self._follower.start()
+
+    def _follow(self, interval):
+        while True:
+            try:
+                self.refresh()
+            except OSError:
+                pass
+            time.sleep(interval)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_index(path=ATOMS_PATH):
+    """The process-wide index for path, so later commands in the same process
+    (a batch, a shell session, the daemon) only read newly appended atoms"""
+    with _shared_lock:
+        index = _shared.get(path)
+        if index is None:
+            index = _shared[path] = AtomIndex(path)
+        return index
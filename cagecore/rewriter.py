@@ -0,0 +1,208 @@
+"""
+Rewriter (streaming plan rewrites for huge files)
+Applies find/replace and regex plans to huge files, never loading the whole file.
+
+Literal plans run over an mmap of the raw bytes. Regex plans run the same
+str pattern as the in-memory path over the decoded text, a chunk at a time:
+matches starting more than REGEX_WINDOW_CHARS before the end of the text
+read so far are final, and the rest is carried into the next chunk along
+with REGEX_WINDOW_CHARS of already written text for lookbehinds and '^'.
+The output is the same as re.sub on the whole file as long as each match,
+with any lookaround it needs, spans at most REGEX_WINDOW_CHARS characters.
+"""
+
+import os
+import re
+import mmap
+import codecs
+import hashlib
+from contextlib import ExitStack
+from . import workbench
+
+# Files at least this large are applied in streaming mode automatically
+STREAM_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+# Unchanged stretches are copied out of the mmap in slices of this size
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Longest regex match (lookaround included) a streamed regex plan supports
+REGEX_WINDOW_CHARS = 64 * 1024
+
+
+def should_stream(filename):
+    """True when a workspace file is too large for the in-memory apply path"""
+    return workbench.file_size(filename) >= STREAM_THRESHOLD_BYTES
+
+
+class _SmokeWriter:
+    """Writes the rewritten bytes while computing the smoke checks and sha256.
+
+    Small writes (one per match) are coalesced so the checks and the file
+    write run on large blocks.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_out = 0
+        self.non_blank = False
+        self.valid_utf8 = True
+        self.sha256 = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = bytearray()
+
+    def write(self, data):
+        self._pending += data
+        if len(self._pending) >= COPY_CHUNK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        data = bytes(self._pending)
+        self._pending.clear()
+        if not data:
+            return
+        self.file.write(data)
+        self.bytes_out += len(data)
+        self.sha256.update(data)
+        if not self.non_blank and data.strip():
+            self.non_blank = True
+        if self.valid_utf8:
+            try:
+                self._decoder.decode(data)
+            except UnicodeDecodeError:
+                self.valid_utf8 = False
+
+    def finish(self):
+        self._flush()
+        if self.valid_utf8:
+            try:
+                self._decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                self.valid_utf8 = False
+
+
+def _iter_matches(mm, plan):
+    """Yield (start, end, replacement bytes) for each match of the plan in the mmap"""
+    find = plan["find_text"].encode("utf-8")
+    replace = plan["replace_text"].encode("utf-8")
+
+    pos = mm.find(find)
+    while pos >= 0:
+        yield pos, pos + len(find), replace
+        pos = mm.find(find, pos + len(find))
+
+
+def _copy(mm, start, end, writer):
+    """Copy an unchanged byte range out of the mmap in bounded slices"""
+    while start < end:
+        stop = min(end, start + COPY_CHUNK_BYTES)
+        writer.write(mm[start:stop])
+        start = stop
+
+
+def _rewrite(source_path, plan, writer):
+    """One streaming pass of one plan from source_path into writer; returns match count"""
+    with open(source_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            count = 0
+            pos = 0
+            for start, end, replacement in _iter_matches(mm, plan):
+                _copy(mm, pos, start, writer)
+                writer.write(replacement)
+                pos = end
+                count += 1
+            _copy(mm, pos, size, writer)
+            return count
+
+
+def _regex_rewrite(source_path, plan, writer):
+    """One streaming pass of a regex plan over the decoded text; returns match count.
+
+    Raises UnicodeDecodeError when the file is not valid UTF-8, as reading it
+    for the in-memory path would.
+    """
+    pattern = re.compile(plan["find_text"])
+    template = plan["replace_text"]
+    expand = "\\" in template  # group references or escapes to expand per match
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text, pos = "", 0  # text[:pos] is already written and kept only as context
+    count = 0
+    with open(source_path, "rb") as f:
+        while True:
+            data = f.read(COPY_CHUNK_BYTES)
+            final = not data
+            text += decoder.decode(data, final=final)
+            limit = len(text) if final else len(text) - REGEX_WINDOW_CHARS
+            if limit > pos:
+                out = []
+                for match in pattern.finditer(text, pos):
+                    if match.start() >= limit and not final:
+                        break  # may still grow or change with the next chunk
+                    out.append(text[pos:match.start()])
+                    out.append(match.expand(template) if expand else template)
+                    pos = match.end()
+                    count += 1
+                if pos < limit:
+                    out.append(text[pos:limit])
+                    pos = limit
+                writer.write("".join(out).encode("utf-8"))
+            if final:
+                return count
+            keep = max(0, pos - REGEX_WINDOW_CHARS)
+            text, pos = text[keep:], pos - keep
+
+
+def stream_apply(filename, plans, token):
+    """Apply plans to a workspace file in streaming mode.
+
+    Each plan is one pass over an mmap of the previous pass's output, written
+    to a temp file next to the target. The smoke checks (non-empty, valid
+    UTF-8) and the new content's sha256 are computed while the final pass is
+    written, and the target is swapped in by rename only if they pass;
+    otherwise every temp file is discarded and the original is untouched.
+    """
+    if any(not plan["find_text"] for plan in plans):
+        return {"success": False, "error": "Streaming plans need a non-empty find text"}
+    if not workbench.file_exists(filename):
+        return {"success": False, "error": f"File {filename} does not exist"}
+
+    source = workbench.get_workspace_path(filename)
+    bytes_in = source.stat().st_size
+    replacements = 0
+
+    with ExitStack() as stack:
+        for index, plan in enumerate(plans):
+            stage = stack.enter_context(workbench.staged_write_guarded(filename, token=token))
+            writer = _SmokeWriter(stage.file)
+            if plan.get("regex"):
+                replacements += _regex_rewrite(source, plan, writer)
+            else:
+                replacements += _rewrite(source, plan, writer)
+            writer.finish()
+            stage.file.flush()
+            stage.sha256 = writer.sha256.hexdigest()
+            if index < len(plans) - 1:
+                # Intermediate output only feeds the next pass
+                stage.discard()
+            source = stage.path
+
+        if not writer.non_blank:
+            passed, details = False, f"File {filename} is empty"
+        elif not writer.valid_utf8:
+            passed, details = False, f"File {filename} is not valid UTF-8"
+        else:
+            passed, details = True, f"File {filename} passed all smoke tests"
+
+        if not passed:
+            stage.discard()
+
+    return {
+        "success": True,
+        "replacements": replacements,
+        "bytes_in": bytes_in,
+        "bytes_out": writer.bytes_out,
+        "sha256": writer.sha256.hexdigest(),
+        "tests": {"passed": passed, "details": details}
+    }
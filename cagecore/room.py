@@ -4,6 +4,7 @@ Room (paths, startup)
 Manages the safe space where the cage operates.
 """
 
+import hashlib
 from pathlib import Path
 
 _ROOT = Path(__file__).resolve().parents[1]
@@ -35,6 +36,10 @@ WORKSPACE_DIR = CAGE_ROOT / "workspace"
 ARTIFACTS_DIR = CAGE_ROOT / "artifacts"
 RULEBOOK_PATH = CAGE_ROOT / "rulebook.json"
 TRAIL_LOG_PATH = CAGE_ROOT / "trail.log"
+STATE_DIR = CAGE_ROOT / ".cage"
+PLAN_QUEUE_PATH = STATE_DIR / "plans.jsonl"
+LOCKS_DIR = STATE_DIR / "locks"
+BLOBS_DIR = STATE_DIR / "blobs"
 
 
 def setup():
@@ -68,11 +73,52 @@ def get_trail_log_path():
     return TRAIL_LOG_PATH
 
 
+def get_state_dir():
+    """Get the directory holding the cage's private state files"""
+    STATE_DIR.mkdir(exist_ok=True)
+    return STATE_DIR
+
+
+def get_plan_queue_path():
+    """Get the durable plan queue file path"""
+    get_state_dir()
+    return PLAN_QUEUE_PATH
+
+
+def get_blobs_dir():
+    """Get the content-addressed snapshot store directory"""
+    BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    return BLOBS_DIR
+
+
+def get_daemon_socket_path():
+    """Get the Unix socket the cage daemon listens on"""
+    return get_state_dir() / "daemon.sock"
+
+
+def get_lock_path(path):
+    """Get the advisory lock file guarding a target path"""
+    LOCKS_DIR.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()
+    return LOCKS_DIR / f"{key}.lock"
+
+
+_resolved_workspace_dir = None
+
+
+def get_resolved_workspace_dir():
+    """The workspace directory with symlinks resolved, computed once per process"""
+    global _resolved_workspace_dir
+    if _resolved_workspace_dir is None:
+        _resolved_workspace_dir = WORKSPACE_DIR.resolve()
+    return _resolved_workspace_dir
+
+
 def is_path_in_workspace(path):
     """Check if a path is within the workspace directory"""
     try:
         full_path = Path(path).resolve()
-        workspace_path = WORKSPACE_DIR.resolve()
+        workspace_path = get_resolved_workspace_dir()
         return workspace_path in full_path.parents or full_path == workspace_path
     except (OSError, ValueError):
         return False
@@ -3,9 +3,12 @@ Rulebook (preferences + corrections)
 Manages user preferences and correction rules.
 """
 
+import os
+import copy
 import json
+import tempfile
 from datetime import datetime
-from . import room, workbench
+from . import room, workbench, locks
 
 
 def exists():
@@ -23,8 +26,7 @@ def create_default():
         "corrections": []
     }
 
-    with open(get_rulebook_path(), 'w', encoding='utf-8') as f:
-        json.dump(default_rules, f, indent=2)
+    save(default_rules)
 
 
 def init_if_missing():
@@ -43,9 +45,11 @@ def init_if_missing():
 
 
 def add_correction(from_text, to_text, note=None):
-    """Add a correction to the rulebook"""
-    rulebook_data = load()
+    """Add a correction to the rulebook.
 
+    The load-append-save runs under the rulebook's file lock, so corrections
+    added by concurrent processes are never lost.
+    """
     correction = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "from": from_text,
@@ -55,8 +59,10 @@ def add_correction(from_text, to_text, note=None):
     if note:
         correction["note"] = note
 
-    rulebook_data["corrections"].append(correction)
-    save(rulebook_data)
+    with locks.file_lock(room.get_rulebook_path()):
+        rulebook_data = load()
+        rulebook_data["corrections"].append(correction)
+        save(rulebook_data)
 
     return correction
 
@@ -73,18 +79,40 @@ def get_preferences():
     return rulebook_data.get("preferences", {})
 
 
+# (size, mtime_ns, inode) of rulebook.json -> its parsed content
+_cache = {"key": None, "data": None}
+
+
 def load():
-    """Load the current rulebook"""
+    """Load the current rulebook (parsed once per change of the file)"""
     rulebook_path = room.get_rulebook_path()
     if not rulebook_path.exists():
         create_default()
 
-    with open(rulebook_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    st = rulebook_path.stat()
+    key = (st.st_size, st.st_mtime_ns, st.st_ino)
+    if _cache["key"] != key:
+        with open(rulebook_path, "r", encoding="utf-8") as f:
+            _cache["data"] = json.load(f)
+        _cache["key"] = key
+    return copy.deepcopy(_cache["data"])
 
 
 def save(rulebook_data):
-    """Save the rulebook"""
+    """Save the rulebook atomically (readers see the old or the new file, never part of one).
+
+    Callers that modify what they loaded hold locks.file_lock on the rulebook
+    path around the load and the save.
+    """
     rulebook_path = room.get_rulebook_path()
-    with open(rulebook_path, "w", encoding="utf-8") as f:
-        json.dump(rulebook_data, f, indent=2)
\ No newline at end of file
+    fd, tmp_name = tempfile.mkstemp(dir=rulebook_path.parent, prefix=f".{rulebook_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(rulebook_data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, rulebook_path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
\ No newline at end of file
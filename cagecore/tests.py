@@ -2,71 +2,240 @@
 """
 Tests (smoke/guard checks)
 Provides basic validation for applied changes.
+
+Checks are registered per file pattern and versioned. Results are persisted
+in .cage/test_results.jsonl keyed by the file's content hash, so an unchanged
+file is never re-tested and the publish gate works across processes. The
+replayed journal is kept in memory and only newly appended records are read
+on later calls; once it holds COMPACT_SLACK_RECORDS more records than files
+it is rewritten as the latest record per file.
 """
 
-from . import workbench, logbook
+import os
+import json
+import fnmatch
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from . import workbench, room, blobs, locks, perf
+
+# Registered checks, in registration order
+_CHECKS = []
+
+DEFAULT_WORKERS = 4
+
+# Compact the journal once it holds this many more records than files
+COMPACT_SLACK_RECORDS = 1000
+
+
+def register_check(name, pattern="*", version=1):
+    """Register a check for files matching a glob pattern.
+
+    The decorated function takes (text, filename, params) and returns None
+    when the check passes or a failure message. Bump `version` whenever the
+    check's logic changes so cached results are not reused.
+    """
+    def decorator(func):
+        _CHECKS.append({"name": name, "pattern": pattern, "version": version, "func": func})
+        return func
+    return decorator
+
+
+@register_check("non_empty")
+def _check_non_empty(text, filename, params):
+    if not text.strip():
+        return f"File {filename} is empty"
+
+
+@register_check("replacement_present")
+def _check_replacement(text, filename, params):
+    replacement = params.get("replace_text", "")
+    if replacement not in text:
+        return f"Replacement text '{replacement}' not found in {filename}"
+
+
+def checks_for(filename):
+    """Checks whose pattern matches the filename"""
+    return [check for check in _CHECKS if fnmatch.fnmatch(filename, check["pattern"])]
+
+
+def _results_path():
+    return room.get_state_dir() / "test_results.jsonl"
+
+
+class _ResultsIndex:
+    """The results journal replayed into the latest record per file and the
+    outcome per cache key, kept current by reading only appended records"""
+
+    def __init__(self):
+        self.latest, self.cache = {}, {}
+        self.count = 0  # records replayed
+        self._ino = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Read records appended since the last call; returns (latest, cache)"""
+        path = _results_path()
+        with self._lock:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                st = None
+            if st is None or st.st_ino != self._ino or st.st_size < self._offset:
+                # First read, or the journal was compacted or removed: replay it all
+                self.latest, self.cache = {}, {}
+                self.count = self._offset = 0
+                self._ino = st.st_ino if st else None
+            if st is not None and st.st_size > self._offset:
+                with open(path, "rb") as f:
+                    f.seek(self._offset)
+                    data = f.read(st.st_size - self._offset)
+                cut = data.rfind(b"\n") + 1
+                for line in data[:cut].splitlines():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.count += 1
+                    self.latest[record["file"]] = record
+                    for key, outcome in record.get("checks", {}).items():
+                        self.cache[key] = outcome
+                self._offset += cut
+            return dict(self.latest), self.cache
+
+
+_index = _ResultsIndex()
+
+
+def _load_results():
+    """Latest record per file and outcome per cache key, compacting the journal when due"""
+    latest, cache = _index.refresh()
+    if _index.count > len(latest) + COMPACT_SLACK_RECORDS:
+        compact()
+        latest, cache = _index.refresh()
+    return latest, cache
+
+
+def compact():
+    """Rewrite the journal as the latest record of each file"""
+    path = _results_path()
+    with locks.file_lock(path):
+        if not path.exists():
+            return
+        latest = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                latest[record["file"]] = record
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for filename in sorted(latest):
+                f.write(json.dumps(latest[filename]) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _append_result(record):
+    path = _results_path()
+    with locks.file_lock(path):  # compaction rewrites the journal under this lock
+        locks.append_record(path, json.dumps(record) + "\n")
+
 
-# Module-level storage for last test result
-_last_test_result = None
+def _cache_key(sha256, check, params):
+    params_json = json.dumps(params, sort_keys=True)
+    return f"{sha256}:{check['name']}:{check['version']}:{params_json}"
+
+
+def _stat_key(path):
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def _test_file(filename, params, latest, cache):
+    """Run (or reuse) every applicable check for one file"""
+    if not workbench.file_exists(filename):
+        return {"file": filename, "passed": False, "details": f"File {filename} does not exist"}
+
+    path = workbench.get_workspace_path(filename)
+    stat_key = _stat_key(path)
+    checks = checks_for(filename)
+
+    # An unchanged stat means the recorded hash still holds; skip reading
+    previous = latest.get(filename)
+    data = None
+    if previous and previous.get("stat") == stat_key:
+        sha256 = previous["sha256"]
+    else:
+        data = path.read_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+
+    keys = {_cache_key(sha256, check, params): check for check in checks}
+    pending = [key for key in keys if key not in cache]
+
+    if not pending and previous and previous["sha256"] == sha256 \
+            and previous.get("stat") == stat_key and set(previous.get("checks", {})) == set(keys):
+        return previous
+
+    if pending:
+        if data is None:
+            data = path.read_bytes()
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return _record(filename, sha256, stat_key, {}, False, f"File {filename} is not valid UTF-8")
+        for key in pending:
+            message = keys[key]["func"](text, filename, params)
+            cache[key] = {"passed": message is None, "details": message}
+
+    outcomes = {key: cache[key] for key in keys}
+    failures = [outcome["details"] for outcome in outcomes.values() if not outcome["passed"]]
+    if failures:
+        return _record(filename, sha256, stat_key, outcomes, False, failures[0])
+    return _record(filename, sha256, stat_key, outcomes, True, f"File {filename} passed all smoke tests")
+
+
+def _record(filename, sha256, stat_key, outcomes, passed, details):
+    record = {
+        "file": filename,
+        "sha256": sha256,
+        "stat": stat_key,
+        "checks": outcomes,
+        "passed": passed,
+        "details": details,
+        "ts": datetime.utcnow().isoformat() + "Z"
+    }
+    _append_result(record)
+    return record
+
+
+@perf.span("tests")
+def run_checks(filenames, params=None, workers=DEFAULT_WORKERS):
+    """Test several files in parallel; returns {filename: result}"""
+    params = params or {}
+    latest, cache = _load_results()
+
+    def test_one(filename):
+        return filename, _test_file(filename, params.get(filename, {}), latest, cache)
+
+    if workers > 1 and len(filenames) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(test_one, filenames))
+    return dict(map(test_one, filenames))
 
 
 def run_smoke(plan):
     """Run smoke tests on a plan after changes"""
-    global _last_test_result
-    
     filename = plan["target_file"]
-    replacement = plan["replace_text"]
-    
+    params = {"replace_text": plan["replace_text"]}
     try:
-        # Check if file exists
-        if not workbench.file_exists(filename):
-            _last_test_result = {
-                "passed": False,
-                "details": f"File {filename} does not exist"
-            }
-            return _last_test_result
-        
-        # Read file content
-        content = workbench.read_file(filename)
-        
-        # Check if file is non-empty
-        if not content.strip():
-            _last_test_result = {
-                "passed": False,
-                "details": f"File {filename} is empty"
-            }
-            return _last_test_result
-        
-        # Check if replacement text is present
-        if replacement not in content:
-            _last_test_result = {
-                "passed": False,
-                "details": f"Replacement text '{replacement}' not found in {filename}"
-            }
-            return _last_test_result
-        
-        # Check if content is valid UTF-8 (already handled by read_file)
-        try:
-            content.encode('utf-8')
-        except UnicodeEncodeError:
-            _last_test_result = {
-                "passed": False,
-                "details": f"File {filename} is not valid UTF-8"
-            }
-            return _last_test_result
-        
-        _last_test_result = {
-            "passed": True,
-            "details": f"File {filename} passed all smoke tests"
-        }
-        return _last_test_result
-        
+        result = run_checks([filename], {filename: params})[filename]
+        return {"passed": result["passed"], "details": result["details"]}
     except Exception as e:
-        _last_test_result = {
-            "passed": False,
-            "details": f"Test error: {str(e)}"
-        }
-        return _last_test_result
+        return {"passed": False, "details": f"Test error: {str(e)}"}
 
 
 def run_tests(filename):
@@ -75,6 +244,48 @@ def run_tests(filename):
     return run_smoke(plan)
 
 
-def last_tests_passed():
-    """Check if the last tests passed"""
-    return _last_test_result is not None and _last_test_result.get("passed", False)
+def record_result(filename, result, sha256):
+    """Persist a result computed elsewhere (e.g. during a streaming rewrite).
+
+    The file's stat is only recorded for a pass, because a failed streaming
+    rewrite never replaced the file the stat would describe.
+    """
+    path = workbench.get_workspace_path(filename)
+    stat_key = _stat_key(path) if result["passed"] and path.exists() else None
+    _record(filename, sha256, stat_key, {}, result["passed"], result["details"])
+    return result
+
+
+def passed_sha256(filename, latest=None):
+    """sha256 of the file's current content if its persisted tests passed, else None"""
+    if latest is None:
+        latest, _cache = _load_results()
+    record = latest.get(filename)
+    if not record or not record["passed"]:
+        return None
+
+    path = workbench.get_workspace_path(filename)
+    if not path.exists():
+        return None
+    if record.get("stat") == _stat_key(path):
+        return record["sha256"]
+    return record["sha256"] if blobs.sha256_file(path) == record["sha256"] else None
+
+
+def passed_files():
+    """Workspace files whose current content has passing persisted tests"""
+    latest, _cache = _load_results()
+    return sorted(filename for filename in latest if passed_sha256(filename, latest))
+
+
+def last_tests_passed(filename=None):
+    """Check if the persisted tests passed for the file's current content.
+
+    Without a filename, reports the most recently tested file.
+    """
+    latest, _cache = _load_results()
+    if filename is None:
+        if not latest:
+            return False
+        filename = max(latest.values(), key=lambda r: r["ts"])["file"]
+    return passed_sha256(filename, latest) is not None
@@ -3,8 +3,15 @@ Workbench (controlled file IO under ./workspace)
 Provides safe file operations within the workspace boundary.
 """
 
+import os
+import uuid
+import errno
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
-from . import room, referee
+from . import room, referee, blobs, locks, manifest, perf
 import logging
 
 logbook = logging.getLogger("logbook")
@@ -23,14 +30,27 @@ def file_exists(filename):
 
 
 def read_file(filename):
-    """Read a file from the workspace"""
+    """Read a file from the workspace, keeping line endings untranslated like iter_lines"""
     path = get_workspace_path(filename)
     referee.enforce_workspace_only(path)
 
     if not path.exists():
         return ""
 
-    return path.read_text(encoding="utf-8")
+    with open(path, "r", encoding="utf-8", newline="\n") as f:
+        return f.read()
+
+
+def iter_lines(filename):
+    """Stream a workspace file line by line, keeping line endings untranslated"""
+    path = get_workspace_path(filename)
+    referee.enforce_workspace_only(path)
+
+    if not path.exists():
+        return
+
+    with open(path, "r", encoding="utf-8", newline="\n") as f:
+        yield from f
 
 
 def bootstrap_write(rel_path: str, content: str) -> None:
@@ -39,31 +59,272 @@ def bootstrap_write(rel_path: str, content: str) -> None:
     referee.enforce_diff_only(path=file_path)  # allowed only if file does NOT exist (bootstrap)
     with open(file_path, "x", encoding="utf-8") as f:  # create-only
         f.write(content)
+    manifest.record(file_path)
 
 
-def write_file_guarded(rel_path: str, content: str) -> None:
+@perf.span("write")
+def write_file_guarded(rel_path: str, content: str, token=None) -> None:
     """Guarded file write that enforces all rules"""
     file_path: Path = room.workspace_path() / rel_path
     referee.enforce_workspace_only(file_path)
-    referee.enforce_diff_only(path=file_path)  # blocks unless in diff-mode (or bootstrap)
+    referee.enforce_diff_only(path=file_path, token=token)  # blocks unless holding a diff token (or bootstrap)
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(content)
+    manifest.record(file_path, hashlib.sha256(content.encode("utf-8")).hexdigest())
 
 
-def write_file(filename, content):
-    """Legacy write function - redirects to guarded version"""
-    write_file_guarded(filename, content)
+class StagedWrite:
+    """A binary temp file staged next to a target, see staged_write_guarded"""
+
+    def __init__(self, target: Path, path: Path, file):
+        self.target = target
+        self.path = path
+        self.file = file
+        self.discarded = False
+        self.sha256 = None  # set by writers that hash the content as they go
+
+    def discard(self) -> None:
+        """Throw the staged content away instead of replacing the target"""
+        self.discarded = True
+
+
+@contextmanager
+def staged_write_guarded(rel_path: str, token=None):
+    """Guarded atomic write: yields a StagedWrite whose temp file replaces the
+    target by rename when the block exits, unless it was discarded or raised"""
+    file_path: Path = room.workspace_path() / rel_path
+    referee.enforce_workspace_only(file_path)
+    referee.enforce_diff_only(path=file_path, token=token)  # blocks unless holding a diff token (or bootstrap)
+
+    fd, tmp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    stage = StagedWrite(file_path, Path(tmp_name), os.fdopen(fd, "wb"))
+    try:
+        yield stage
+        stage.file.flush()
+        os.fsync(stage.file.fileno())
+        stage.file.close()
+        if stage.discarded:
+            os.unlink(tmp_name)
+            return
+        if file_path.exists():
+            shutil.copymode(file_path, tmp_name)
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        stage.file.close()
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    manifest.record(file_path, stage.sha256)
+
+
+@perf.span("write")
+def write_lines_guarded(rel_path: str, lines, token=None) -> None:
+    """Guarded streaming write: lines go to a temp file that atomically replaces the target"""
+    with staged_write_guarded(rel_path, token=token) as stage:
+        digest = hashlib.sha256()
+        for line in lines:
+            data = line.encode("utf-8")
+            digest.update(data)
+            stage.file.write(data)
+        stage.sha256 = digest.hexdigest()
+
+
+class Transaction:
+    """A batch of guarded reads and writes on a fixed set of workspace paths.
+
+    Paths are validated once when the transaction opens. Every access then
+    goes through directory fds opened from the workspace root with
+    O_NOFOLLOW, so nothing is resolved again and a symlink can never lead
+    out of the workspace. The advisory lock of every path (the one the
+    executor takes) is held from open to close, in path order, so no other
+    writer gets between the transaction's reads and its commit; do not open
+    one while holding the lock of one of its paths. Writes are checked
+    against their diff token as they are queued and again on commit, before
+    any of them lands, then land together, each by temp file and rename.
+    """
+
+    def __init__(self, rel_paths):
+        self.paths = set(rel_paths)
+        self._root = room.get_resolved_workspace_dir()
+        self._dir_fds = {}
+        self._writes = {}  # rel_path -> (data, token)
+        self._locks = ExitStack()
+
+    def lock(self):
+        """Take the advisory lock of every declared path"""
+        for rel_path in sorted(self.paths):
+            self._locks.enter_context(locks.file_lock(self._root / rel_path))
+
+    def _check(self, rel_path):
+        if rel_path not in self.paths:
+            referee.report_violation()  # only declared paths were validated
+
+    def _dir_fd(self, rel_dir, create=False):
+        """fd of a workspace directory, opened component by component without following symlinks"""
+        if rel_dir in self._dir_fds:
+            return self._dir_fds[rel_dir]
+        if not rel_dir:
+            fd = os.open(self._root, os.O_RDONLY | os.O_DIRECTORY)
+        else:
+            parent, _, name = rel_dir.rpartition("/")
+            parent_fd = self._dir_fd(parent, create)
+            if create:
+                try:
+                    os.mkdir(name, dir_fd=parent_fd)
+                except FileExistsError:
+                    pass
+            try:
+                fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd)
+            except OSError as e:
+                if e.errno in (errno.ELOOP, errno.ENOTDIR):
+                    referee.report_violation()  # a symlinked directory could lead outside
+                raise
+        self._dir_fds[rel_dir] = fd
+        return fd
+
+    def _open(self, rel_path, flags, mode=0o644):
+        rel_dir, _, name = rel_path.rpartition("/")
+        dir_fd = self._dir_fd(rel_dir, create=bool(flags & os.O_CREAT))
+        try:
+            return os.open(name, flags | os.O_NOFOLLOW, mode, dir_fd=dir_fd)
+        except OSError as e:
+            if e.errno == errno.ELOOP:
+                referee.report_violation()  # a symlinked file could lead outside
+            raise
 
+    def exists(self, rel_path):
+        """Check if a declared file exists"""
+        self._check(rel_path)
+        try:
+            os.close(self._open(rel_path, os.O_RDONLY))
+            return True
+        except (FileNotFoundError, NotADirectoryError):
+            return False
 
-def list_files():
-    """List all files in the workspace"""
-    workspace_dir = room.get_workspace_dir()
-    files = []
+    def read_bytes(self, rel_path):
+        """Read a declared file's bytes, b"" if it does not exist"""
+        self._check(rel_path)
+        try:
+            fd = self._open(rel_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return b""
+        with os.fdopen(fd, "rb") as f:
+            return f.read()
+
+    def read(self, rel_path):
+        """Read a declared file as text, "" if it does not exist (like read_file)"""
+        return self.read_bytes(rel_path).decode("utf-8")
+
+    def read_many(self, rel_paths):
+        """Read several declared files: {rel_path: text}"""
+        return {rel_path: self.read(rel_path) for rel_path in rel_paths}
+
+    def _authorize(self, rel_path, token):
+        target = self._root / rel_path
+        if referee.BOOTSTRAP_MODE:
+            referee.enforce_diff_only(path=target)
+        else:
+            referee.enforce_diff_only(path=target, token=token, resolved=True)
+
+    def write(self, rel_path, content, token=None):
+        """Queue a guarded write; it lands when the transaction commits"""
+        self._check(rel_path)
+        self._authorize(rel_path, token)
+        self._writes[rel_path] = (content.encode("utf-8") if isinstance(content, str) else content, token)
+
+    @perf.span("write")
+    def commit(self):
+        """Write every queued file: temp file beside it, fsync, rename over it.
+
+        Every write's token is checked again first, so a token revoked since
+        the write was queued stops the whole commit before anything lands.
+        """
+        for rel_path, (_data, token) in self._writes.items():
+            self._authorize(rel_path, token)
+        written = []
+        for rel_path, (data, _token) in self._writes.items():
+            rel_dir, _, name = rel_path.rpartition("/")
+            dir_fd = self._dir_fd(rel_dir, create=True)
+            tmp_name = f".{name}.{uuid.uuid4().hex}.tmp"
+            fd = os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o644, dir_fd=dir_fd)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.chmod(tmp_name, os.stat(name, dir_fd=dir_fd, follow_symlinks=False).st_mode & 0o7777,
+                             dir_fd=dir_fd)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+            except BaseException:
+                try:
+                    os.unlink(tmp_name, dir_fd=dir_fd)
+                except FileNotFoundError:
+                    pass
+                raise
+            stat = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+            written.append((rel_path, stat, hashlib.sha256(data).hexdigest()))
+        self._writes.clear()
+        if written:
+            manifest.record_many(written)
+
+    def close(self):
+        for fd in self._dir_fds.values():
+            os.close(fd)
+        self._dir_fds.clear()
+        self._locks.close()
+
+
+@contextmanager
+def transaction(rel_paths):
+    """Open a Transaction on workspace-relative paths; queued writes commit on a clean exit"""
+    rel_paths = [str(rel_path) for rel_path in rel_paths]
+    referee.enforce_relative_paths(rel_paths)
+    txn = Transaction(rel_paths)
+    try:
+        txn.lock()
+        yield txn
+        txn.commit()
+    finally:
+        txn.close()
+
+
+@perf.span("snapshot")
+def snapshot(filename, sha256=None):
+    """Record the current version of a workspace file in the blob store; None if missing"""
+    path = get_workspace_path(filename)
+    referee.enforce_workspace_only(path)
+    if not path.exists():
+        return None
+    return blobs.put_file(path, sha256=sha256)
+
+
+@perf.span("write")
+def restore_guarded(rel_path: str, blob_id: str, token=None) -> None:
+    """Guarded restore: a verified copy of a stored version replaces the target by rename"""
+    file_path: Path = room.workspace_path() / rel_path
+    referee.enforce_workspace_only(file_path)
+    referee.enforce_diff_only(path=file_path, token=token)  # blocks unless holding a diff token (or bootstrap)
+    blobs.copy_out(blob_id, file_path)
+    manifest.record(file_path, blob_id)
+
+
+def file_size(filename):
+    """Size in bytes of a workspace file, 0 if it does not exist"""
+    path = get_workspace_path(filename)
+    referee.enforce_workspace_only(path)
+    return path.stat().st_size if path.exists() else 0
+
+
+def write_file(filename, content, token=None):
+    """Legacy write function - redirects to guarded version"""
+    write_file_guarded(filename, content, token=token)
 
-    if workspace_dir.exists():
-        for path in workspace_dir.rglob("*"):
-            if path.is_file():
-                relative_path = path.relative_to(workspace_dir)
-                files.append(str(relative_path))
 
-    return files
\ No newline at end of file
+def list_files(refresh=False):
+    """List all files in the workspace (from the manifest; refresh rescans the disk first)"""
+    if refresh:
+        manifest.refresh()
+    return sorted(manifest.entries())
\ No newline at end of file
@@ -4,22 +4,28 @@ Cage Code-Runner CLI Entrypoint (Room)
 Main launcher that coordinates all cage components.
 """
 
+import os
 import sys
+import time
 import argparse
-import json
-import uuid
-import math
-from datetime import datetime
+import contextlib
 from pathlib import Path
 
 # Add the current directory to Python path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from cagecore import room, referee, workbench, rulebook, logbook, voice, rehydrator, planner, executor, tests, embedder
+# Everything else is imported by the command that needs it, so cheap
+# commands never load the planner, executor or diff machinery
+from cagecore import referee, voice, metrics, perf
 
 
-def main():
+def build_parser():
+    """The command-line parser, shared by single runs and batch/shell sessions"""
     parser = argparse.ArgumentParser(description="Cage Code-Runner")
+    parser.add_argument('--profile', action='store_true', help='Run the command under cProfile')
+    parser.add_argument('--profile-out', metavar='FILE', help='Write the profile here instead of stderr')
+    parser.add_argument('--profile-format', choices=perf.PROFILE_FORMATS, default='text',
+                        help='text (top functions), pstats (binary dump) or collapsed (flamegraph stacks)')
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
     # init command
@@ -31,20 +37,58 @@ def main():
     plan_parser.add_argument('--file', required=True, help='Target file in workspace')
     plan_parser.add_argument('--replace', required=True, help='Text to replace')
     plan_parser.add_argument('--with', dest='replacement', required=True, help='Replacement text')
+    plan_parser.add_argument('--regex', action='store_true',
+                             help='Treat --replace as a regular expression (--with may use \\1 backreferences)')
 
     # show-plan command
-    subparsers.add_parser('show-plan', help='Show the latest plan')
+    show_plan_parser = subparsers.add_parser('show-plan', help='Show the latest plan')
+    show_plan_parser.add_argument('--all', dest='show_all', action='store_true', help='Show every queued plan')
 
     # apply command
-    subparsers.add_parser('apply', help='Apply the latest plan')
+    apply_parser = subparsers.add_parser('apply', help='Apply the latest plan')
+    apply_parser.add_argument('--all', dest='apply_all', action='store_true',
+                              help='Apply every queued plan, batched per target file')
+    apply_parser.add_argument('--workers', type=int, default=1,
+                              help='With --all, apply independent files on this many threads')
+    apply_parser.add_argument('--stream', action='store_true',
+                              help='Rewrite in streaming mode (automatic for very large files)')
+
+    # discard command
+    discard_parser = subparsers.add_parser('discard', help='Drop queued plans without applying them')
+    discard_target = discard_parser.add_mutually_exclusive_group(required=True)
+    discard_target.add_argument('--id', dest='plan_ids', nargs='+', metavar='ID',
+                                help="Plan id (or a prefix of it), as shown by show-plan")
+    discard_target.add_argument('--all', dest='discard_all', action='store_true', help='Every queued plan')
+
+    # test command
+    test_parser = subparsers.add_parser('test', help='Run the smoke checks on workspace files')
+    test_parser.add_argument('files', nargs='*', help='Files to test')
+    test_parser.add_argument('--changed', action='store_true',
+                             help='Test every file changed since the last marked run (see changed)')
+    test_parser.add_argument('--workers', type=int, default=4, help='Test this many files in parallel')
+
+    # revert command
+    revert_parser = subparsers.add_parser('revert', help='Restore a recorded version of a file')
+    revert_parser.add_argument('--to', dest='entry', required=True,
+                               help='Hash (or unique prefix) of a logbook entry that recorded blob ids')
+    revert_parser.add_argument('--before', action='store_true',
+                               help='Restore the version from before that entry instead of after it')
 
     # publish command
-    publish_parser = subparsers.add_parser('publish', help='Publish a file to artifacts')
-    publish_parser.add_argument('--file', required=True, help='File to publish')
+    publish_parser = subparsers.add_parser('publish', help='Publish files to artifacts')
+    publish_target = publish_parser.add_mutually_exclusive_group(required=True)
+    publish_target.add_argument('--file', help='File to publish')
+    publish_target.add_argument('--files', nargs='+', help='Several files to publish in one batch')
+    publish_target.add_argument('--all-passed', action='store_true',
+                                help='Publish every file whose current content passed its tests')
 
     # show-log command
     subparsers.add_parser('show-log', help='Show recent log entries')
 
+    # changed command
+    changed_parser = subparsers.add_parser('changed', help='List workspace files changed since the last marked run')
+    changed_parser.add_argument('--mark', action='store_true', help='Mark this run for the next check')
+
     # Add-correction subcommand
     add_correction_parser = subparsers.add_parser("add-correction", help="Add a correction rule")
     add_correction_parser.add_argument("--from", dest="from_text", required=True, help="Text to replace")
@@ -62,43 +106,135 @@ def main():
     retrieve_parser = subparsers.add_parser("retrieve", help="Retrieve atoms by similarity")
     retrieve_parser.add_argument("--query", required=True, help="Query text")
     retrieve_parser.add_argument("--k", type=int, default=5, help="Number of results")
+    retrieve_parser.add_argument("--expand", type=int, default=0, metavar="HOPS",
+                                 help="Also show atoms linked to the results, up to HOPS links away")
+    retrieve_parser.add_argument("--decay", type=float, default=0.5,
+                                 help="Score kept per link followed by --expand")
+
+    # Link subcommand
+    link_parser = subparsers.add_parser("link", help="Link two atoms")
+    link_parser.add_argument("--from", dest="src", required=True, help="Atom id")
+    link_parser.add_argument("--to", dest="dst", required=True, help="Atom id")
+    link_parser.add_argument("--kind", default="related", help="Kind of link, e.g. answers")
+    link_parser.add_argument("--weight", type=float, default=1.0, help="Link strength (scales expanded scores)")
+
+    # Perf-report subcommand
+    perf_report_parser = subparsers.add_parser("perf-report", help="Aggregate stage timings across runs")
+    perf_report_parser.add_argument("--command", dest="report_command", help="Only this command's runs")
+    perf_report_parser.add_argument("--last", type=int, help="Only each command's most recent N runs")
+
+    # Batch and shell sessions
+    batch_parser = subparsers.add_parser("batch", help="Run commands from a file, one per line, in one process")
+    batch_parser.add_argument("file", help="Command file ('-' for stdin)")
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first failing command")
+    subparsers.add_parser("shell", help="Interactive prompt running commands in one process")
+
+    # Daemon
+    daemon_parser = subparsers.add_parser("daemon", help="Resident process that serves run.py commands")
+    daemon_parser.add_argument("action", nargs="?", choices=["run", "start", "stop", "status"], default="run",
+                               help="run in the foreground (default), start in the background, stop, or status")
+
+    return parser
+
 
+def main():
+    # Thin client: hand the command to a running daemon when there is one
+    status = _forward_to_daemon(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+    parser = build_parser()
     args = parser.parse_args()
 
+    profiler = perf.profiled(args.profile_out, args.profile_format) if args.profile else contextlib.nullcontext()
     try:
-        if args.command == 'init':
-            cmd_init()
-        elif args.command == 'plan':
-            # Rehydrate before planning
-            rehydrator.rehydrate()
-            cmd_plan(args.title, args.file, args.replace, args.replacement)
-        elif args.command == 'show-plan':
-            cmd_show_plan()
-        elif args.command == 'apply':
-            # Rehydrate before applying
-            rehydrator.rehydrate()
-            cmd_apply()
-        elif args.command == 'publish':
-            # Rehydrate before publishing
-            rehydrator.rehydrate()
-            cmd_publish(args.file)
-        elif args.command == 'show-log':
-            cmd_show_log()
-        elif args.command == 'add-correction':
-            cmd_add_correction(args.from_text, args.to_text, args.note)
-        elif args.command == "ingest":
-            cmd_ingest(args.author, args.role, args.text, args.topic)
-        elif args.command == "retrieve":
-            cmd_retrieve(args.query, args.k)
-        else:
-            parser.print_help()
+        with profiler:
+            if args.command == "batch":
+                status = cmd_batch(parser, args.file, args.stop_on_error)
+            elif args.command == "shell":
+                status = cmd_shell(parser)
+            elif args.command == "daemon":
+                status = cmd_daemon(parser, args.action)
+            else:
+                status = run_command(args, parser)
+    finally:
+        # Hand this run's timings to the status server's /metrics
+        metrics.flush()
+    sys.exit(status)
+
+
+def run_command(args, parser):
+    """Run one parsed command and record its stage timings; returns the exit status"""
+    perf.reset()
+    started = time.perf_counter()
+    try:
+        dispatch(args, parser)
+        return 0
     except referee.RuleViolationError:
         print("Not allowed. Diff-only and append-only per the rules.")
-        sys.exit(1)
+        return 1
+    finally:
+        # Record where this run's time went for perf-report
+        summary = perf.run_summary(args.command, time.perf_counter() - started)
+        if summary:
+            perf.record(summary)
+
+
+def _rehydrate():
+    """Rehydrate unless this process already has (once per batch or shell session)"""
+    from cagecore import rehydrator
+    if not rehydrator.is_rehydrated():
+        rehydrator.rehydrate()
+
+
+def dispatch(args, parser):
+    """Run the command chosen on the command line"""
+    if args.command == 'init':
+        cmd_init()
+    elif args.command == 'plan':
+        # Rehydrate before planning
+        _rehydrate()
+        cmd_plan(args.title, args.file, args.replace, args.replacement, args.regex)
+    elif args.command == 'show-plan':
+        cmd_show_plan(args.show_all)
+    elif args.command == 'apply':
+        # Rehydrate before applying
+        _rehydrate()
+        cmd_apply(args.apply_all, args.workers, args.stream)
+    elif args.command == 'discard':
+        cmd_discard(args.plan_ids, args.discard_all)
+    elif args.command == 'test':
+        cmd_test(args.files, args.changed, args.workers)
+    elif args.command == 'revert':
+        # Rehydrate before restoring
+        _rehydrate()
+        cmd_revert(args.entry, args.before)
+    elif args.command == 'publish':
+        # Rehydrate before publishing
+        _rehydrate()
+        cmd_publish([args.file] if args.file else args.files, args.all_passed)
+    elif args.command == 'show-log':
+        cmd_show_log()
+    elif args.command == 'changed':
+        cmd_changed(args.mark)
+    elif args.command == 'add-correction':
+        cmd_add_correction(args.from_text, args.to_text, args.note)
+    elif args.command == "ingest":
+        cmd_ingest(args.author, args.role, args.text, args.topic)
+    elif args.command == "retrieve":
+        cmd_retrieve(args.query, args.k, args.expand, args.decay)
+    elif args.command == "link":
+        cmd_link(args.src, args.dst, args.kind, args.weight)
+    elif args.command == "perf-report":
+        cmd_perf_report(args.report_command, args.last)
+    else:
+        parser.print_help()
 
 
+@metrics.timed("cage_command", command="init")
 def cmd_init():
     """Initialize the cage environment"""
+    from cagecore import room, workbench, rulebook, logbook
     room.ensure_dirs()
     with referee.allow_bootstrap():
         workbench.bootstrap_write("sample.txt", "Hello, welcome to the cage!")
@@ -109,82 +245,204 @@ def cmd_init():
     print(voice.threadline("Workspace, rulebook, and logbook are set."))
 
 
-def cmd_plan(title, filename, find_text, replace_text):
+@metrics.timed("cage_command", command="plan")
+def cmd_plan(title, filename, find_text, replace_text, regex=False):
     """Create a plan"""
-    plan_data = planner.create_plan(title, filename, find_text, replace_text)
+    import re
+    from cagecore import planner, logbook
+    try:
+        plan_data = planner.create_plan(title, filename, find_text, replace_text, regex=regex)
+    except re.error as e:
+        print(voice.maxim_threadline("Plan refused.", f"Invalid pattern: {e}"))
+        return
     logbook.append("plan", plan_data)
 
     print(voice.maxim_threadline(f"Plan '{title}' recorded.",
                                 f"Will replace '{find_text}' with '{replace_text}' in {filename}."))
 
 
-def cmd_show_plan():
-    """Show the latest plan"""
-    plan = planner.get_latest_plan()
-    if plan:
-        print(voice.format_json(plan))
+@metrics.timed("cage_command", command="show-plan")
+def cmd_show_plan(show_all=False):
+    """Show the latest plan, or the whole queue"""
+    from cagecore import planner
+    if show_all:
+        plans = planner.get_pending_plans()
+        if plans:
+            print(voice.format_json(plans))
+            return
     else:
-        print(voice.maxim_threadline("No plan found.", "Create a plan first with the 'plan' command."))
+        plan = planner.get_latest_plan()
+        if plan:
+            print(voice.format_json(plan))
+            return
 
+    print(voice.maxim_threadline("No plan found.", "Create a plan first with the 'plan' command."))
 
-def cmd_apply():
-    """Apply the latest plan"""
+
+@metrics.timed("cage_command", command="apply")
+def cmd_apply(apply_all=False, workers=1, stream=False):
+    """Apply the latest plan, or every queued plan"""
+    from cagecore import executor
     # Referee checks
     referee.enforce_plan_then_act()
     referee.enforce_rehydrate_before_act()
 
     # Rehydrate
-    rehydrator.rehydrate()
+    _rehydrate()
 
     # Execute
-    result = executor.apply_latest_plan()
+    if apply_all:
+        result = executor.apply_all_plans(workers=workers, stream=stream)
+    else:
+        result = executor.apply_latest_plan(stream=stream)
 
-    if result['success']:
+    if result.get('skipped'):
+        print(voice.maxim_threadline("Nothing to apply.", "Another run already applied the queued plans."))
+    elif result['success']:
         print(voice.maxim_threadline("Applied safely.", "Changes have been made and tests passed."))
+    elif result.get('files'):
+        applied = [name for name, outcome in result['files'].items() if outcome['success']]
+        threadline = result['error']
+        if applied:
+            threadline += f" Applied: {', '.join(applied)}."
+        print(voice.maxim_threadline("Apply partly failed.", threadline))
     else:
         print(voice.maxim_threadline("Apply failed.", result.get('error', 'Unknown error occurred.')))
 
 
-def cmd_publish(filename):
-    """Publish a file to artifacts"""
-    if not tests.last_tests_passed():
-        print(voice.maxim_threadline("Publish refused.", "Tests must pass before publishing."))
+@metrics.timed("cage_command", command="discard")
+def cmd_discard(plan_ids=None, discard_all=False):
+    """Drop queued plans without applying them"""
+    from cagecore import planner, logbook
+    discarded = planner.discard(None if discard_all else plan_ids)
+    if not discarded:
+        print(voice.maxim_threadline("Nothing discarded.", "No queued plan matches."))
         return
-
-    # Copy file to artifacts
-    source = workbench.get_workspace_path(filename)
-    if not source.exists():
-        print(voice.maxim_threadline("File not found.", f"{filename} does not exist in workspace."))
+    logbook.append("plan_discarded", {"plan_ids": [plan["id"] for plan in discarded]})
+    titles = ", ".join(f"'{plan['title']}'" for plan in discarded)
+    print(voice.maxim_threadline("Plans discarded.", f"{len(discarded)} plan(s) dropped from the queue: {titles}."))
+
+
+@metrics.timed("cage_command", command="test")
+def cmd_test(filenames=None, changed=False, workers=4):
+    """Run the smoke checks on the given files, or on every changed file, in parallel"""
+    from cagecore import tests, logbook
+    filenames = list(filenames or [])
+    if changed:
+        from cagecore import manifest
+        filenames += [name for name in manifest.changed_since()["changed"] if name not in filenames]
+    if not filenames:
+        print(voice.maxim_threadline("Nothing to test.", "Name files to test, or use --changed."))
         return
 
-    artifacts_dir = room.get_artifacts_dir()
-    artifacts_dir.mkdir(exist_ok=True)
+    results = tests.run_checks(filenames, workers=workers)
+    logbook.append("tests", {"files": {name: {"passed": result["passed"], "details": result["details"]}
+                                       for name, result in results.items()}})
+    for name, result in results.items():
+        print(f"{'ok  ' if result['passed'] else 'FAIL'} {name}: {result['details']}")
+
+    failed = [name for name, result in results.items() if not result["passed"]]
+    if failed:
+        print(voice.maxim_threadline("Tests failed.", f"{len(failed)} of {len(results)} file(s) failed."))
+    else:
+        print(voice.maxim_threadline("Tests passed.", f"{len(results)} file(s) passed their smoke checks."))
 
-    dest = artifacts_dir / filename
-    dest.write_text(source.read_text())
 
-    logbook.append("publish", {"file": filename, "from": str(source), "to": str(dest)})
+@metrics.timed("cage_command", command="revert")
+def cmd_revert(entry_hash, before=False):
+    """Restore the file version recorded by a logbook entry"""
+    from cagecore import logbook, blobs, executor
+    referee.enforce_rehydrate_before_act()
 
-    print(voice.maxim_threadline("Published successfully.", f"{filename} moved to artifacts directory."))
+    entry = logbook.find_entry(entry_hash)
+    data = entry.get("data", {}) if entry else {}
+    filename = data.get("file")
+    blob_id = data.get("before_blob" if before else "after_blob")
 
+    if not filename or not blob_id:
+        print(voice.maxim_threadline("No version found.", f"Entry {entry_hash} did not record a stored file version."))
+        return
+    if not blobs.has(blob_id):
+        print(voice.maxim_threadline("Version missing.", f"Blob {blob_id[:12]} is not in the snapshot store."))
+        return
 
+    result = executor.restore_version(filename, blob_id, source_entry=entry["hash"])
+
+    if not result["success"]:
+        print(voice.maxim_threadline("Revert failed.", result.get("error", "Unknown error occurred.")))
+    elif result["tests_passed"]:
+        print(voice.maxim_threadline("Reverted.", f"{filename} restored to version {blob_id[:12]}."))
+    else:
+        print(voice.maxim_threadline("Reverted, tests failing.",
+                                     f"{filename} restored to version {blob_id[:12]}, but smoke tests failed."))
+
+
+@metrics.timed("cage_command", command="publish")
+def cmd_publish(filenames, all_passed=False):
+    """Publish files to artifacts"""
+    from cagecore import tests, publisher
+    if all_passed:
+        filenames = tests.passed_files()
+        if not filenames:
+            print(voice.maxim_threadline("Nothing to publish.", "No file has passing tests for its current content."))
+            return
+
+    result = publisher.publish_files(filenames)
+    published = [item["file"] for item in result["published"]]
+    refused = result["refused"]
+
+    if result["success"]:
+        print(voice.maxim_threadline("Published successfully.", f"{', '.join(published)} moved to artifacts directory."))
+    elif published:
+        reasons = "; ".join(f"{name} {reason}" for name, reason in refused.items())
+        print(voice.maxim_threadline("Publish partly refused.", f"Published {', '.join(published)}. Refused: {reasons}."))
+    else:
+        reasons = "; ".join(f"{name} {reason}" for name, reason in refused.items())
+        print(voice.maxim_threadline("Publish refused.", f"Tests must pass before publishing ({reasons})."))
+
+
+@metrics.timed("cage_command", command="show-log")
 def cmd_show_log():
     """Show recent log entries"""
+    from cagecore import logbook
     entries = logbook.get_recent_entries(50)
     for entry in entries:
         print(voice.format_json(entry))
 
 
+@metrics.timed("cage_command", command="changed")
+def cmd_changed(mark=False):
+    """List workspace files changed since the last marked run"""
+    from cagecore import manifest
+    changes = manifest.changed_since()
+    for filename in changes["changed"]:
+        print(f"M {filename}")
+    for filename in changes["removed"]:
+        print(f"D {filename}")
+    if mark:
+        manifest.mark_run()
+
+    count = len(changes["changed"]) + len(changes["removed"])
+    print(voice.maxim_threadline("Workspace checked.", f"{count} file(s) changed since the last marked run."))
+
+
+@metrics.timed("cage_command", command="add-correction")
 def cmd_add_correction(from_text, to_text, note=None):
     """Add a correction to the rulebook"""
+    from cagecore import rulebook, logbook
     correction = rulebook.add_correction(from_text, to_text, note)
     logbook.append("correction_added", correction)
 
     print(voice.maxim_threadline("Correction added.", f"'{from_text}' → '{to_text}' recorded in rulebook."))
 
 
+@metrics.timed("cage_command", command="ingest")
 def cmd_ingest(author, role, text, topic=None):
     """Ingest a new atom"""
+    import json
+    import uuid
+    from datetime import datetime
+    from cagecore import embedder, locks
     atom_id = uuid.uuid4().hex
     ts = datetime.utcnow().isoformat() + "Z"
     embedding = embedder.vector(text)
@@ -201,58 +459,251 @@ def cmd_ingest(author, role, text, topic=None):
     if topic:
         atom["topic"] = topic
 
-    # Append to atoms.jsonl
-    with open("atoms.jsonl", "a", encoding="utf-8") as f:
-        f.write(json.dumps(atom) + "\n")
+    # Append to atoms.jsonl and trail.log, each record in one O_APPEND write
+    locks.append_record("atoms.jsonl", json.dumps(atom) + "\n")
 
-    # Append to trail.log
     text_preview = text[:60] + "..." if len(text) > 60 else text
+    text_preview = " ".join(text_preview.split())  # keep the trail line one line
     topic_str = f" {topic}" if topic else ""
     trail_entry = f"ingest {atom_id}{topic_str} {text_preview}"
-    with open("trail.log", "a", encoding="utf-8") as f:
-        f.write(trail_entry + "\n")
+    locks.append_record("trail.log", trail_entry + "\n")
 
     print(atom_id)
 
 
-def cosine_similarity(a, b):
-    """Calculate cosine similarity between two vectors"""
-    dot_product = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(x * x for x in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0
-    return dot_product / (norm_a * norm_b)
-
-
-def cmd_retrieve(query, k=5):
-    """Retrieve atoms by similarity to query"""
-    try:
-        with open("atoms.jsonl", "r", encoding="utf-8") as f:
-            atoms = [json.loads(line.strip()) for line in f if line.strip()]
-    except FileNotFoundError:
+@metrics.timed("cage_command", command="retrieve")
+def cmd_retrieve(query, k=5, expand=0, decay=0.5):
+    """Retrieve atoms by similarity to query, plus linked atoms with --expand"""
+    from cagecore import retrieval
+    index = retrieval.shared_index()
+    index.refresh()
+    if not len(index):
         print("No atoms found. Run 'ingest' first.")
         return
 
-    if not atoms:
-        print("No atoms found. Run 'ingest' first.")
+    # Print top-k
+    hits = index.search(query, k)
+    for atom in hits:
+        text_preview = atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
+        print(f"{atom['id']} | {atom['score']:.3f} | {atom['ts']} | {text_preview}")
+
+    if expand > 0:
+        from cagecore import links
+        graph = links.shared_graph()
+        graph.refresh(index)
+        for atom in links.expand(index, graph, hits, expand, decay):
+            text_preview = atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
+            print(f"{atom['id']} | {atom['score']:.3f} | {atom['ts']} | {text_preview} | via {atom['via']}")
+
+
+@metrics.timed("cage_command", command="link")
+def cmd_link(src, dst, kind="related", weight=1.0):
+    """Link two ingested atoms"""
+    from cagecore import retrieval, links, logbook
+    index = retrieval.shared_index()
+    index.refresh()
+    missing = [atom_id for atom_id in (src, dst) if index.ordinal(atom_id) is None]
+    if missing:
+        print(voice.maxim_threadline("Link not added.", f"No atom {missing[0]} in atoms.jsonl."))
+        return
+    if src == dst:
+        print(voice.maxim_threadline("Link not added.", "An atom cannot link to itself."))
         return
 
-    query_embedding = embedder.vector(query)
+    edge = links.make_edge(src, dst, kind, weight)
+    links.append(edge)
+    logbook.append("link_added", edge)
 
-    # Calculate similarities
-    results = []
-    for atom in atoms:
-        similarity = cosine_similarity(query_embedding, atom["embedding"])
-        results.append((atom, similarity))
+    print(voice.maxim_threadline("Link added.", f"{src} → {dst} ({kind}) recorded in links.jsonl."))
 
-    # Sort by similarity (descending)
-    results.sort(key=lambda x: x[1], reverse=True)
 
-    # Print top-k
-    for atom, score in results[:k]:
-        text_preview = atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
-        print(f"{atom['id']} | {score:.3f} | {atom['ts']} | {text_preview}")
+@metrics.timed("cage_command", command="perf-report")
+def cmd_perf_report(command=None, last=None):
+    """Aggregate the stage timings of past runs from their perf records"""
+    summary = perf.report(perf.iter_records(), command=command, last=last)
+    if not summary:
+        print(voice.maxim_threadline("No timings yet.", "Each cage command records its stage timings as it runs."))
+        return
+
+    for name, stats in summary.items():
+        total = stats["total"]
+        print(f"{name}: {stats['runs']} run(s), total mean {total['mean_ms']:.1f} ms, "
+              f"p50 {total['p50_ms']:.1f} ms, p95 {total['p95_ms']:.1f} ms")
+        print(f"  {'stage':<10} {'runs':>5} {'spans':>6} {'mean_ms':>10} {'p50_ms':>10} {'p95_ms':>10} {'share':>7}")
+        for stage, timing in stats["stages"].items():
+            print(f"  {stage:<10} {timing['runs']:>5} {timing['count']:>6} {timing['mean_ms']:>10.2f} "
+                  f"{timing['p50_ms']:>10.2f} {timing['p95_ms']:>10.2f} {timing['share']:>7.1%}")
+        print()
+
+    runs = sum(stats["runs"] for stats in summary.values())
+    print(voice.maxim_threadline("Timings aggregated.", f"{runs} run(s) across {len(summary)} command(s). "
+                                 "Stage times are inclusive, so shares can add up to more than 100%."))
+
+
+# Commands that only run as the process's own command line
+SESSION_COMMANDS = ("batch", "shell", "daemon")
+
+
+def run_line(parser, line):
+    """Parse and run one session line.
+
+    Returns (status, seconds), or None for a blank or comment line. A bad
+    line or a failing command is reported and the session carries on.
+    """
+    import shlex
+    try:
+        tokens = shlex.split(line, comments=True)
+    except ValueError as e:
+        print(f"Cannot parse line: {e}")
+        return 2, 0.0
+    if not tokens:
+        return None
+    return run_argv(parser, tokens)
+
+
+def run_argv(parser, tokens):
+    """Parse and run one command given as argument tokens; returns (status, seconds)"""
+    if tokens[0] in SESSION_COMMANDS:
+        print(f"'{tokens[0]}' cannot be used inside a session.")
+        return 2, 0.0
+    try:
+        args = parser.parse_args(tokens)
+    except SystemExit as e:  # argparse has printed the usage error or help
+        return (e.code or 0), 0.0
+
+    started = time.perf_counter()
+    try:
+        status = run_command(args, parser)
+    except Exception as e:
+        print(voice.maxim_threadline("Command failed.", f"{type(e).__name__}: {e}"))
+        status = 1
+    return status, time.perf_counter() - started
+
+
+@metrics.timed("cage_command", command="batch")
+def cmd_batch(parser, path, stop_on_error=False):
+    """Run a file of commands in one process, with timings"""
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    timings = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        print(f"$ {line.strip()}")
+        result = run_line(parser, line)
+        if result is None:
+            continue
+        status, seconds = result
+        timings.append((number, line.strip(), status, seconds))
+        print(f"[{seconds * 1000:.1f} ms{'' if status == 0 else f', exit {status}'}]\n")
+        if status and stop_on_error:
+            break
+
+    failed = sum(1 for _, _, status, _ in timings if status)
+    total = sum(seconds for _, _, _, seconds in timings)
+    print(f"{'line':>5} {'ms':>10} {'exit':>5}  command")
+    for number, line, status, seconds in timings:
+        print(f"{number:>5} {seconds * 1000:>10.1f} {status:>5}  {line[:60]}")
+    print(voice.maxim_threadline("Batch finished." if not failed else "Batch finished with failures.",
+                                 f"{len(timings)} command(s) in {total * 1000:.1f} ms, {failed} failed."))
+    return 1 if failed else 0
+
+
+def cmd_shell(parser):
+    """Interactive prompt; commands share one process, its caches and its rehydration"""
+    try:
+        import readline  # line editing and history for input(), where available
+    except ImportError:
+        pass
+
+    print(voice.maxim_threadline("Cage shell.", "Type a command as you would after 'run.py', "
+                                 "'help' for the list, 'exit' to leave."))
+    last_status = 0
+    while True:
+        try:
+            line = input("cage> ")
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if line.strip() in ("exit", "quit"):
+            break
+        if line.strip() == "help":
+            parser.print_help()
+            continue
+        result = run_line(parser, line)
+        if result is not None:
+            last_status, seconds = result
+            print(f"[{seconds * 1000:.1f} ms]")
+    return last_status
+
+
+def _forward_to_daemon(argv):
+    """Exit status of the command run by the cage daemon, or None to run it here"""
+    if not argv or argv[0].startswith("-") or argv[0] in SESSION_COMMANDS or os.environ.get("CAGE_NO_DAEMON"):
+        return None
+    from cagecore import room
+    if not room.get_daemon_socket_path().exists():
+        return None
+    from cagecore import daemon
+    return daemon.forward(argv)
+
+
+def _serve_forwarded(parser, argv):
+    """Run one command for a daemon client"""
+    status, _seconds = run_argv(parser, argv)
+    metrics.flush()
+    return status
+
+
+def cmd_daemon(parser, action):
+    """Run, start, stop or query the resident cage daemon"""
+    import subprocess
+    from cagecore import daemon, retrieval
+
+    if action == "status":
+        info = daemon.request({"op": "ping"})
+        if not info:
+            print(voice.maxim_threadline("No daemon.", "Commands run in their own process."))
+            return 1
+        print(voice.maxim_threadline("Daemon running.", f"pid {info['pid']}, up {info['uptime']:.0f} s, "
+                                     f"{info['requests']} command(s) served on {daemon.socket_path()}."))
+        return 0
+
+    if action == "stop":
+        if not daemon.stop():
+            print(voice.maxim_threadline("No daemon.", "Nothing to stop."))
+            return 1
+        print(voice.maxim_threadline("Daemon stopped.", "Commands run in their own process again."))
+        return 0
+
+    if action == "start":
+        if daemon.request({"op": "ping"}):
+            print(voice.maxim_threadline("Daemon already running.", f"Listening on {daemon.socket_path()}."))
+            return 0
+        with open(daemon.log_path(), "ab") as log:
+            subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "daemon", "run"],
+                             stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            info = daemon.request({"op": "ping"})
+            if info:
+                print(voice.maxim_threadline("Daemon started.", f"pid {info['pid']}, listening on "
+                                             f"{daemon.socket_path()}. run.py commands from {os.getcwd()} "
+                                             "now go through it."))
+                return 0
+            time.sleep(0.05)
+        print(voice.maxim_threadline("Daemon did not start.", f"See {daemon.log_path()}."))
+        return 1
+
+    # run: serve in the foreground, with the atom index loaded up front
+    retrieval.shared_index().refresh()
+    print(f"Cage daemon {os.getpid()} listening on {daemon.socket_path()}", flush=True)
+    daemon.serve(lambda argv: _serve_forwarded(parser, argv))
+    return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+CLI startup budget
+Checks that cheap run.py commands stay within an import-time budget and
+never load the planner, executor or diff machinery.
+
+    python scripts/import_budget.py
+    python scripts/import_budget.py --budget-ms 25 --repeat 7
+
+Each command runs under `python -X importtime` in a throwaway copy of the
+cage (run.py and cagecore only), so the real workspace and trail are never
+touched. The budget applies to the time spent importing cagecore modules
+and what they pull in, which leaves out the interpreter's own startup; the
+best of --repeat runs counts. Exits 1 on any failure.
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules only the editing commands may load
+HEAVY = ("cagecore.planner", "cagecore.executor", "cagecore.diffs", "cagecore.diffalgo", "cagecore.rewriter")
+
+# command line -> heavy modules it is still allowed to load
+COMMANDS = {
+    "show-log": (),
+    "show-plan": ("cagecore.planner",),
+    "changed": (),
+    "retrieve --query startup": (),
+    "perf-report": (),
+}
+
+
+def parse_importtime(stderr):
+    """(microseconds of all top-level imports, of the cagecore ones, set of modules imported)"""
+    total, cage_total, modules = 0, 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _self_us, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):  # top level: nested imports are indented
+            total += int(cumulative)
+            if name.strip().startswith("cagecore"):
+                cage_total += int(cumulative)
+    return total, cage_total, modules
+
+
+def measure(cage, command, repeat):
+    """Best (total, cagecore) import microseconds over repeat runs, and the modules loaded"""
+    best, modules = None, set()
+    for attempt in range(repeat + 1):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "run.py", *command.split()],
+                              cwd=cage, capture_output=True, text=True)
+        if attempt == 0:
+            continue  # compiles the .pyc files
+        total, cage_total, modules = parse_importtime(proc.stderr)
+        if best is None or cage_total < best[1]:
+            best = (total, cage_total)
+    return best, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check run.py startup import time")
+    parser.add_argument("--budget-ms", type=float, default=45.0,
+                        help="cagecore import time allowed per command")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per command (best one counts)")
+    args = parser.parse_args()
+
+    cage = tempfile.mkdtemp(prefix="cage-startup-")
+    failures = 0
+    try:
+        shutil.copy2(ROOT / "run.py", cage)
+        shutil.copytree(ROOT / "cagecore", os.path.join(cage, "cagecore"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        os.mkdir(os.path.join(cage, "workspace"))
+
+        print(f"{'command':<26} {'total_ms':>9} {'cage_ms':>8} {'modules':>8}  status")
+        for command, allowed in COMMANDS.items():
+            (total_us, cage_us), modules = measure(cage, command, args.repeat)
+            loaded = sorted(m for m in modules if m.startswith("cagecore."))
+            heavy = [m for m in HEAVY if m in modules and m not in allowed]
+            problems = []
+            if cage_us / 1000 > args.budget_ms:
+                problems.append(f"over {args.budget_ms:g} ms")
+            if heavy:
+                problems.append(f"loads {', '.join(heavy)}")
+            failures += bool(problems)
+            print(f"{command:<26} {total_us / 1000:>9.1f} {cage_us / 1000:>8.1f} {len(loaded):>8}  "
+                  f"{'; '.join(problems) or 'ok'}")
+    finally:
+        shutil.rmtree(cage, ignore_errors=True)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
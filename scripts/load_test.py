@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Status server load test
+Hammers status_server endpoints from concurrent keep-alive clients and
+reports throughput and latency percentiles.
+
+    python status_server.py &                      # development server
+    python scripts/load_test.py --port 8080
+    python status_server.py serve --port 8081 &    # production mode
+    python scripts/load_test.py --port 8081
+"""
+
+import time
+import argparse
+import threading
+import http.client
+
+
+def worker(host, port, paths, deadline, keepalive, timeout, stats, lock):
+    """Issue requests round-robin over paths until the deadline"""
+    latencies, errors, count = [], 0, 0
+    conn = None
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        if conn is None:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={} if keepalive else {"Connection": "close"})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+            if not keepalive or response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            if conn is not None:
+                conn.close()
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        count += 1
+    if conn is not None:
+        conn.close()
+    with lock:
+        stats["latencies"].extend(latencies)
+        stats["errors"] += errors
+        stats["requests"] += count
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the status server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--paths", nargs="+", default=["/", "/status.json", "/files"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--no-keepalive", dest="keepalive", action="store_false",
+                        help="Open a new connection per request")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    stats = {"latencies": [], "errors": 0, "requests": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker, args=(args.host, args.port, args.paths, deadline,
+                                                     args.keepalive, args.timeout, stats, lock))
+               for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats["latencies"])
+    print(f"target       http://{args.host}:{args.port} {' '.join(args.paths)}")
+    print(f"concurrency  {args.concurrency}  keepalive={args.keepalive}")
+    print(f"requests     {stats['requests']}  errors={stats['errors']}")
+    print(f"throughput   {stats['requests'] / elapsed:.1f} req/s")
+    print(f"latency ms   p50={percentile(latencies, 0.50) * 1000:.2f}  "
+          f"p95={percentile(latencies, 0.95) * 1000:.2f}  p99={percentile(latencies, 0.99) * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Concurrent writer stress test
+Runs many cage writer processes at once against the shared files and checks
+that no record was lost, torn or interleaved.
+
+    python scripts/stress_appends.py
+    python scripts/stress_appends.py --workers 16 --records 300
+
+Every worker process ingests atoms (atoms.jsonl and the trail.log ingest
+lines), appends logbook entries (trail.log) and adds rulebook corrections
+(a read-modify-write of rulebook.json), all in the same instant. Every
+--large-every-th record is several pages long and spans lines, so it cannot
+fit in one buffered write. The run happens in a throwaway copy of the cage
+(run.py and cagecore only). Afterwards every line of every file must parse,
+and each worker's records must all be there exactly once with their exact
+content. Exits 1 on any failure.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Size of the records written every --large-every records
+LARGE_RECORD_BYTES = 96 * 1024
+
+
+def payload(worker, seq, large_every):
+    """The text worker writes for its seq-th record; large ones span many lines"""
+    head = f"stress w{worker} n{seq}"
+    if large_every and seq % large_every == 0:
+        line = f"{head} " + "x" * 70 + "\n"
+        return line * (LARGE_RECORD_BYTES // len(line))
+    return head
+
+
+def work(args):
+    """One writer process, run inside the scratch cage"""
+    os.chdir(args.cage)
+    sys.path.insert(0, args.cage)
+    import run
+    from cagecore import logbook, rulebook
+
+    time.sleep(max(0.0, args.start_at - time.time()))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for seq in range(args.records):
+            text = payload(args.worker, seq, args.large_every)
+            run.cmd_ingest("stress", "user", text, topic=f"w{args.worker}")
+            logbook.append("stress", {"worker": args.worker, "seq": seq, "text": text})
+            if seq % args.correction_every == 0:
+                rulebook.add_correction(f"w{args.worker} n{seq}", "ok")
+
+
+def _read_lines(path, problems):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data and not data.endswith(b"\n"):
+        problems.append(f"{path.name}: last record is unterminated")
+    return data.decode("utf-8", errors="replace").splitlines()
+
+
+def verify(cage, args):
+    """A list of problems found in the files the workers wrote"""
+    problems = []
+    expected = {(worker, seq) for worker in range(args.workers) for seq in range(args.records)}
+
+    atoms, atom_ids = {}, set()
+    for number, line in enumerate(_read_lines(cage / "atoms.jsonl", problems), 1):
+        try:
+            atom = json.loads(line)
+            worker, seq = int(atom["topic"][1:]), int(atom["text"].split()[2][1:])
+        except (ValueError, KeyError, IndexError):
+            problems.append(f"atoms.jsonl:{number}: corrupt record")
+            continue
+        if (worker, seq) in atoms:
+            problems.append(f"atoms.jsonl:{number}: duplicate record w{worker} n{seq}")
+        if atom["text"] != payload(worker, seq, args.large_every):
+            problems.append(f"atoms.jsonl:{number}: content of w{worker} n{seq} damaged")
+        atoms[(worker, seq)] = atom["id"]
+        atom_ids.add(atom["id"])
+    if expected - atoms.keys():
+        problems.append(f"atoms.jsonl: {len(expected - atoms.keys())} records lost")
+
+    entries, ingest_ids = set(), set()
+    for number, line in enumerate(_read_lines(cage / "trail.log", problems), 1):
+        if line.startswith("ingest "):
+            ingest_ids.add(line.split()[1])
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            problems.append(f"trail.log:{number}: corrupt record")
+            continue
+        if entry.get("type") != "stress":
+            continue
+        data = entry["data"]
+        key = (data["worker"], data["seq"])
+        if key in entries:
+            problems.append(f"trail.log:{number}: duplicate entry w{key[0]} n{key[1]}")
+        if data["text"] != payload(*key, args.large_every):
+            problems.append(f"trail.log:{number}: content of w{key[0]} n{key[1]} damaged")
+        entries.add(key)
+    if expected - entries:
+        problems.append(f"trail.log: {len(expected - entries)} logbook entries lost")
+    if atom_ids - ingest_ids:
+        problems.append(f"trail.log: {len(atom_ids - ingest_ids)} ingest lines lost")
+
+    wanted = {f"w{worker} n{seq}" for worker, seq in expected if seq % args.correction_every == 0}
+    try:
+        with open(cage / "rulebook.json", encoding="utf-8") as f:
+            corrections = [c["from"] for c in json.load(f)["corrections"]]
+    except (ValueError, KeyError):
+        problems.append("rulebook.json: corrupt")
+        corrections = []
+    if wanted - set(corrections):
+        problems.append(f"rulebook.json: {len(wanted - set(corrections))} corrections lost")
+    if len(corrections) != len(set(corrections)):
+        problems.append("rulebook.json: duplicate corrections")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the cage's shared files with concurrent writers")
+    parser.add_argument("--workers", type=int, default=8, help="Writer processes")
+    parser.add_argument("--records", type=int, default=200, help="Atoms and logbook entries per worker")
+    parser.add_argument("--large-every", type=int, default=25, help="Every n-th record is large (0: never)")
+    parser.add_argument("--correction-every", type=int, default=10, help="Add a correction every n records")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch cage and print its path")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--cage", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        work(args)
+        return
+
+    cage = Path(tempfile.mkdtemp(prefix="cage-stress-"))
+    try:
+        shutil.copy2(ROOT / "run.py", cage)
+        shutil.copytree(ROOT / "cagecore", cage / "cagecore", ignore=shutil.ignore_patterns("__pycache__"))
+        (cage / "workspace").mkdir()
+        with open(cage / "rulebook.json", "w", encoding="utf-8") as f:
+            json.dump({"preferences": {}, "corrections": []}, f)
+
+        start_at = time.time() + 1.0  # lets every worker finish importing first
+        started = time.perf_counter()
+        procs = [subprocess.Popen([sys.executable, __file__, "--worker", str(worker), "--cage", str(cage),
+                                   "--start-at", str(start_at), "--records", str(args.records),
+                                   "--large-every", str(args.large_every),
+                                   "--correction-every", str(args.correction_every)])
+                 for worker in range(args.workers)]
+        failed = [proc.args[3] for proc in procs if proc.wait() != 0]
+        seconds = time.perf_counter() - started - 1.0
+
+        problems = [f"worker {worker} exited with an error" for worker in failed] + verify(cage, args)
+        records = args.workers * args.records
+        print(f"{args.workers} writers, {records} atoms + {records} logbook entries in {seconds:.2f}s")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        if len(problems) > 20:
+            print(f"  ... and {len(problems) - 20} more")
+        print("FAIL" if problems else "ok")
+        if args.keep:
+            print(cage)
+    finally:
+        if not args.keep:
+            shutil.rmtree(cage, ignore_errors=True)
+
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 
-import os, io, time, sys, json, hashlib, subprocess
+import os, io, time, sys, json, gzip, signal, sqlite3, hashlib, argparse, subprocess, threading, codecs, itertools, collections
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, jsonify, Response, request
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
 from datetime import datetime
 from pathlib import Path
+from cagecore import metrics, room
 
 APP = Flask(__name__)
+PERSISTED_METRICS = metrics.PersistedMetrics()
 SERVER_START_TIME = datetime.utcnow().isoformat() + "Z"
 LAST_RETRIEVE_RESULT = None
 
@@ -57,20 +61,126 @@ def get_last_commit():
         pass
     return 'none'
 
+# Git metadata does not change while the server runs; look it up once
+REPO_URL = get_repo_url()
+LAST_COMMIT = get_last_commit()
+
+# Files that only ever grow; their digests are extended rather than recomputed
+APPEND_ONLY_FILES = {"trail.log", "atoms.jsonl", "links.jsonl"}
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Bytes just before the hashed offset that must still match before a digest is extended
+APPEND_GUARD_BYTES = 4096
+
+# path -> {"key": (ino, size, mtime_ns), "sha256": hex, "state": hashlib object, "guard": bytes}
+_DIGESTS = {}
+_DIGESTS_LOCK = threading.Lock()
+
+def _hash_from(f, hasher, offset, size):
+    """Feed bytes offset..size of an open file into hasher in chunks; return the guard tail"""
+    f.seek(offset)
+    guard = b""
+    remaining = size - offset
+    while remaining > 0:
+        chunk = f.read(min(HASH_CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        guard = (guard + chunk)[-APPEND_GUARD_BYTES:]
+        remaining -= len(chunk)
+    return guard
+
+# Digests shared between server worker processes, in .cage/status_cache.sqlite
+_SHARED = threading.local()
+
+def shared_digests():
+    """This thread's connection to the shared digest table"""
+    conn = getattr(_SHARED, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(room.get_state_dir() / "status_cache.sqlite"), timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, ino INTEGER, "
+                     "size INTEGER, mtime_ns INTEGER, sha256 TEXT)")
+        _SHARED.conn = conn
+    return conn
+
+def shared_digest_get(filepath, key):
+    try:
+        row = shared_digests().execute(
+            "SELECT sha256 FROM digests WHERE path = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+            (filepath, *key)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+def shared_digest_put(filepath, key, digest):
+    try:
+        with shared_digests() as conn:
+            conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)", (filepath, *key, digest))
+    except sqlite3.Error:
+        pass
+
 def get_file_sha256(filepath):
-    """Get SHA256 hash of file"""
+    """Get SHA256 hash of file, cached on (path, inode, size, mtime_ns).
+
+    Append-only files that only grew since the cached digest are hashed from
+    the cached offset on, resuming the saved hash state. Digests computed by
+    any server worker are shared through a SQLite table.
+    """
     try:
         with open(filepath, 'rb') as f:
-            return hashlib.sha256(f.read()).hexdigest()
+            st = os.fstat(f.fileno())
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            with _DIGESTS_LOCK:
+                cached = _DIGESTS.get(filepath)
+            if cached and cached["key"] == key:
+                return cached["sha256"]
+            shared = shared_digest_get(filepath, key)
+            if shared:
+                with _DIGESTS_LOCK:
+                    _DIGESTS[filepath] = {"key": key, "sha256": shared, "state": None, "guard": b""}
+                return shared
+
+            hasher, offset, guard = hashlib.sha256(), 0, b""
+            if (cached and cached["state"] is not None and os.path.basename(filepath) in APPEND_ONLY_FILES
+                    and cached["key"][0] == st.st_ino and cached["key"][1] < st.st_size):
+                offset = cached["key"][1]
+                f.seek(offset - len(cached["guard"]))
+                if f.read(len(cached["guard"])) == cached["guard"]:
+                    hasher, guard = cached["state"].copy(), cached["guard"]
+                else:
+                    offset = 0
+
+            tail_guard = _hash_from(f, hasher, offset, st.st_size)
+            guard = (guard + tail_guard)[-APPEND_GUARD_BYTES:]
+            digest = hasher.hexdigest()
+            with _DIGESTS_LOCK:
+                _DIGESTS[filepath] = {"key": key, "sha256": digest, "state": hasher, "guard": guard}
+            shared_digest_put(filepath, key, digest)
+            return digest
     except:
         return 'error'
 
+TAIL_BLOCK_BYTES = 64 * 1024
+
 def tail(path, n=20):
+    """Last n lines of a file, read backwards from the end in blocks"""
     if not os.path.exists(path):
         return []
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        lines = f.readlines()
-    return [ln.rstrip("\n") for ln in lines[-n:]]
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").split("\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines[-n:] if n else []
 
 def mtime(path):
     return os.path.getmtime(path) if os.path.exists(path) else None
@@ -85,28 +195,34 @@ def get_strict_mode():
 def count_lines(filename):
     """Count lines in a file, return 0 if missing"""
     try:
-        with open(filename, "r", encoding="utf-8") as f:
-            return sum(1 for _ in f)
+        with open(filename, "rb") as f:
+            count, last = 0, b""
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                count += block.count(b"\n")
+                last = block
+            return count + (1 if last and not last.endswith(b"\n") else 0)
     except FileNotFoundError:
         return 0
 
 def get_last_atoms(n=5):
     """Get last n atoms with id, ts, text60"""
-    try:
-        atoms = []
-        with open("atoms.jsonl", "r", encoding="utf-8") as f:
-            for line in f:
-                if line.strip():
-                    atom = json.loads(line.strip())
-                    text60 = atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
-                    atoms.append({
-                        "id": atom["id"],
-                        "ts": atom["ts"],
-                        "text60": text60
-                    })
-        return atoms[-n:] if atoms else []
-    except FileNotFoundError:
-        return []
+    atoms = []
+    for line in reversed(tail("atoms.jsonl", n * 4)):
+        if not line.strip():
+            continue
+        try:
+            atom = json.loads(line.strip())
+        except json.JSONDecodeError:
+            continue
+        text60 = atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
+        atoms.append({
+            "id": atom["id"],
+            "ts": atom["ts"],
+            "text60": text60
+        })
+        if len(atoms) >= n:
+            break
+    return list(reversed(atoms))
 
 def get_last_retrieve_results():
     """Get the last retrieve results from trail log"""
@@ -141,10 +257,113 @@ def get_relevant_files():
 
     return files
 
-@APP.route("/files")
-def files_index():
-    """List whitelisted files with metadata"""
-    output = ["BEGIN-FILES"]
+# Status snapshot: each component is cached on the (size, mtime) of the files
+# it is computed from and recomputed only when one of them changes
+_SNAPSHOT = {}
+_SNAPSHOT_LOCK = threading.Lock()
+
+def file_key(path):
+    """(size, mtime_ns) of a path, None if it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+def cached_component(name, paths, compute):
+    """Value of a snapshot component, recomputed only if its source files changed"""
+    key = tuple((path, file_key(path)) for path in paths)
+    with _SNAPSHOT_LOCK:
+        entry = _SNAPSHOT.get(name)
+    if entry and entry[0] == key:
+        return entry[1]
+    value = compute()
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT[name] = (key, value)
+    return value
+
+def status_snapshot():
+    """All status components, refreshing only those whose source changed"""
+    trail_file = trail_path()
+    return {
+        "strict_mode": get_strict_mode(),
+        "trail_file": trail_file,
+        "trail_tail": cached_component("trail_tail", [trail_file], lambda: tail(trail_file, 10)),
+        "trail_mtime": mtime(trail_file),
+        "atoms_count": cached_component("atoms_count", ["atoms.jsonl"], lambda: count_lines("atoms.jsonl")),
+        "atoms_exists": os.path.exists("atoms.jsonl"),
+        "links_count": cached_component("links_count", ["links.jsonl"], lambda: count_lines("links.jsonl")),
+        "links_exists": os.path.exists("links.jsonl"),
+        "atoms_last5": cached_component("atoms_last5", ["atoms.jsonl"], lambda: get_last_atoms(5)),
+        "last_retrieve": cached_component("last_retrieve", [trail_file], get_last_retrieve_results),
+        "relevant_files": cached_component(
+            "relevant_files", ["atoms.jsonl", "links.jsonl", "trail.log", "artifacts"], get_relevant_files)
+    }
+
+def snapshot_version():
+    """Short digest of every status source's (size, mtime_ns); changes whenever the snapshot would"""
+    trail_file = trail_path()
+    sources = [trail_file, "trail.log", "atoms.jsonl", "links.jsonl", "artifacts"]
+    key = repr((get_strict_mode(), trail_file, [(path, file_key(path)) for path in sources]))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+# endpoint -> {"version", "body", "gzip"}: the last render, and its gzip once asked for
+_RENDERED = {}
+_RENDERED_LOCK = threading.Lock()
+
+def accepts_gzip():
+    """True if the request's Accept-Encoding allows gzip"""
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def etag_matches(*etags):
+    """True if If-None-Match names any of the given ETags"""
+    header = request.headers.get("If-None-Match", "")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(etag in tags or f"W/{etag}" in tags for etag in etags)
+
+def cached_response(name, version, render, mimetype):
+    """Serve an endpoint's body from a per-version cache, with ETag, 304 and gzip.
+
+    A matching If-None-Match is answered before anything is rendered. The body
+    is rendered once per version and its gzip compressed once per version.
+    """
+    etag = f'"{name}-{version}"'
+    etag_gz = f'"{name}-{version}-gz"'
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(etag, etag_gz):
+        headers["ETag"] = etag_gz if accepts_gzip() else etag
+        return Response(status=304, headers=headers)
+
+    with _RENDERED_LOCK:
+        entry = _RENDERED.get(name)
+    if entry is None or entry["version"] != version:
+        entry = {"version": version, "body": render().encode("utf-8"), "gzip": None}
+        with _RENDERED_LOCK:
+            _RENDERED[name] = entry
+
+    body = entry["body"]
+    if accepts_gzip() and len(body) >= GZIP_MIN_BYTES:
+        if entry["gzip"] is None:
+            entry["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+        headers["ETag"] = etag_gz
+        headers["Content-Encoding"] = "gzip"
+        body = entry["gzip"]
+    else:
+        headers["ETag"] = etag
+    return Response(body, headers=headers, mimetype=mimetype)
+
+def list_whitelisted_files():
+    """(rel_path, stat) for every whitelisted file under the current directory"""
+    found = []
     
     # Get all files in current directory and subdirectories
     for root, dirs, files in os.walk("."):
@@ -157,20 +376,124 @@ def files_index():
             
             if is_whitelisted(rel_path):
                 try:
-                    size = os.path.getsize(rel_path)
-                    sha256_full = get_file_sha256(rel_path)
-                    sha256_8 = sha256_full[:8] if sha256_full != 'error' else 'error'
-                    url = f"/file?path={rel_path}"
-                    output.append(f"{rel_path}  {size}  {sha256_8}  {url}")
-                except:
-                    output.append(f"{rel_path}  error  error  /file?path={rel_path}")
-    
+                    found.append((rel_path, os.stat(rel_path)))
+                except OSError:
+                    found.append((rel_path, None))
+    return found
+
+def render_files_index(found):
+    output = ["BEGIN-FILES"]
+    for rel_path, st in found:
+        if st is None:
+            output.append(f"{rel_path}  error  error  /file?path={rel_path}")
+            continue
+        sha256_full = get_file_sha256(rel_path)
+        sha256_8 = sha256_full[:8] if sha256_full != 'error' else 'error'
+        url = f"/file?path={rel_path}"
+        output.append(f"{rel_path}  {st.st_size}  {sha256_8}  {url}")
     output.append("END-FILES")
-    return Response("\n".join(output), mimetype="text/plain")
+    return "\n".join(output)
+
+@APP.before_request
+def _start_timer():
+    request.environ["cage.started"] = time.perf_counter()
+
+@APP.after_request
+def _record_request(response):
+    started = request.environ.get("cage.started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("cage_http_request_seconds", time.perf_counter() - started, route=route)
+        metrics.inc("cage_http_requests_total", route=route, status=str(response.status_code))
+    return response
+
+@APP.route("/files")
+def files_index():
+    """List whitelisted files with metadata"""
+    found = list_whitelisted_files()
+    key = repr([(rel_path, st and (st.st_ino, st.st_size, st.st_mtime_ns)) for rel_path, st in found])
+    version = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return cached_response("files", version, lambda: render_files_index(found), "text/plain")
+
+# /file responses are streamed in chunks of this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Without Range or paging, /file shows at most this many bytes
+FILE_VIEW_MAX_BYTES = 100 * 1024
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None if absent/ignored, or 'invalid'"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            length = int(last)
+            if length == 0:
+                return "invalid"
+            start, end = max(0, size - length), size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+def iter_file_bytes(path, start, end):
+    """Yield bytes start..end (inclusive) of a file in bounded chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def iter_decoded(chunks):
+    """Decode a byte stream as UTF-8 without splitting characters across chunks"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+def iter_file_lines(path, offset, limit):
+    """Yield lines offset..offset+limit of a file without holding more than one line"""
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        for number, line in enumerate(f):
+            if number >= offset + limit:
+                break
+            if number >= offset:
+                yield line
+
+def iter_file_view(path, size, sha256_full, body, note=None):
+    """Wrap a content iterator in the BEGIN-FILE envelope"""
+    header = [
+        "BEGIN-FILE",
+        f"path={path}",
+        f"size={size}  sha256={sha256_full}",
+    ]
+    if note:
+        header.append(note)
+    header.append("----8<---- CONTENT START")
+    yield "\n".join(header) + "\n"
+    yield from body
+    yield "\n----8<---- CONTENT END\nEND-FILE"
 
 @APP.route("/file")
 def file_view():
-    """View individual file content"""
+    """View individual file content.
+
+    Streams the file in chunks. With raw=1 the file's bytes are served as
+    they are, and a Range header (honouring If-Range) returns part of them
+    (206); their ETag is the cached sha256. Otherwise the content is shown in
+    the BEGIN-FILE envelope: offset/limit query arguments page by lines, and
+    by default the first 100KB is shown. Each envelope view is a different
+    representation, so it gets its own ETag and ignores Range.
+    """
     path = request.args.get('path', '')
     
     if not path or not is_whitelisted(path):
@@ -182,76 +505,383 @@ def file_view():
     try:
         size = os.path.getsize(path)
         sha256_full = get_file_sha256(path)
-        
-        # Read file content
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        
-        # Truncate if over 100KB
-        max_size = 100 * 1024  # 100KB
-        truncated = False
-        if len(content.encode('utf-8')) > max_size:
-            # Truncate to approximately 100KB
-            content = content[:max_size] 
-            content += "\n[TRUNCATED]"
-            truncated = True
-        
-        output = [
-            "BEGIN-FILE",
-            f"path={path}",
-            f"size={size}  sha256={sha256_full}",
-            "----8<---- CONTENT START",
-            content,
-            "----8<---- CONTENT END",
-            "END-FILE"
-        ]
-        
-        return Response("\n".join(output), mimetype="text/plain")
+
+        if request.args.get("raw") == "1":
+            headers = {"ETag": f'"{sha256_full}"', "Accept-Ranges": "bytes"}
+            if etag_matches(headers["ETag"]):
+                return Response(status=304, headers=headers)
+            if_range = request.headers.get("If-Range")
+            byte_range = None
+            if not if_range or if_range == headers["ETag"]:
+                byte_range = parse_range(request.headers.get("Range"), size)
+            if byte_range == "invalid":
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response("Range not satisfiable", status=416, headers=headers, mimetype="text/plain")
+            start, end = byte_range or (0, size - 1)
+            headers["Content-Length"] = str(end - start + 1)
+            if byte_range:
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(iter_file_bytes(path, start, end), status=206 if byte_range else 200,
+                            headers=headers, mimetype="application/octet-stream", direct_passthrough=True)
+
+        if "offset" in request.args or "limit" in request.args:
+            try:
+                offset = max(0, int(request.args.get("offset", 0)))
+                limit = max(0, int(request.args.get("limit", 1000)))
+            except ValueError:
+                return Response("offset and limit must be integers", status=400, mimetype="text/plain")
+            headers = {"ETag": f'"{sha256_full}-lines-{offset}-{limit}"', "Accept-Ranges": "none"}
+            if etag_matches(headers["ETag"]):
+                return Response(status=304, headers=headers)
+            body = iter_file_lines(path, offset, limit)
+            note = f"lines={offset}..{offset + limit}"
+            return Response(iter_file_view(path, size, sha256_full, body, note), headers=headers,
+                            mimetype="text/plain")
+
+        # Default view: the first 100KB, truncated on a UTF-8 boundary
+        headers = {"ETag": f'"{sha256_full}-view"', "Accept-Ranges": "none"}
+        if etag_matches(headers["ETag"]):
+            return Response(status=304, headers=headers)
+        body = iter_decoded(iter_file_bytes(path, 0, min(size, FILE_VIEW_MAX_BYTES) - 1))
+        if size > FILE_VIEW_MAX_BYTES:
+            body = itertools.chain(body, ["\n[TRUNCATED]"])
+        return Response(iter_file_view(path, size, sha256_full, body), headers=headers, mimetype="text/plain")
         
     except Exception as e:
         return Response(f"Error reading file: {str(e)}", status=500, mimetype="text/plain")
 
+# Trail follower: one background reader of trail.log shared by every /trail/stream client
+TRAIL_POLL_SECONDS = 0.25
+TRAIL_KEEPALIVE_SECONDS = 15
+TRAIL_BUFFER_LINES = 1000
+# Longest trail line sent as is; longer ones (a huge diff entry) are sent as an
+# "oversized" placeholder giving their offset and size, to fetch from
+# /file?path=trail.log&raw=1 with a Range
+TRAIL_LINE_MAX_BYTES = STREAM_CHUNK_BYTES * 16
+# A stream ends after this long; the client reconnects with Last-Event-ID
+TRAIL_STREAM_MAX_SECONDS = 300
+# Each open stream holds a server thread. serve() lowers this below its pool
+# size so streams cannot take every thread; past it, /trail/stream is a 503
+TRAIL_STREAM_SLOTS = threading.BoundedSemaphore(64)
+
+class TrailFollower:
+    """Follows trail.log and keeps its most recent complete lines in memory.
+
+    Lines are (start, end, text) with byte offsets into the file. Clients
+    that ask for older offsets than the buffer holds catch up from disk.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.lines = collections.deque(maxlen=TRAIL_BUFFER_LINES)
+        self.offset = None
+        self.ino = None
+        self._thread = None
+
+    def start(self):
+        with self.cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trail-follower", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except OSError:
+                pass
+            time.sleep(TRAIL_POLL_SECONDS)
+
+    def _line_start(self, f, size):
+        """Offset just after the last newline in the file (where the next line starts)"""
+        pos = size
+        while pos > 0:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            f.seek(pos - step)
+            cut = f.read(step).rfind(b"\n")
+            if cut >= 0:
+                return pos - step + cut + 1
+            pos -= step
+        return 0
+
+    def _line_end(self, f, pos, size):
+        """Offset just after the first newline at or after pos, or None if the line is unterminated"""
+        while pos < size:
+            f.seek(pos)
+            chunk = f.read(min(STREAM_CHUNK_BYTES, size - pos))
+            if not chunk:
+                break
+            cut = chunk.find(b"\n")
+            if cut >= 0:
+                return pos + cut + 1
+            pos += len(chunk)
+        return None
+
+    def poll(self):
+        """Read newly appended complete lines into the buffer and wake clients"""
+        path = trail_path()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        with open(path, "rb") as f:
+            if self.offset is None or st.st_ino != self.ino or st.st_size < self.offset:
+                # First poll, or the trail was replaced or truncated: start at its end
+                with self.cond:
+                    self.lines.clear()
+                    self.ino = st.st_ino
+                    self.offset = self._line_start(f, st.st_size)
+                    self.cond.notify_all()
+            while st.st_size > self.offset:
+                f.seek(self.offset)
+                data = f.read(min(TRAIL_LINE_MAX_BYTES + 1, st.st_size - self.offset))
+                cut = data.rfind(b"\n") + 1
+                if cut == 0:
+                    if len(data) <= TRAIL_LINE_MAX_BYTES:
+                        return  # the last line is still being written
+                    end = self._line_end(f, self.offset + len(data), st.st_size)
+                    if end is None:
+                        return
+                    new, cut = [trail_line(self.offset, end, b"")], end - self.offset
+                else:
+                    new, pos = [], self.offset
+                    for raw in data[:cut].split(b"\n")[:-1]:
+                        new.append(trail_line(pos, pos + len(raw) + 1, raw))
+                        pos += len(raw) + 1
+                with self.cond:
+                    self.lines.extend(new)
+                    self.offset += cut
+                    self.cond.notify_all()
+
+    def wait_since(self, offset, timeout):
+        """Buffered lines starting at or after offset, waiting up to timeout for some.
+
+        Returns None when offset is outside the buffer: older than it (read it
+        from disk) or past the end of the trail (it was replaced).
+        """
+        with self.cond:
+            if self.offset is None:
+                self.cond.wait(timeout)
+                return []
+            if offset > self.offset or offset < self.offset and (not self.lines or offset < self.lines[0][0]):
+                return None
+            if offset == self.offset:
+                self.cond.wait(timeout)
+            return [line for line in self.lines if line[0] >= offset]
+
+TRAIL_FOLLOWER = TrailFollower()
+
+def trail_line(start, end, raw):
+    """(start, end, text) for the trail line at start..end; text is a placeholder if it is oversized"""
+    if end - start - 1 > TRAIL_LINE_MAX_BYTES:
+        return start, end, json.dumps({"type": "oversized", "offset": start, "bytes": end - start - 1})
+    return start, end, raw.decode("utf-8", errors="ignore")
+
+def iter_trail_from_disk(path, offset, stop):
+    """Yield (start, end, text) for complete lines between offset and stop, chunk by chunk"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        pending = b""
+        dropped = 0  # bytes of an oversized line already read past
+        pos = offset
+        while pos < stop:
+            chunk = f.read(min(STREAM_CHUNK_BYTES, stop - pos))
+            if not chunk:
+                break
+            pos += len(chunk)
+            pending += chunk
+            *complete, pending = pending.split(b"\n")
+            for raw in complete:
+                end = offset + dropped + len(raw) + 1
+                yield trail_line(offset, end, raw)
+                offset, dropped = end, 0
+            if len(pending) > TRAIL_LINE_MAX_BYTES:
+                dropped += len(pending)
+                pending = b""
+
+def sse_event(end, text):
+    return f"id: {end}\ndata: {text}\n\n"
+
+@APP.route("/trail/stream")
+def trail_stream():
+    """Server-Sent Events: trail.log lines appended after a byte offset.
+
+    The offset comes from Last-Event-ID (each event id is the byte offset
+    just past its line), else ?offset=, else the current end of the trail.
+    A stream lasts at most TRAIL_STREAM_MAX_SECONDS; with every stream slot
+    taken the answer is 503 with Retry-After.
+    """
+    TRAIL_FOLLOWER.start()
+    if TRAIL_FOLLOWER.offset is None:
+        TRAIL_FOLLOWER.poll()
+
+    start = request.headers.get("Last-Event-ID") or request.args.get("offset")
+    try:
+        offset = int(start) if start is not None else None
+    except ValueError:
+        return Response("offset must be an integer", status=400, mimetype="text/plain")
+    slots = TRAIL_STREAM_SLOTS
+    if not slots.acquire(blocking=False):
+        return Response("too many trail streams, retry later", status=503, mimetype="text/plain",
+                        headers={"Retry-After": "5"})
+
+    def generate(offset):
+        if offset is None:
+            offset = TRAIL_FOLLOWER.offset or 0
+        yield "retry: 2000\n\n"
+        last_sent = time.monotonic()
+        deadline = last_sent + TRAIL_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            wait = min(TRAIL_KEEPALIVE_SECONDS, deadline - time.monotonic())
+            lines = TRAIL_FOLLOWER.wait_since(offset, max(0.0, wait))
+            if lines is None:
+                stop = TRAIL_FOLLOWER.offset or 0
+                if offset > stop:
+                    offset = 0  # the trail was replaced under this client
+                lines = iter_trail_from_disk(trail_path(), offset, stop)
+            sent = False
+            for line_start, line_end, text in lines:
+                yield sse_event(line_end, text)
+                offset = line_end
+                sent = True
+            if sent:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= TRAIL_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(generate(offset), headers=headers, mimetype="text/event-stream")
+    response.call_on_close(slots.release)
+    return response
+
+# Resident atom index for /retrieve, kept current by a background follower
+ATOM_INDEX = None
+_ATOM_INDEX_LOCK = threading.Lock()
+
+def get_atom_index():
+    """The shared AtomIndex, loaded and set following on first use"""
+    global ATOM_INDEX
+    with _ATOM_INDEX_LOCK:
+        if ATOM_INDEX is None:
+            from cagecore import retrieval
+            index = retrieval.AtomIndex()
+            index.refresh()
+            index.follow()
+            ATOM_INDEX = index
+    return ATOM_INDEX
+
+@APP.route("/retrieve")
+def retrieve():
+    """Top-k atoms by similarity to q, from the resident index"""
+    global LAST_RETRIEVE_RESULT
+    query = request.args.get("q", "")
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        k = int(request.args.get("k", 5))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+
+    index = get_atom_index()
+    started = time.perf_counter()
+    results = index.search(query, k)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    data = {
+        "query": query,
+        "k": k,
+        "atoms_indexed": len(index),
+        "elapsed_ms": round(elapsed_ms, 3),
+        "results": [{
+            "id": atom["id"],
+            "score": round(atom["score"], 6),
+            "ts": atom["ts"],
+            "text60": atom["text"][:60] + "..." if len(atom["text"]) > 60 else atom["text"]
+        } for atom in results]
+    }
+    LAST_RETRIEVE_RESULT = data
+    return jsonify(data)
+
+# Set by serve() when it forks workers. Each worker then flushes its samples to
+# .cage/metrics.jsonl every METRICS_FLUSH_SECONDS and before rendering /metrics,
+# so whichever worker is scraped reports the samples of all of them
+SHARED_METRICS = False
+METRICS_FLUSH_SECONDS = 5
+
+def flush_metrics_forever():
+    """Background loop of a forked worker: hand its samples to the other workers"""
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            metrics.flush()
+        except OSError:
+            pass
+
+@APP.route("/metrics")
+def metrics_view():
+    """Prometheus text exposition of this server's metrics plus those flushed by CLI runs"""
+    if ATOM_INDEX is not None:
+        metrics.set_gauge("cage_atoms_indexed", len(ATOM_INDEX))
+    with _DIGESTS_LOCK:
+        metrics.set_gauge("cage_digest_cache_entries", len(_DIGESTS))
+    if SHARED_METRICS:
+        metrics.flush()
+    PERSISTED_METRICS.refresh()
+    body = metrics.render(metrics.REGISTRY, PERSISTED_METRICS.registry)
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
 @APP.route("/status.json")
 def status_json():
+    """Status as JSON. The body is cached per snapshot version, so it carries no
+    per-request clock; the response's Date header gives the server time."""
+    return cached_response("status.json", snapshot_version(), render_status_json, "application/json")
+
+def render_status_json():
+    snapshot = status_snapshot()
     data = {
-        "strict_mode": get_strict_mode(),
-        "trail_file": trail_path(),
-        "trail_tail": tail(trail_path(), 10),
-        "trail_mtime": mtime(trail_path()),
-        "atoms_count": count_lines("atoms.jsonl"),
-        "atoms_exists": os.path.exists("atoms.jsonl"),
-        "links_count": count_lines("links.jsonl"),
-        "links_exists": os.path.exists("links.jsonl"),
-        "atoms_last5": get_last_atoms(5),
-        "last_retrieve": get_last_retrieve_results(),
-        "server_time": time.time(),
+        "strict_mode": snapshot["strict_mode"],
+        "trail_file": snapshot["trail_file"],
+        "trail_tail": snapshot["trail_tail"],
+        "trail_mtime": snapshot["trail_mtime"],
+        "atoms_count": snapshot["atoms_count"],
+        "atoms_exists": snapshot["atoms_exists"],
+        "links_count": snapshot["links_count"],
+        "links_exists": snapshot["links_exists"],
+        "atoms_last5": snapshot["atoms_last5"],
+        "last_retrieve": snapshot["last_retrieve"],
         "server_start_time": SERVER_START_TIME,
         "current_working_directory": os.getcwd(),
-        "relevant_files": get_relevant_files()
+        "relevant_files": snapshot["relevant_files"]
     }
-    return jsonify(data)
+    return APP.json.dumps(data) + "\n"
 
 @APP.route("/")
 def index():
     """Plain text status page optimized for machine reading"""
+    return cached_response("index", snapshot_version(), render_index, "text/plain")
+
+def render_index():
+    """Render the plain text status page from the snapshot"""
 
     # Get data
-    strict_mode = get_strict_mode()
-    trail_file_path = trail_path()
-    trail_lines = tail(trail_file_path, 10)
-    atoms_last5 = get_last_atoms(5)
-    retrieve_results = get_last_retrieve_results()
-    relevant_files = get_relevant_files()
+    snapshot = status_snapshot()
+    strict_mode = snapshot["strict_mode"]
+    trail_file_path = snapshot["trail_file"]
+    trail_lines = snapshot["trail_tail"]
+    atoms_last5 = snapshot["atoms_last5"]
+    retrieve_results = snapshot["last_retrieve"]
+    relevant_files = snapshot["relevant_files"]
 
     # Build plain text response
     output = []
 
     # Audit links section
     output.append("BEGIN-AUDIT-LINKS")
-    output.append(f"REPO-URL: {get_repo_url()}")
+    output.append(f"REPO-URL: {REPO_URL}")
     output.append("FILES-INDEX: /files")
     output.append("FILE-VIEW-EXAMPLE: /file?path=run.py")
-    output.append(f"LAST-COMMIT: {get_last_commit()}")
+    output.append(f"LAST-COMMIT: {LAST_COMMIT}")
     output.append("END-AUDIT-LINKS")
     output.append("")
 
@@ -275,8 +905,8 @@ def index():
 
     # Counts section
     output.append("BEGIN-COUNTS")
-    output.append(f"atoms_count={count_lines('atoms.jsonl')}")
-    output.append(f"links_count={count_lines('links.jsonl')}")
+    output.append(f"atoms_count={snapshot['atoms_count']}")
+    output.append(f"links_count={snapshot['links_count']}")
     output.append(f"trail_file={trail_file_path}")
     output.append("END-COUNTS")
     output.append("")
@@ -317,7 +947,174 @@ def index():
         output.append(file_item)
     output.append("END-FILES")
 
-    return Response("\n".join(output), mimetype="text/plain")
+    return "\n".join(output)
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 keep-alive handler that does not let idle connections keep their thread.
+
+    A connection waiting for its next request (or its first) is closed after
+    `idle_timeout` seconds; once a request starts arriving, reading it and
+    writing the response may stall for up to `timeout` seconds.
+    """
+
+    protocol_version = "HTTP/1.1"
+    idle_timeout = 5
+
+    def handle_one_request(self):
+        self.connection.settimeout(self.idle_timeout)
+        try:
+            waiting = self.rfile.peek(1)
+        except (TimeoutError, ConnectionError):
+            waiting = b""
+        if not waiting:
+            self.close_connection = True
+            return
+        self.connection.settimeout(self.timeout)
+        super().handle_one_request()
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles connections on a fixed thread pool.
+
+    Connections are HTTP/1.1 keep-alive. Each one holds a pool thread while it
+    is open, so one idle for `idle_timeout` seconds is closed, as is one
+    stalled mid-request for `timeout` seconds.
+    """
+
+    def __init__(self, host, port, app, threads, timeout, access_log=False, idle_timeout=5):
+        handler = type("PooledRequestHandler", (KeepAliveRequestHandler,), {
+            "timeout": timeout,
+            "idle_timeout": idle_timeout,
+        })
+        if not access_log:
+            handler.log_request = lambda self, code="-", size="-": None
+        super().__init__(host, port, app, handler=handler)
+        # Workers share this socket: all of them wake on a new connection, and
+        # the ones that lose the accept() race must return to select() rather
+        # than block there (where shutdown() could never reach them)
+        self.socket.setblocking(False)
+        self.threads = threads
+        self.pool = None
+
+    def serve_forever(self, poll_interval=0.5):
+        self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="status-worker")
+        super().serve_forever(poll_interval)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self, grace):
+        """Stop accepting and wait up to grace seconds for requests in flight"""
+        if self.pool is None:
+            return
+        waiter = threading.Thread(target=self.pool.shutdown, kwargs={"wait": True}, daemon=True)
+        waiter.start()
+        waiter.join(grace)
+
+def _run_worker(server, grace):
+    """Serve until SIGTERM/SIGINT, then drain in-flight requests"""
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    server.drain(grace)
+
+def serve(host="0.0.0.0", port=8080, workers=1, threads=8, timeout=30, grace=10, access_log=False,
+          streams=None, idle_timeout=5):
+    """Production serving: pre-forked worker processes, each with a thread pool.
+
+    The listening socket is bound once and inherited by every worker. The
+    master restarts workers that die and, on SIGTERM/SIGINT, tells them to
+    stop accepting and finish what they are serving within `grace` seconds.
+    Each worker serves at most `streams` /trail/stream clients at once
+    (default: half its threads, and always fewer than them), so some threads
+    stay free for other requests. Forked workers share their metrics through
+    .cage/metrics.jsonl (see SHARED_METRICS).
+    """
+    global TRAIL_STREAM_SLOTS, SHARED_METRICS
+    if streams is None:
+        streams = threads // 2
+    TRAIL_STREAM_SLOTS = threading.BoundedSemaphore(max(0, min(streams, threads - 1)))
+    server = PooledWSGIServer(host, port, APP, threads, timeout, access_log, idle_timeout)
+    print(f"Serving on http://{host}:{server.server_port} with {workers} worker(s) x {threads} thread(s)",
+          flush=True)
+    if workers <= 1:
+        _run_worker(server, grace)
+        server.server_close()
+        return
+
+    children = set()
+    stopping = False
+    SHARED_METRICS = True
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                threading.Thread(target=flush_metrics_forever, name="metrics-flush", daemon=True).start()
+                _run_worker(server, grace)
+                metrics.flush()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, _status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            spawn()
+    server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Cage status server")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Production mode: worker processes with thread pools")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8080)))
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    serve_parser.add_argument("--threads", type=int, default=8, help="Threads per worker")
+    serve_parser.add_argument("--timeout", type=float, default=30, help="Stalled request timeout (seconds)")
+    serve_parser.add_argument("--idle-timeout", type=float, default=5,
+                              help="Close keep-alive connections idle this long (seconds)")
+    serve_parser.add_argument("--grace", type=float, default=10, help="Shutdown grace period (seconds)")
+    serve_parser.add_argument("--access-log", action="store_true", help="Log every request to stderr")
+    serve_parser.add_argument("--streams", type=int, help="Concurrent /trail/stream clients per worker "
+                                                          "(default: half the threads)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers, args.threads, args.timeout, args.grace, args.access_log,
+              args.streams, args.idle_timeout)
+    else:
+        # Development server, as before
+        APP.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
 
 if __name__ == "__main__":
-    APP.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
+    main()
@@ -0,0 +1,61 @@
+"""
+Shared fixtures: every test gets a throwaway copy of the cage (run.py and
+cagecore only), so the real workspace, trail and queue are never touched.
+"""
+
+import os
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Cage:
+    def __init__(self, path):
+        self.path = path
+        self.workspace = path / "workspace"
+
+    def run(self, *argv, check=True, daemon=False):
+        """Run `python run.py argv...` in the cage; returns the CompletedProcess.
+
+        Commands run in their own process unless daemon is true, when they go
+        through a running cage daemon as they would from a shell.
+        """
+        env = dict(os.environ)
+        if daemon:
+            env.pop("CAGE_NO_DAEMON", None)
+        else:
+            env["CAGE_NO_DAEMON"] = "1"
+        proc = subprocess.run([sys.executable, "run.py", *argv], cwd=self.path, env=env,
+                              capture_output=True, text=True)
+        if check and proc.returncode != 0:
+            raise AssertionError(f"run.py {' '.join(argv)} exited {proc.returncode}:\n{proc.stdout}{proc.stderr}")
+        return proc
+
+    def python(self, code):
+        """Run code with the cage's cagecore importable; returns its stdout"""
+        proc = subprocess.run([sys.executable, "-c", code], cwd=self.path, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise AssertionError(proc.stderr)
+        return proc.stdout
+
+
+@pytest.fixture
+def cage(tmp_path):
+    shutil.copy2(ROOT / "run.py", tmp_path)
+    shutil.copytree(ROOT / "cagecore", tmp_path / "cagecore", ignore=shutil.ignore_patterns("__pycache__"))
+    (tmp_path / "workspace").mkdir()
+    return Cage(tmp_path)
+
+
+@pytest.fixture
+def status_client(tmp_path, monkeypatch):
+    """A test client for status_server serving from an empty directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(ROOT))
+    import status_server
+    return status_server.APP.test_client()
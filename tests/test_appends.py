@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_concurrent_writers_neither_tear_nor_lose_records():
+    proc = subprocess.run([sys.executable, str(ROOT / "scripts" / "stress_appends.py"), "--workers", "4",
+                           "--records", "40", "--large-every", "10", "--correction-every", "5"],
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    assert proc.stdout.splitlines()[-1] == "ok"
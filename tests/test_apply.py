@@ -0,0 +1,89 @@
+import json
+
+
+def test_apply_keeps_crlf_line_endings(cage):
+    (cage.workspace / "crlf.txt").write_bytes(b"alpha\r\nbeta\r\n")
+    cage.run("plan", "t", "--file", "crlf.txt", "--replace", "beta", "--with", "gamma")
+
+    out = cage.run("apply").stdout
+
+    assert "Applied safely." in out
+    assert (cage.workspace / "crlf.txt").read_bytes() == b"alpha\r\ngamma\r\n"
+
+
+def test_failed_plan_is_taken_off_the_queue(cage):
+    (cage.workspace / "a.txt").write_text("alpha")
+    cage.run("plan", "empty it", "--file", "a.txt", "--replace", "alpha", "--with", "")
+
+    first = cage.run("apply", "--all").stdout
+    second = cage.run("apply", "--all", check=False).stdout
+
+    assert "Apply failed for: a.txt" in first
+    assert (cage.workspace / "a.txt").read_text() == "alpha"
+    assert "Not allowed" in second
+    assert '"op": "failed"' in (cage.path / ".cage" / "plans.jsonl").read_text()
+
+
+def test_discard_drops_queued_plans(cage):
+    (cage.workspace / "a.txt").write_text("alpha\n")
+    cage.run("plan", "keep", "--file", "a.txt", "--replace", "alpha", "--with", "beta")
+    cage.run("plan", "drop", "--file", "a.txt", "--replace", "beta", "--with", "gamma")
+    plan_id = cage.python("from cagecore import planner; print(planner.get_latest_plan()['id'])").strip()
+
+    out = cage.run("discard", "--id", plan_id[:8]).stdout
+    cage.run("apply", "--all")
+
+    assert "'drop'" in out
+    assert (cage.workspace / "a.txt").read_text() == "beta\n"
+
+
+def test_plan_queue_is_compacted(cage):
+    out = cage.python(
+        "from cagecore import planner\n"
+        "planner.COMPACT_SLACK_RECORDS = 5\n"
+        "for n in range(10):\n"
+        "    planner.mark_done([planner.create_plan(f'p{n}', 'a.txt', 'x', 'y')])\n"
+        "kept = planner.create_plan('kept', 'a.txt', 'x', 'y')\n"
+        "print([plan['title'] for plan in planner.get_pending_plans()])\n"
+    )
+    lines = (cage.path / ".cage" / "plans.jsonl").read_text().splitlines()
+
+    assert out.strip() == "['kept']"
+    assert len(lines) == 1
+
+
+def test_parallel_apply_all_batches_each_file(cage):
+    names = [f"f{n}.txt" for n in range(6)]
+    for name in names:
+        (cage.workspace / name).write_text("alpha beta\n")
+        cage.run("plan", "a", "--file", name, "--replace", "alpha", "--with", "one")
+        cage.run("plan", "b", "--file", name, "--replace", "beta", "--with", "two")
+
+    out = cage.run("apply", "--all", "--workers", "4").stdout
+
+    assert "Applied safely." in out
+    assert all((cage.workspace / name).read_text() == "one two\n" for name in names)
+    diffs = [json.loads(line)["data"] for line in (cage.path / "trail.log").read_text().splitlines()
+             if line.startswith("{") and json.loads(line)["type"] == "diff"]
+    assert sorted(entry["file"] for entry in diffs) == names
+    assert all(len(entry["plan_ids"]) == 2 for entry in diffs)
+
+
+def test_diff_tokens_cover_one_path_for_one_operation(cage):
+    for name in ("a.txt", "b.txt"):
+        (cage.workspace / name).write_text("x\n")
+    out = cage.python(
+        "from cagecore import referee, workbench\n"
+        "def attempt(name, token):\n"
+        "    try:\n"
+        "        workbench.write_lines_guarded(name, ['y\\n'], token=token)\n"
+        "        return 'written'\n"
+        "    except referee.RuleViolationError:\n"
+        "        return 'refused'\n"
+        "with referee.authorize_diff(workbench.get_workspace_path('a.txt')) as token:\n"
+        "    print(attempt('b.txt', token), attempt('a.txt', token))\n"
+        "print(attempt('a.txt', token))\n"
+    )
+
+    assert out.split() == ["refused", "written", "refused"]
+    assert (cage.workspace / "b.txt").read_text() == "x\n"
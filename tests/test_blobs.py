@@ -0,0 +1,51 @@
+import json
+import hashlib
+
+
+def _blobs(cage):
+    return [path for path in (cage.path / ".cage" / "blobs").rglob("*") if path.is_file()]
+
+
+def test_editing_a_workspace_file_in_place_leaves_the_store_intact(cage):
+    sample = cage.workspace / "sample.txt"
+    sample.write_text("Hello world\n")
+    cage.run("plan", "t", "--file", "sample.txt", "--replace", "Hello", "--with", "Hey")
+    cage.run("apply")
+
+    with open(sample, "a") as f:
+        f.write("TAMPERED\n")
+
+    blobs = _blobs(cage)
+    assert len(blobs) == 2
+    for path in blobs:
+        assert hashlib.sha256(path.read_bytes()).hexdigest() == path.parent.name + path.name
+        assert path.stat().st_mode & 0o222 == 0
+
+
+def test_revert_copies_the_stored_version(cage):
+    sample = cage.workspace / "sample.txt"
+    sample.write_text("Hello world\n")
+    cage.run("plan", "t", "--file", "sample.txt", "--replace", "Hello", "--with", "Hey")
+    cage.run("apply")
+    entry = next(json.loads(line) for line in (cage.path / "trail.log").read_text().splitlines()
+                 if '"apply_result"' in line)
+
+    cage.run("revert", "--to", entry["hash"], "--before")
+
+    assert sample.read_text() == "Hello world\n"
+    assert sample.stat().st_nlink == 1
+
+
+def test_published_artifact_is_independent_of_the_workspace(cage):
+    sample = cage.workspace / "sample.txt"
+    sample.write_text("Hello world\n")
+    cage.run("plan", "t", "--file", "sample.txt", "--replace", "Hello", "--with", "Hey")
+    cage.run("apply")
+    cage.run("publish", "--file", "sample.txt")
+
+    with open(sample, "a") as f:
+        f.write("TAMPERED\n")
+
+    artifact = cage.path / "artifacts" / "sample.txt"
+    assert artifact.read_text() == "Hey world\n"
+    assert artifact.stat().st_nlink == 1
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def modules(monkeypatch):
+    monkeypatch.syspath_prepend(str(ROOT))
+    from cagecore import diffs, diffalgo
+    return diffs, diffalgo
+
+
+def edited(lines, seed):
+    """lines with a repeatable mix of deletions, insertions and changes"""
+    rng = random.Random(seed)
+    out = []
+    for line in lines:
+        roll = rng.random()
+        if roll < 0.05:
+            continue
+        if roll < 0.10:
+            out.append(f"inserted {rng.random()}\n")
+        out.append(line.replace("x", "y") if roll > 0.95 else line)
+    return out
+
+
+CASES = {
+    "empty to text": ([], ["a\n", "b\n"]),
+    "text to empty": (["a\n", "b\n"], []),
+    "repeated lines": (["}\n", "\n"] * 50, ["}\n", "\n", "{\n"] * 40),
+    "random edits": ([f"line {n} x\n" for n in range(3000)], edited([f"line {n} x\n" for n in range(3000)], 1)),
+    "no final newline": (["a\n", "b"], ["a\n", "c"]),
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("backend", ["difflib", "myers", "patience"])
+def test_backend_round_trips(modules, backend, case):
+    diffs, diffalgo = modules
+    assert backend in diffalgo.backend_names()
+    before, after = ("".join(lines) for lines in CASES[case])
+
+    patch = diffs.create_diff(before, after, "f.txt", backend=backend)["diff"]
+
+    assert diffs.apply_patch(before, patch) == after
+    assert diffs.apply_patch(after, patch, reverse=True) == before
@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def diffs(monkeypatch):
+    monkeypatch.syspath_prepend(str(ROOT))
+    from cagecore import diffs
+    return diffs
+
+
+def numbered(count, start=1):
+    return "".join(f"line {n}\n" for n in range(start, start + count))
+
+
+def test_patch_applies_at_an_offset(diffs):
+    original = numbered(20)
+    changed = original.replace("line 10\n", "line ten\n")
+    patch = diffs.create_diff(original, changed, "f.txt")["diff"]
+
+    shifted = "new head\n" * 5 + original
+
+    assert diffs.apply_patch(shifted, patch) == "new head\n" * 5 + changed
+
+
+def test_patch_needs_fuzz_when_context_drifted(diffs):
+    original = numbered(20)
+    patch = diffs.create_diff(original, original.replace("line 10\n", "line ten\n"), "f.txt")["diff"]
+    edited = original.replace("line 7\n", "line seven\n")
+
+    with pytest.raises(diffs.PatchError):
+        diffs.apply_patch(edited, patch)
+    assert diffs.apply_patch(edited, patch, fuzz=1) == edited.replace("line 10\n", "line ten\n")
+
+
+def test_reverse_patch_restores_the_original(diffs):
+    original = numbered(30) + "no newline"
+    changed = original.replace("line 3\n", "").replace("no newline", "still none")
+    patch = diffs.create_diff(original, changed, "f.txt")["diff"]
+
+    assert diffs.apply_patch(original, patch) == changed
+    assert diffs.apply_patch(changed, patch, reverse=True) == original
+
+
+def test_apply_diff_rewrites_the_workspace_file_and_back(cage):
+    (cage.workspace / "f.txt").write_text("".join(f"line {n}\n" for n in range(1, 21)))
+    out = cage.python(
+        "from cagecore import diffs, referee, workbench\n"
+        "path = workbench.get_workspace_path('f.txt')\n"
+        "before = workbench.read_file('f.txt')\n"
+        "patch = diffs.create_diff(before, before.replace('line 5\\n', 'line five\\n'), 'f.txt')['diff']\n"
+        "with referee.authorize_diff(path) as token:\n"
+        "    print(diffs.apply_diff('f.txt', patch, token)['success'], 'line five' in workbench.read_file('f.txt'))\n"
+        "    print(diffs.apply_diff('f.txt', patch, token, reverse=True)['success'],\n"
+        "          workbench.read_file('f.txt') == before)\n"
+        "    print(diffs.apply_diff('f.txt', patch, token, reverse=True)['success'])\n"
+    )
+
+    assert out.split() == ["True", "True", "True", "True", "False"]
@@ -0,0 +1,10 @@
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_cheap_commands_stay_within_import_budget():
+    proc = subprocess.run([sys.executable, str(ROOT / "scripts" / "import_budget.py"), "--repeat", "3"],
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
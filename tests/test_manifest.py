@@ -0,0 +1,47 @@
+import shutil
+
+
+def _changed(cage, *args):
+    return [line for line in cage.run("changed", *args).stdout.splitlines() if line[:2] in ("M ", "D ")]
+
+
+def test_changed_reports_edits_since_the_marked_run(cage):
+    (cage.workspace / "keep.txt").write_text("k\n")
+    (cage.workspace / "sub" / "deep").mkdir(parents=True)
+    (cage.workspace / "sub" / "deep" / "a.txt").write_text("a\n")
+    (cage.workspace / "gone").mkdir()
+    (cage.workspace / "gone" / "b.txt").write_text("b\n")
+
+    assert _changed(cage, "--mark") == ["M gone/b.txt", "M keep.txt", "M sub/deep/a.txt"]
+    assert _changed(cage) == []
+
+    (cage.workspace / "sub" / "deep" / "a.txt").write_text("a2\n")
+    (cage.workspace / "new" / "dir").mkdir(parents=True)
+    (cage.workspace / "new" / "dir" / "c.txt").write_text("c\n")
+    shutil.rmtree(cage.workspace / "gone")
+    (cage.workspace / "keep.txt").touch()  # same content: not a change
+
+    assert _changed(cage) == ["M new/dir/c.txt", "M sub/deep/a.txt", "D gone/b.txt"]
+
+
+def test_refresh_lists_only_directories_that_changed(cage):
+    for rel in ("a/one.txt", "a/two.txt", "b/three.txt", "top.txt"):
+        (cage.workspace / rel).parent.mkdir(exist_ok=True)
+        (cage.workspace / rel).write_text(rel)
+    out = cage.python(
+        "from cagecore import manifest\n"
+        "manifest.refresh()\n"
+        "listed = []\n"
+        "list_dir = manifest._list_dir\n"
+        "manifest._list_dir = lambda root, rel_dir: listed.append(rel_dir) or list_dir(root, rel_dir)\n"
+        "ws = manifest.room.get_workspace_dir()\n"
+        "(ws / 'a' / 'one.txt').write_text('edited in place')\n"
+        "print(manifest.refresh(), listed)\n"
+        "listed.clear()\n"
+        "(ws / 'b' / 'four.txt').write_text('new')\n"
+        "print(manifest.refresh(), listed)\n"
+    )
+
+    in_place, added = out.splitlines()
+    assert in_place == "{'added': [], 'modified': ['a/one.txt'], 'removed': []} []"
+    assert added == "{'added': ['b/four.txt'], 'modified': [], 'removed': []} ['b']"
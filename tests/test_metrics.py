@@ -0,0 +1,41 @@
+def test_metrics_render_in_text_exposition_format(status_client):
+    from cagecore import metrics
+    registry = metrics.Registry()
+    registry.inc("cage_things_total", 2, kind='say "hi"')
+    registry.observe("cage_step_seconds", 0.003)
+    registry.observe("cage_step_seconds", 20)
+
+    lines = metrics.render(registry).splitlines()
+    response = status_client.get("/metrics")
+
+    assert lines[:2] == ["# TYPE cage_step_seconds histogram", 'cage_step_seconds_bucket{le="0.0005"} 0']
+    assert 'cage_step_seconds_bucket{le="0.005"} 1' in lines
+    assert 'cage_step_seconds_bucket{le="10.0"} 1' in lines
+    assert lines[lines.index('cage_step_seconds_bucket{le="+Inf"} 2') + 1:] == [
+        "cage_step_seconds_sum 20.003",
+        "cage_step_seconds_count 2",
+        "# TYPE cage_things_total counter",
+        'cage_things_total{kind="say \\"hi\\""} 2',
+    ]
+    assert response.mimetype == "text/plain" and "version=0.0.4" in response.headers["Content-Type"]
+    assert "# TYPE cage_digest_cache_entries gauge" in response.get_data(as_text=True)
+
+
+def test_flush_compacts_metrics_file(cage):
+    out = cage.python(
+        "from cagecore import metrics, room\n"
+        "metrics.COMPACT_BYTES = 300\n"
+        "metrics.flush()\n"
+        "print(room.get_state_dir().joinpath('metrics.jsonl').exists())\n"
+        "persisted = metrics.PersistedMetrics()\n"
+        "for i in range(40):\n"
+        "    metrics.inc('cage_things_total', kind=str(i % 2))\n"
+        "    metrics.flush()\n"
+        "    if i % 7 == 0:\n"
+        "        persisted.refresh()\n"
+        "persisted.refresh()\n"
+        "print(len(room.get_state_dir().joinpath('metrics.jsonl').read_text().splitlines()) < 10)\n"
+        "print(metrics.render(persisted.registry))\n"
+    )
+    assert out.splitlines()[:2] == ["False", "True"]
+    assert 'cage_things_total{kind="0"} 20' in out and 'cage_things_total{kind="1"} 20' in out
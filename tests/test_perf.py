@@ -0,0 +1,15 @@
+import json
+
+
+def test_perf_records_go_to_their_own_journal(cage):
+    (cage.workspace / "a.txt").write_text("alpha\n")
+    cage.run("plan", "t", "--file", "a.txt", "--replace", "alpha", "--with", "beta")
+    cage.run("apply")
+    cage.run("show-log")
+
+    trail = [json.loads(line) for line in (cage.path / "trail.log").read_text().splitlines() if line.startswith("{")]
+    records = [json.loads(line) for line in (cage.path / ".cage" / "perf.jsonl").read_text().splitlines()]
+
+    assert trail and all(entry.get("type") != "perf" for entry in trail)
+    assert "apply" in {record["data"]["command"] for record in records}
+    assert "apply: 1 run(s)" in cage.run("perf-report").stdout
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture(params=["python", "numpy"])
+def retrieval(request, monkeypatch):
+    monkeypatch.syspath_prepend(str(ROOT))
+    from cagecore import retrieval
+    if request.param == "python":
+        monkeypatch.setattr(retrieval, "np", None)
+    elif retrieval.np is None:
+        pytest.skip("numpy is not installed")
+    return retrieval
+
+
+def test_search_breaks_ties_by_file_order(retrieval, tmp_path):
+    from cagecore import embedder
+    same, other = embedder.vector("reverse a list"), embedder.vector("parse a date")
+    path = tmp_path / "atoms.jsonl"
+    with path.open("w") as f:
+        for n, embedding in enumerate([other, same, other, same, same, same]):
+            f.write(json.dumps({"id": f"a{n}", "ts": "", "text": "", "embedding": embedding}) + "\n")
+    index = retrieval.AtomIndex(str(path))
+    index.refresh()
+
+    assert [atom["id"] for atom in index.search("reverse a list", k=3)] == ["a1", "a3", "a4"]
+    assert [atom["id"] for atom in index.search("reverse a list", k=6)] == ["a1", "a3", "a4", "a5", "a0", "a2"]
+
+
+def test_retrieve_expand_follows_links(cage):
+    def ingest(text):
+        return cage.run("ingest", "--author", "ann", "--role", "student", "--text", text).stdout.strip()
+
+    # Embeddings are text hashes: only the two identical texts match the query
+    cats, kittens = ingest("cats purr loudly"), ingest("cats purr loudly")
+    physics, bread = ingest("quantum tunnelling of electrons"), ingest("baking sourdough bread")
+    cage.run("link", "--from", cats, "--to", physics)
+    cage.run("link", "--from", physics, "--to", bread, "--weight", "0.5")
+
+    def retrieve(hops):
+        out = cage.run("retrieve", "--query", "cats purr loudly", "--k", "2", "--expand", str(hops)).stdout
+        return [line.split(" | ") for line in out.splitlines()]
+
+    one, two = retrieve(1), retrieve(2)
+
+    assert [(row[0], row[1]) for row in one[:2]] == [(cats, "1.000"), (kittens, "1.000")]
+    assert [(row[0], row[-1]) for row in one[2:]] == [(physics, f"via {cats}")]
+    assert [(row[0], row[-1]) for row in two[2:]] == [(physics, f"via {cats}"), (bread, f"via {physics}")]
+    assert [row[1] for row in two[2:]] == ["0.500", "0.125"]
@@ -0,0 +1,50 @@
+def test_batch_runs_every_line_in_one_process(cage):
+    (cage.path / "cmds.txt").write_text(
+        "# seed the store\n"
+        "ingest --author ann --role student --text 'cats purr loudly'\n"
+        "\n"
+        "retrieve --query cats\n"
+        "retrieve\n"
+        "batch cmds.txt\n"
+        "show-log\n"
+    )
+
+    proc = cage.run("batch", "cmds.txt", check=False)
+    table = proc.stdout[proc.stdout.index(" line "):].splitlines()
+
+    assert proc.returncode == 1
+    assert "| cats purr loudly" in proc.stdout
+    assert "'batch' cannot be used inside a session." in proc.stdout
+    assert [row.split()[0] + " " + row.split()[2] for row in table[1:6]] == ["2 0", "4 0", "5 2", "6 2", "7 0"]
+    assert "5 command(s)" in proc.stdout and "2 failed." in proc.stdout
+
+
+def test_batch_stop_on_error(cage):
+    (cage.path / "cmds.txt").write_text("retrieve\nshow-log\n")
+
+    proc = cage.run("batch", "cmds.txt", "--stop-on-error", check=False)
+
+    assert proc.returncode == 1
+    assert "$ show-log" not in proc.stdout and "1 command(s)" in proc.stdout
+
+
+def test_daemon_serves_commands_and_clients_fall_back(cage):
+    import socket
+    assert "Daemon started." in cage.run("daemon", "start").stdout
+    try:
+        cage.run("ingest", "--author", "ann", "--role", "student", "--text", "cats purr", daemon=True)
+        forwarded = cage.run("retrieve", "--query", "cats", daemon=True)
+        status = cage.run("daemon", "status").stdout
+    finally:
+        stopped = cage.run("daemon", "stop").stdout
+
+    assert "| cats purr" in forwarded.stdout
+    assert "2 command(s) served" in status
+    assert "Daemon stopped." in stopped
+
+    # A socket left behind by a daemon that died: the client runs the command itself
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(cage.path / ".cage" / "daemon.sock"))
+    stale.close()
+    fallback = cage.run("retrieve", "--query", "cats", daemon=True)
+    assert "| cats purr" in fallback.stdout
@@ -0,0 +1,29 @@
+def test_test_changed_checks_the_batch_and_feeds_publish(cage):
+    for name, text in (("a.txt", "alpha\n"), ("b.txt", "beta\n"), ("empty.txt", "")):
+        (cage.workspace / name).write_text(text)
+
+    out = cage.run("test", "--changed").stdout
+
+    assert "ok   a.txt" in out and "ok   b.txt" in out and "FAIL empty.txt" in out
+    assert "1 of 3 file(s) failed" in out
+    cage.run("publish", "--all-passed")
+    assert sorted(path.name for path in (cage.path / "artifacts").iterdir() if path.suffix == ".txt") == \
+        ["a.txt", "b.txt"]
+
+
+def test_results_journal_is_read_incrementally_and_compacted(cage):
+    (cage.workspace / "a.txt").write_text("v0\n")
+    (cage.workspace / "b.txt").write_text("b\n")
+    out = cage.python(
+        "from cagecore import tests\n"
+        "tests.COMPACT_SLACK_RECORDS = 5\n"
+        "tests.run_checks(['b.txt'])\n"
+        "for n in range(1, 12):\n"
+        "    (tests.workbench.get_workspace_path('a.txt')).write_text(f'v{n}\\n')\n"
+        "    tests.run_checks(['a.txt'])\n"
+        "print(tests.passed_files())\n"
+    )
+
+    lines = (cage.path / ".cage" / "test_results.jsonl").read_text().splitlines()
+    assert out.strip() == "['a.txt', 'b.txt']"
+    assert len(lines) <= 2 + 5  # 12 records, compacted to one per file once past the slack
@@ -0,0 +1,157 @@
+import sys
+import time
+import shutil
+import socket
+import subprocess
+import urllib.request
+from pathlib import Path
+
+from conftest import ROOT
+
+
+def test_file_views_and_raw_bytes_have_distinct_etags(status_client):
+    Path("atoms.jsonl").write_text("line1\nline2\n")
+
+    view = status_client.get("/file?path=atoms.jsonl", headers={"Range": "bytes=0-3"})
+    raw = status_client.get("/file?path=atoms.jsonl&raw=1", headers={"Range": "bytes=0-3"})
+    page = status_client.get("/file?path=atoms.jsonl&offset=1&limit=1")
+
+    assert view.status_code == 200 and b"BEGIN-FILE" in view.data
+    assert raw.status_code == 206 and raw.data == b"line"
+    assert len({view.headers["ETag"], raw.headers["ETag"], page.headers["ETag"]}) == 3
+
+
+def test_raw_range_honours_if_range(status_client):
+    Path("atoms.jsonl").write_text("line1\nline2\n")
+    etag = status_client.get("/file?path=atoms.jsonl&raw=1").headers["ETag"]
+
+    fresh = status_client.get("/file?path=atoms.jsonl&raw=1", headers={"Range": "bytes=0-3", "If-Range": etag})
+    stale = status_client.get("/file?path=atoms.jsonl&raw=1", headers={"Range": "bytes=0-3", "If-Range": '"old"'})
+
+    assert fresh.status_code == 206 and fresh.data == b"line"
+    assert stale.status_code == 200 and stale.data == b"line1\nline2\n"
+
+
+def test_trail_followers_skip_past_oversized_lines(status_client):
+    import status_server
+    trail = Path("trail.log")
+    trail.write_bytes(b"first\n")
+    follower = status_server.TrailFollower()
+    follower.poll()
+    huge = b"x" * (status_server.TRAIL_LINE_MAX_BYTES + 10)
+    with trail.open("ab") as f:
+        f.write(huge + b"\nafter\n")
+
+    follower.poll()
+    from_disk = list(status_server.iter_trail_from_disk("trail.log", 0, trail.stat().st_size))
+
+    oversized = (6, 6 + len(huge) + 1, f'{{"type": "oversized", "offset": 6, "bytes": {len(huge)}}}')
+    assert list(follower.lines) == [oversized, (len(huge) + 7, len(huge) + 13, "after")]
+    assert from_disk == [(0, 6, "first")] + list(follower.lines)
+    assert follower.offset == trail.stat().st_size
+
+
+def test_trail_streams_are_capped_and_end(status_client, monkeypatch):
+    import threading
+    import status_server
+    Path("trail.log").write_bytes(b"first\n")
+    monkeypatch.setattr(status_server, "TRAIL_STREAM_SLOTS", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(status_server, "TRAIL_STREAM_MAX_SECONDS", 0)
+
+    held = status_client.get("/trail/stream?offset=0", buffered=False)
+    refused = status_client.get("/trail/stream")
+    held.close()
+    again = status_client.get("/trail/stream?offset=0")
+
+    assert held.status_code == 200
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+    assert again.status_code == 200 and again.data == b"retry: 2000\n\n"
+
+
+def test_status_snapshot_recomputes_only_changed_components(status_client, monkeypatch):
+    import status_server
+    Path("atoms.jsonl").write_text("a\nb\n")
+    counted = []
+    count_lines = status_server.count_lines
+    monkeypatch.setattr(status_server, "count_lines", lambda path: counted.append(path) or count_lines(path))
+
+    first = status_client.get("/status.json").get_json()
+    status_client.get("/status.json")
+    status_server.status_snapshot()
+    with open("atoms.jsonl", "a") as f:
+        f.write("c\n")
+    second = status_client.get("/status.json").get_json()
+
+    assert (first["atoms_count"], second["atoms_count"]) == (2, 3)
+    assert counted == ["atoms.jsonl", "links.jsonl", "atoms.jsonl"]
+
+
+def test_append_only_digests_are_extended(status_client, monkeypatch):
+    import hashlib
+    import status_server
+    Path("atoms.jsonl").write_text("one\n" * 1000)
+    offsets = []
+    hash_from = status_server._hash_from
+    monkeypatch.setattr(status_server, "_hash_from",
+                        lambda f, hasher, offset, size: offsets.append(offset) or hash_from(f, hasher, offset, size))
+
+    before = status_server.get_file_sha256("atoms.jsonl")
+    with open("atoms.jsonl", "a") as f:
+        f.write("two\n")
+    after = status_server.get_file_sha256("atoms.jsonl")
+    raw = status_client.get("/file?path=atoms.jsonl&raw=1")
+
+    assert before == hashlib.sha256(b"one\n" * 1000).hexdigest()
+    assert after == hashlib.sha256(b"one\n" * 1000 + b"two\n").hexdigest()
+    assert offsets == [0, 4000]
+    assert raw.headers["ETag"] == f'"{after}"'
+
+
+def test_status_polls_get_etags_304s_and_gzip(status_client):
+    import gzip
+    Path("trail.log").write_text("".join(f"{i} | " + "x" * 200 + "\n" for i in range(10)))
+
+    plain = status_client.get("/status.json")
+    again = status_client.get("/status.json")
+    unchanged = status_client.get("/status.json", headers={"If-None-Match": plain.headers["ETag"]})
+    zipped = status_client.get("/status.json", headers={"Accept-Encoding": "gzip"})
+    index = status_client.get("/", headers={"If-None-Match": plain.headers["ETag"]})
+    with open("trail.log", "a") as f:
+        f.write("10 | y\n")
+    changed = status_client.get("/status.json", headers={"If-None-Match": plain.headers["ETag"]})
+
+    assert "server_time" not in plain.get_json()
+    assert again.data == plain.data and again.headers["ETag"] == plain.headers["ETag"]
+    assert unchanged.status_code == 304 and not unchanged.data
+    assert zipped.headers["Content-Encoding"] == "gzip" and zipped.headers["ETag"] != plain.headers["ETag"]
+    assert gzip.decompress(zipped.data) == plain.data
+    assert index.status_code == 200 and b"BEGIN-AUDIT-LINKS" in index.data
+    assert changed.status_code == 200 and changed.get_json()["trail_tail"][-1] == "10 | y"
+
+
+def test_forked_workers_share_metrics_and_close_idle_connections(cage):
+    shutil.copy2(ROOT / "status_server.py", cage.path)
+    code = ("import status_server\n"
+            "status_server.METRICS_FLUSH_SECONDS = 0.1\n"
+            "status_server.serve('127.0.0.1', 0, workers=2, threads=2, idle_timeout=0.5)\n")
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=cage.path, stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline().split()[2].rsplit(":", 1)[1])
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(10):
+            urllib.request.urlopen(url + "/status.json").read()
+        time.sleep(0.5)
+        scrapes = [urllib.request.urlopen(url + "/metrics").read().decode() for _ in range(4)]
+
+        idle = socket.create_connection(("127.0.0.1", port), timeout=10)
+        started = time.monotonic()
+        closed = idle.recv(1)
+        idle_seconds = time.monotonic() - started
+        idle.close()
+    finally:
+        server.terminate()
+        server.wait(15)
+
+    for text in scrapes:
+        assert 'cage_http_requests_total{route="/status.json",status="200"} 10' in text
+    assert closed == b"" and idle_seconds < 5
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+TEXT = "café naïve Straße\nœuvre déjà vu\n"
+
+
+def _apply(cage, name, *plan_args, stream=False):
+    (cage.workspace / name).write_text(TEXT, encoding="utf-8")
+    cage.run("plan", "t", "--file", name, *plan_args)
+    return cage.run("apply", *(["--stream"] if stream else [])).stdout
+
+
+def test_non_ascii_plan_gives_the_same_output_on_both_paths(cage):
+    _apply(cage, "memory.txt", "--replace", "déjà", "--with", "encore")
+    _apply(cage, "stream.txt", "--replace", "déjà", "--with", "encore", stream=True)
+
+    memory = (cage.workspace / "memory.txt").read_bytes()
+    assert memory == "café naïve Straße\nœuvre encore vu\n".encode("utf-8")
+    assert (cage.workspace / "stream.txt").read_bytes() == memory
+
+
+@pytest.mark.parametrize("pattern", [r"\w+é\b", r"na.ve", r"[^ ]{6}\n"])
+def test_regex_plans_match_characters_on_both_paths(cage, pattern):
+    out = _apply(cage, "memory.txt", "--regex", "--replace", pattern, "--with", "X")
+    assert "Applied safely." in out
+    assert (cage.workspace / "memory.txt").read_text(encoding="utf-8") == re.sub(pattern, "X", TEXT)
+
+    out = _apply(cage, "stream.txt", "--regex", "--replace", pattern, "--with", "X", stream=True)
+    assert "Applied safely." in out
+    assert (cage.workspace / "stream.txt").read_bytes() == (cage.workspace / "memory.txt").read_bytes()
+
+
+@pytest.mark.parametrize("pattern, replacement", [
+    (r"^(\w+) (\w+)", r"\2 \1"),   # '^' only at the start of the file
+    (r"(?m)^é", "E"),                 # and at each line start with (?m)
+    (r"(?<=ö)\w", "#"),              # lookbehind across chunk boundaries
+    (r"x*", "-"),                     # empty matches
+    (r"\bß+\b", "ss"),
+    (r"ä[^\n]{0,40}ü", "<>"),        # matches spanning chunk boundaries
+])
+def test_chunked_regex_pass_matches_re_sub(cage, pattern, replacement):
+    text = "".join(f"é{n} öäxü ß{'x' * (n % 7)} ä{'ö' * (n % 50)}ü\n" for n in range(4000))
+    (cage.workspace / "big.txt").write_text(text, encoding="utf-8")
+
+    out = cage.python(
+        "import io\n"
+        "from cagecore import rewriter, workbench\n"
+        "rewriter.COPY_CHUNK_BYTES, rewriter.REGEX_WINDOW_CHARS = 1000, 100\n"
+        "sink = io.BytesIO()\n"
+        f"plan = {{'find_text': {pattern!r}, 'replace_text': {replacement!r}, 'regex': True}}\n"
+        "rewriter._regex_rewrite(workbench.get_workspace_path('big.txt'), plan, sink)\n"
+        "import sys; sys.stdout.buffer.write(sink.getvalue())\n"
+    )
+
+    assert out == re.sub(pattern, replacement, text)
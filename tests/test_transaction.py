@@ -0,0 +1,81 @@
+PRELUDE = (
+    "import threading\n"
+    "from cagecore import workbench, referee, locks\n"
+    "def path(name):\n"
+    "    return workbench.get_workspace_path(name)\n"
+    "def attempt(func):\n"
+    "    try:\n"
+    "        func()\n"
+    "        return 'ok'\n"
+    "    except referee.RuleViolationError:\n"
+    "        return 'refused'\n"
+)
+
+
+def test_transaction_reads_and_commits_a_batch(cage):
+    (cage.workspace / "a.txt").write_text("a\n")
+    out = cage.python(PRELUDE + (
+        "with referee.authorize_diff(path('a.txt')) as ta, referee.authorize_diff(path('sub/b.txt')) as tb:\n"
+        "    with workbench.transaction(['a.txt', 'sub/b.txt']) as txn:\n"
+        "        print(txn.read_many(['a.txt', 'sub/b.txt']))\n"
+        "        txn.write('a.txt', 'A\\n', token=ta)\n"
+        "        txn.write('sub/b.txt', 'B\\n', token=tb)\n"
+        "        print(txn.read('a.txt'))\n"
+        "from cagecore import manifest\n"
+        "print(sorted(manifest.entries()))\n"
+    ))
+
+    assert out.splitlines() == ["{'a.txt': 'a\\n', 'sub/b.txt': ''}", "a", "", "['a.txt', 'sub/b.txt']"]
+    assert (cage.workspace / "a.txt").read_text() == "A\n"
+    assert (cage.workspace / "sub" / "b.txt").read_text() == "B\n"
+
+
+def test_commit_rechecks_tokens_before_anything_lands(cage):
+    (cage.workspace / "a.txt").write_text("a\n")
+    (cage.workspace / "b.txt").write_text("b\n")
+    out = cage.python(PRELUDE + (
+        "def run():\n"
+        "    with referee.authorize_diff(path('a.txt')) as ta:\n"
+        "        with workbench.transaction(['a.txt', 'b.txt']) as txn:\n"
+        "            txn.write('a.txt', 'A\\n', token=ta)\n"
+        "            with referee.authorize_diff(path('b.txt')) as tb:\n"
+        "                txn.write('b.txt', 'B\\n', token=tb)\n"
+        "print(attempt(run))\n"
+    ))
+
+    assert out.strip() == "refused"
+    assert (cage.workspace / "a.txt").read_text() == "a\n"
+    assert (cage.workspace / "b.txt").read_text() == "b\n"
+
+
+def test_transaction_holds_the_file_locks(cage):
+    (cage.workspace / "a.txt").write_text("a\n")
+    out = cage.python(PRELUDE + (
+        "locked = threading.Event()\n"
+        "def writer():\n"
+        "    with locks.file_lock(path('a.txt')):\n"
+        "        locked.set()\n"
+        "with workbench.transaction(['a.txt']) as txn:\n"
+        "    thread = threading.Thread(target=writer)\n"
+        "    thread.start()\n"
+        "    print(locked.wait(0.3))\n"
+        "thread.join(5)\n"
+        "print(locked.is_set())\n"
+    ))
+
+    assert out.split() == ["False", "True"]
+
+
+def test_transaction_refuses_paths_outside_the_workspace(cage):
+    (cage.workspace / "link").symlink_to(cage.path)
+    out = cage.python(PRELUDE + (
+        "def open_txn(paths):\n"
+        "    def run():\n"
+        "        with workbench.transaction(paths) as txn:\n"
+        "            txn.read(paths[0])\n"
+        "    return run\n"
+        "print(attempt(open_txn(['../run.py'])), attempt(open_txn(['/etc/passwd'])),\n"
+        "      attempt(open_txn(['link/run.py'])))\n"
+    ))
+
+    assert out.split() == ["refused", "refused", "refused"]